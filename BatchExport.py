@@ -0,0 +1,200 @@
+"""
+Headless batch export of many binaries into CSV files, without the Binary Ninja GUI.
+
+Every binary is opened by headless Binary Ninja in a worker process and extracted by a BinjaGraph into its own output
+directory (CSV files, run report), the directories can then be loaded into Neo4j one by one with ExportNeo4j.py.
+A BatchSummary.json with the outcome and the timings of every binary is written into the output root.
+
+Usage, from the Binary Ninja plugins directory (requires a headless license):
+    python -m Binja4J.BatchExport [-j PROCESSES] [-o OUTPUT_DIR] [-l LIST_FILE] [-r] [PATH ...]
+
+PATH is a binary or a directory of binaries, LIST_FILE holds one binary path per line.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from binaryninja import BinaryViewType
+
+from . import Configuration
+from .Core.CSV_Processing import BuildCSV
+from .Core.Common import Hashing
+
+
+def collect_binaries(paths: list, list_files=(), recursive=False):
+    """
+    :param paths: (LIST) binaries and directories of binaries
+    :param list_files: (LIST) text files listing one binary path per line (empty lines and '#' comments are skipped)
+    :param recursive: (BOOL) also collect the binaries in the sub-directories of the given directories
+    :return: (LIST) absolute paths of all the binaries, sorted and without duplicates
+    """
+    paths = list(paths)
+    for list_file in list_files:
+        with open(list_file, 'r', encoding='utf-8') as binary_list:
+            paths.extend(line.strip() for line in binary_list if line.strip() and not line.startswith('#'))
+
+    binaries = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                binaries.update(os.path.join(root, filename) for filename in files)
+                if not recursive:
+                    break
+        elif os.path.isfile(path):
+            binaries.add(path)
+        else:
+            print("No such binary or directory, skipping: ", path)
+
+    return sorted(os.path.abspath(binary) for binary in binaries)
+
+
+def output_directories(binaries: list, output_root: str):
+    """
+    :return: (DICT) binary path -> its output directory, named after the binary (binaries with the same name get a
+             numbered suffix)
+    """
+    directories = dict()
+    used_names = set()
+    for binary in binaries:
+        name = os.path.basename(binary)
+        suffix = 1
+        while name in used_names:
+            suffix += 1
+            name = os.path.basename(binary) + '-' + str(suffix)
+        used_names.add(name)
+        directories.update({binary: os.path.join(output_root, name)})
+
+    return directories
+
+
+def export_binary(filename: str, output_path: str):
+    """
+    Worker process entry point of batch_export, extract a single binary.
+    :param filename: path of the binary (or Binary Ninja database) to open headlessly
+    :param output_path: directory to write the CSV files of the binary into
+    :return: (DICT) the summary of the export: status, timings and entity counts
+    """
+    start_time = time.perf_counter()
+    result = {'binary': filename, 'output': output_path, 'status': 'failed'}
+
+    bv = None
+    try:
+        bv = BinaryViewType.get_view_of_file(filename)
+        result.update({'analysis_time': time.perf_counter() - start_time})
+        if bv is None:
+            result.update({'error': 'Binary Ninja could not open the file'})
+            return result
+
+        os.makedirs(output_path, exist_ok=True)
+
+        binja_graph = BuildCSV.BinjaGraph(None, bv, output_path=output_path)
+        # This process is already one of the parallel workers, extract the functions of the binary serially
+        binja_graph.bv_extract(process_count=1)
+
+        counters = binja_graph.run_report.counters
+        result.update({
+            'status': 'done',
+            'HASH': Hashing.format_hash(binja_graph.bv_object.context.SelfHASH),
+            'functions': len(binja_graph.function_manifest),
+            'nodes': sum(count for name, count in counters.items() if name.endswith('.nodes')),
+            'relationships': sum(count for name, count in counters.items() if name.endswith('.relationships')),
+            'stages': {stage_name: stage_times['wall']
+                       for stage_name, stage_times in binja_graph.run_report.stages.items()},
+        })
+
+    except Exception as e:
+        # A single broken sample must not stop the batch
+        result.update({'error': repr(e), 'traceback': traceback.format_exc()})
+
+    finally:
+        if bv is not None:
+            bv.file.close()
+        result.update({'wall_time': time.perf_counter() - start_time})
+
+    return result
+
+
+def batch_export(binaries: list, output_root: str, process_count: int):
+    """
+    Export every binary on a pool of worker processes and write BatchSummary.json into the output root.
+    :param binaries: (LIST) paths of the binaries to export
+    :param output_root: (STR) directory under which every binary gets its own output directory
+    :param process_count: (INT) amount of binaries exported in parallel
+    :return: (DICT) the batch summary
+    """
+    start_time = time.perf_counter()
+    started = time.strftime('%Y-%m-%d %H:%M:%S')
+    directories = output_directories(binaries, output_root)
+    results = dict()
+
+    # Binary Ninja is not fork safe, every worker starts a fresh interpreter
+    with ProcessPoolExecutor(max_workers=process_count,
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(export_binary, binary, directories[binary]): binary for binary in binaries}
+
+        for future in as_completed(futures):
+            binary = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g crashed inside the Binary Ninja core)
+                result = {'binary': binary, 'output': directories[binary], 'status': 'failed', 'error': repr(e)}
+            results.update({binary: result})
+
+            print('[' + str(len(results)) + '/' + str(len(binaries)) + '] ' + result['status'] + ': ' + binary +
+                  ' (' + str(round(result.get('wall_time', 0.0), 2)) + ' seconds)')
+            if 'error' in result:
+                print("    ", result['error'])
+
+    ordered_results = [results[binary] for binary in binaries]
+    summary = {
+        'started': started,
+        'wall_time': time.perf_counter() - start_time,
+        'processes': process_count,
+        'binaries': len(binaries),
+        'done': sum(result['status'] == 'done' for result in ordered_results),
+        'failed': sum(result['status'] != 'done' for result in ordered_results),
+        'results': ordered_results,
+    }
+
+    os.makedirs(output_root, exist_ok=True)
+    summary_file = os.path.join(output_root, 'BatchSummary.json')
+    with open(summary_file, 'w', encoding='utf-8') as summary_json:
+        json.dump(summary, summary_json, indent=1)
+
+    print("Exported ", summary['done'], " of ", summary['binaries'], " binaries in ", summary['wall_time'],
+          " seconds, summary written to: ", summary_file)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless export of many binaries into Binja4J CSV files")
+    parser.add_argument('paths', nargs='*', help="binaries and directories of binaries to export")
+    parser.add_argument('-l', '--list', dest='list_files', action='append', default=[],
+                        help="text file listing one binary path per line, may be given several times")
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help="also export the binaries in the sub-directories of the given directories")
+    parser.add_argument('-o', '--output', default=Configuration.batch_output_path,
+                        help="root directory of the per binary output directories")
+    parser.add_argument('-j', '--processes', type=int, default=Configuration.BATCH_EXPORT_PROCESSES,
+                        help="amount of binaries exported in parallel")
+    args = parser.parse_args()
+
+    binaries = collect_binaries(args.paths, args.list_files, args.recursive)
+    if not binaries:
+        parser.error("no binaries to export")
+
+    summary = batch_export(binaries, args.output, max(1, args.processes))
+
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
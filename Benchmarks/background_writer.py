@@ -0,0 +1,101 @@
+"""
+Benchmark of the asynchronous CSV writing of CSV_Processing/BackgroundWriter.py on a slow disk.
+
+Simulates an export: builds the EntityRecords of a synthetic object_cache (see record_memory.py, a stand-in for the
+extraction work) and writes them through Records.RecordWriter into files whose raw writes take a fixed time per MB
+(a slow or network disk). Reports the wall time of:
+    1. writing on the extraction thread (Configuration.ASYNC_CSV_WRITER = False)
+    2. writing through the BackgroundWriter (Configuration.ASYNC_CSV_WRITER = True)
+and checks that both produce the same content.
+
+Usage (from the repository root):
+    python Benchmarks/background_writer.py [function_count] [milliseconds_per_MB]
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Core.CSV_Processing import Records, BackgroundWriter
+from record_memory import synthetic_templates
+
+# Same values as CSV_Processing/CSV_Helper.py and Configuration.py
+WRITE_BUFFER_SIZE = 1 << 20
+CSV_WRITER_QUEUE_SIZE = 64
+
+
+class SlowDisk(io.RawIOBase):
+    # In memory raw file whose writes sleep (releasing the GIL, like a blocking write syscall) for a fixed time per MB
+
+    def __init__(self, seconds_per_byte: float):
+        self.seconds_per_byte = seconds_per_byte
+        self.content = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        time.sleep(len(data) * self.seconds_per_byte)
+        return self.content.write(data)
+
+
+def run(function_count: int, seconds_per_byte: float, use_background_writer: bool):
+    """
+    :return: the wall time of the export and the content written into every file
+    """
+    start_time = time.perf_counter()
+    background_writer = BackgroundWriter.BackgroundWriter(CSV_WRITER_QUEUE_SIZE) if use_background_writer else None
+
+    disks = dict()
+    files = dict()
+    queued_files = list()
+    writers = dict()
+
+    def record_writer(internal_type: str):
+        # Same as CSV_Serialize.record_writer
+        writer = writers.get(internal_type)
+        if writer is None:
+            disks[internal_type] = SlowDisk(seconds_per_byte)
+            csv_file = files[internal_type] = io.TextIOWrapper(
+                io.BufferedWriter(disks[internal_type], WRITE_BUFFER_SIZE), encoding='utf-8', newline='')
+            if background_writer is not None:
+                csv_file = BackgroundWriter.QueuedFile(background_writer, csv_file)
+                queued_files.append(csv_file)
+            writer = writers[internal_type] = Records.RecordWriter(csv_file)
+        return writer
+
+    for label, csv_template in synthetic_templates(function_count):
+        record = Records.EntityRecord.from_template(csv_template, True, True)
+        schema = record.schema
+        record_writer(record.get('LABEL')).write(schema, schema.node_fields, record.node_values)
+        record_writer(record.get('TYPE')).write(schema, schema.relationship_fields, record.relationship_values)
+
+    # Same as CSV_Serialize.close_file_handles
+    if background_writer is not None:
+        for queued_file in queued_files:
+            queued_file.flush()
+        background_writer.drain()
+        background_writer.close()
+    for csv_file in files.values():
+        csv_file.flush()
+
+    elapsed_time = time.perf_counter() - start_time
+    return elapsed_time, {internal_type: disk.content.getvalue() for internal_type, disk in disks.items()}
+
+
+if __name__ == "__main__":
+    function_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    milliseconds_per_mb = float(sys.argv[2]) if len(sys.argv) > 2 else 100.0
+    seconds_per_byte = milliseconds_per_mb / 1000.0 / (1 << 20)
+
+    contents = list()
+    for writer_name, use_background_writer in (('synchronous', False), ('BackgroundWriter', True)):
+        elapsed_time, content = run(function_count, seconds_per_byte, use_background_writer)
+        contents.append(content)
+        print("{:<17} {:>8.3f} seconds ({:.1f} MB written)".format(
+            writer_name, elapsed_time, sum(map(len, content.values())) / (1 << 20)))
+
+    print("Identical output: ", contents[0] == contents[1])
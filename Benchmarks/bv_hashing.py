@@ -0,0 +1,99 @@
+"""
+Throughput benchmark of the BinaryView hashing strategies of extraction_helpers/BinaryView.py.
+
+Measures, in MB/s, hashing a file of the given size:
+    1. the former BinaryReader loop: one 1000 byte read per call
+    2. the chunked view reads of Neo4jBinaryView.view_hash (BV_HASH_SOURCE = 'view')
+    3. the memory mapped backing file of Hashing.hash_file (BV_HASH_SOURCE = 'file')
+
+The BinaryView is simulated by positional reads of the file, so the per call overhead of Binary Ninja itself is not
+included and the gap between 1 and 2 is a lower bound.
+
+Usage (from the repository root):
+    python Benchmarks/bv_hashing.py [size_in_MB]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Core.Common import Hashing
+
+# Same values as extraction_helpers/BinaryView.py, which can not be imported without binaryninja
+LEGACY_READ_SIZE = 1000
+VIEW_CHUNK_SIZE = LEGACY_READ_SIZE * 16384
+
+
+class FileView:
+    # The read() of a BinaryView that maps the whole file at address 0
+
+    def __init__(self, path: str):
+        self.file_descriptor = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        self.start = 0
+
+    def read(self, address: int, length: int):
+        return os.pread(self.file_descriptor, length, address)
+
+    def close(self):
+        os.close(self.file_descriptor)
+
+
+def legacy_hash(view):
+    file_hash = Hashing.new_hasher()
+    address = view.start
+    data = view.read(address, LEGACY_READ_SIZE)
+    while len(data) == LEGACY_READ_SIZE:
+        file_hash.update(data)
+        address += LEGACY_READ_SIZE
+        data = view.read(address, LEGACY_READ_SIZE)
+    return file_hash.intdigest()
+
+
+def chunked_hash(view):
+    file_hash = Hashing.new_hasher()
+    address = view.start
+    while True:
+        data = view.read(address, VIEW_CHUNK_SIZE)
+        hashed_length = len(data) - len(data) % LEGACY_READ_SIZE
+        file_hash.update(memoryview(data)[:hashed_length])
+        if len(data) < VIEW_CHUNK_SIZE:
+            break
+        address += hashed_length
+    return file_hash.intdigest()
+
+
+def throughput(size: int, function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return size / (time.perf_counter() - start_time) / 2 ** 20, result
+
+
+if __name__ == "__main__":
+    size = int(float(sys.argv[1]) * 2 ** 20) if len(sys.argv) > 1 else 256 * 2 ** 20
+    # A whole number of legacy reads, so all three strategies hash the same bytes
+    size -= size % LEGACY_READ_SIZE
+
+    with tempfile.NamedTemporaryFile(delete=False) as image:
+        for offset in range(0, size, 2 ** 20):
+            image.write(os.urandom(min(2 ** 20, size - offset)))
+    view = FileView(image.name)
+
+    try:
+        for algorithm in Hashing.ALGORITHMS:
+            Hashing.configure(algorithm)
+            print("=" * 30, algorithm, "=" * 30)
+
+            legacy_speed, legacy_digest = throughput(size, legacy_hash, view)
+            chunked_speed, chunked_digest = throughput(size, chunked_hash, view)
+            mapped_speed, mapped_digest = throughput(size, Hashing.hash_file, image.name)
+            assert legacy_digest == chunked_digest == mapped_digest
+
+            print("1000 byte reads: {:>8.0f} MB/s".format(legacy_speed))
+            print("chunked reads:   {:>8.0f} MB/s".format(chunked_speed))
+            print("memory map:      {:>8.0f} MB/s".format(mapped_speed))
+    finally:
+        view.close()
+        os.unlink(image.name)
@@ -0,0 +1,119 @@
+"""
+Throughput benchmark of the CSV writing of CSV_Processing/CSV_Helper.py.
+
+Writes the same synthetic object_cache (see record_memory.py) into a set of CSV files:
+    1. the former serialize_object: a csv.DictWriter and fieldnames list per row, a tell() per row to decide on the
+       header and line buffered files
+    2. Records.RecordWriter: a cached writer per file, the header written once, tuple rows written straight from the
+       EntityRecord and large write buffers (CSV_Helper.WRITE_BUFFER_SIZE)
+and reports the rows per second of each. Both outputs are compared to be identical.
+
+Usage (from the repository root):
+    python Benchmarks/csv_write.py [function_count]
+"""
+
+import csv
+import filecmp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Core.Common import Hashing
+from Core.CSV_Processing import Records
+from record_memory import synthetic_templates
+
+# Same value as CSV_Processing/CSV_Helper.py, which can not be imported outside of the plugin package
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def open_files(directory: str, buffering: int):
+    files = dict()
+
+    def csv_file(internal_type: str):
+        if internal_type not in files:
+            files[internal_type] = open(os.path.join(directory, internal_type + '.csv'), 'w+', buffering=buffering,
+                                        encoding='utf-8', newline='')
+        return files[internal_type]
+
+    return files, csv_file
+
+
+def format_hash_fields(row: dict):
+    for field in Hashing.HASH_FIELDS:
+        if field in row:
+            row[field] = Hashing.format_hash(row[field])
+    return row
+
+
+def dict_writer(directory: str, records: list):
+    files, csv_file = open_files(directory, 1)
+    for record in records:
+        csv_template = record.to_template()
+        node_fieldnames = list(csv_template['mandatory_node_dict'])
+        node_fieldnames.extend(list(csv_template['node_attributes']))
+        node_file = csv_file(csv_template['mandatory_node_dict']['LABEL'])
+        node_writer = csv.DictWriter(node_file, fieldnames=node_fieldnames)
+        if not node_file.tell():
+            node_writer.writeheader()
+        node_row = csv_template['mandatory_node_dict']
+        node_row.update(csv_template['node_attributes'])
+        node_writer.writerow(format_hash_fields(node_row))
+
+        relationship_fieldnames = list(csv_template['mandatory_relationship_dict'])
+        relationship_fieldnames.extend(list(csv_template['relationship_attributes']))
+        relationship_fieldnames.extend(list(csv_template['mandatory_context_dict']))
+        relationship_file = csv_file(csv_template['mandatory_relationship_dict']['TYPE'])
+        relationship_writer = csv.DictWriter(relationship_file, fieldnames=relationship_fieldnames)
+        if not relationship_file.tell():
+            relationship_writer.writeheader()
+        relationship_row = csv_template['mandatory_relationship_dict']
+        relationship_row.update(csv_template['relationship_attributes'])
+        relationship_row.update(csv_template['mandatory_context_dict'])
+        relationship_writer.writerow(format_hash_fields(relationship_row))
+
+    for file in files.values():
+        file.close()
+
+
+def record_writer(directory: str, records: list):
+    files, csv_file = open_files(directory, WRITE_BUFFER_SIZE)
+    writers = dict()
+    for record in records:
+        schema = record.schema
+        for internal_type, fields, values in ((record.get('LABEL'), schema.node_fields, record.node_values),
+                                              (record.get('TYPE'), schema.relationship_fields,
+                                               record.relationship_values)):
+            writer = writers.get(internal_type)
+            if writer is None:
+                writer = writers[internal_type] = Records.RecordWriter(csv_file(internal_type))
+            writer.write(schema, fields, values)
+
+    for file in files.values():
+        file.close()
+
+
+if __name__ == "__main__":
+    function_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    records = [Records.EntityRecord.from_template(csv_template, True, True)
+               for label, csv_template in synthetic_templates(function_count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        output_directories = list()
+        for writer_name, writer in (('DictWriter', dict_writer), ('RecordWriter', record_writer)):
+            output_directory = os.path.join(directory, writer_name)
+            os.mkdir(output_directory)
+            output_directories.append(output_directory)
+
+            start_time = time.perf_counter()
+            writer(output_directory, records)
+            elapsed_time = time.perf_counter() - start_time
+            print("{:<13} {:>9} rows {:>8.3f} seconds {:>12,.0f} rows/s".format(
+                writer_name, 2 * len(records), elapsed_time, 2 * len(records) / elapsed_time))
+
+        match, mismatch, errors = filecmp.cmpfiles(*output_directories, os.listdir(output_directories[0]),
+                                                   shallow=False)
+        print("Identical output: ", not mismatch and not errors)
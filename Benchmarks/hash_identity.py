@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of hex-digest string identities versus integer identities.
+
+Measures, for every algorithm supported by Core.Common.Hashing:
+    1. hashing throughput of short operand strings (hexdigest vs intdigest)
+    2. the cost of building a context hash out of seven identities (string concatenation vs Hashing.combine)
+    3. dict lookup cost and memory of a context_hash_cache keyed by each identity type
+
+Usage (from the repository root):
+    python Benchmarks/hash_identity.py [identity_count]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import xxhash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Core.Common import Hashing
+
+HEX_DIGESTS = {'xxh64': xxhash.xxh64_hexdigest, 'xxh3_64': xxhash.xxh3_64_hexdigest,
+               'xxh128': xxhash.xxh3_128_hexdigest}
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start_time, result
+
+
+def hex_identities(hex_digest, inputs):
+    return [hex_digest(data) for data in inputs]
+
+
+def int_identities(inputs):
+    return [Hashing.hash_bytes(data) for data in inputs]
+
+
+def hex_context_hashes(hex_hasher, identities):
+    # Same as the former Context.context_hash(): one update() per identity, then hexdigest()
+    context_hashes = list()
+    for index in range(len(identities)):
+        context_hash = hex_hasher()
+        for offset in range(-6, 1):
+            context_hash.update(identities[index + offset].encode('ascii'))
+        context_hashes.append(context_hash.hexdigest())
+    return context_hashes
+
+
+def int_context_hashes(identities):
+    return [Hashing.combine(identities[index - 6], identities[index - 5], identities[index - 4],
+                            identities[index - 3], identities[index - 2], identities[index - 1], identities[index])
+            for index in range(len(identities))]
+
+
+def lookups(cache, keys):
+    hits = 0
+    for key in keys:
+        if cache.get(key):
+            hits += 1
+    return hits
+
+
+def cache_memory(keys):
+    tracemalloc.start()
+    cache = {key: True for key in keys}
+    allocated_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cache, allocated_bytes
+
+
+if __name__ == "__main__":
+    identity_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    inputs = [('[<il: var_' + str(index) + '>, <il: ' + hex(index) + '>]MLIL_ADD').encode('utf-8')
+              for index in range(identity_count)]
+
+    for algorithm in Hashing.ALGORITHMS:
+        Hashing.configure(algorithm)
+        print("=" * 30, algorithm, "=" * 30)
+
+        hex_time, hex_keys = timed(hex_identities, HEX_DIGESTS[algorithm], inputs)
+        int_time, int_keys = timed(int_identities, inputs)
+        print("hash operands    hex: {:>8.0f} k/s   int: {:>8.0f} k/s".format(
+            identity_count / hex_time / 1000, identity_count / int_time / 1000))
+
+        hex_time, hex_context_keys = timed(hex_context_hashes, Hashing.ALGORITHMS[algorithm][0], hex_keys)
+        int_time, int_context_keys = timed(int_context_hashes, int_keys)
+        print("context hash     hex: {:>8.0f} k/s   int: {:>8.0f} k/s".format(
+            identity_count / hex_time / 1000, identity_count / int_time / 1000))
+
+        # Measure the memory of the keys themselves: fresh copies, like the identities created during an export
+        hex_cache, hex_bytes = cache_memory(bytes(key, 'ascii').decode('ascii') for key in hex_context_keys)
+        int_cache, int_bytes = cache_memory(key + 0 for key in int_context_keys)
+        print("context cache    hex: {:>8.1f} B/key  int: {:>8.1f} B/key".format(
+            hex_bytes / identity_count, int_bytes / identity_count))
+
+        hex_time, _ = timed(lookups, hex_cache, hex_context_keys)
+        int_time, _ = timed(lookups, int_cache, int_context_keys)
+        print("cache lookup     hex: {:>8.1f} ns     int: {:>8.1f} ns".format(
+            hex_time / identity_count * 1e9, int_time / identity_count * 1e9))
@@ -0,0 +1,197 @@
+"""
+Profile of the Binary Ninja core API calls made by the extraction of MLIL functions, with and without the snapshots
+of Core/extraction_helpers/MLILSnapshot.py.
+
+Binary Ninja computes every IL object property through the core API, so the MLIL is simulated by objects that count
+every property access (a new Python object is created for every operand expression on each operands access, like
+Binary Ninja does). The extraction walk below performs the same property accesses as BuildCSV and the extraction
+helpers do for every instruction and expression.
+
+The simulated calls themselves are free, so the measured time is only the Python side of the extraction. The
+estimated time adds the given cost per core call (a few microseconds for a ctypes round trip into the core).
+
+Usage (from the repository root):
+    python Benchmarks/mlil_ffi_calls.py [instruction_count] [microseconds_per_core_call]
+"""
+
+import collections
+import enum
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Core.extraction_helpers import MLILSnapshot
+
+# Amount of instructions of every simulated function
+FUNCTION_SIZE = 200
+
+# property name -> amount of simulated core API calls
+ffi_calls = collections.Counter()
+
+
+class Operation(enum.Enum):
+    MLIL_SET_VAR = 1
+    MLIL_VAR = 2
+    MLIL_CONST = 3
+    MLIL_ADD = 4
+    MLIL_LOAD = 5
+    MLIL_CALL = 6
+
+
+IL_OPERATIONS = {
+    Operation.MLIL_SET_VAR: [('dest', 'var'), ('src', 'expr')],
+    Operation.MLIL_VAR: [('src', 'var')],
+    Operation.MLIL_CONST: [('constant', 'int')],
+    Operation.MLIL_ADD: [('left', 'expr'), ('right', 'expr')],
+    Operation.MLIL_LOAD: [('src', 'expr')],
+    Operation.MLIL_CALL: [('output', 'var_list'), ('dest', 'expr'), ('params', 'expr_list')],
+}
+
+
+class CountingExpression:
+    # The core side of an expression is a plain tuple, the Python object is a handle that queries it
+
+    ILOperations = IL_OPERATIONS
+
+    def __init__(self, node):
+        self.node = node
+
+    @property
+    def operation(self):
+        ffi_calls['operation'] += 1
+        return self.node[0]
+
+    @property
+    def operands(self):
+        ffi_calls['operands'] += 1
+        operands = list()
+        for operand, (operand_name, operand_kind) in zip(self.node[2], IL_OPERATIONS[self.node[0]]):
+            if operand_kind == 'expr':
+                operands.append(CountingExpression(operand))
+            elif operand_kind == 'expr_list':
+                operands.append([CountingExpression(expr) for expr in operand])
+            else:
+                operands.append(operand)
+        return operands
+
+    @property
+    def expr_index(self):
+        ffi_calls['expr_index'] += 1
+        return self.node[1]
+
+    @property
+    def instr_index(self):
+        ffi_calls['instr_index'] += 1
+        return self.node[1]
+
+    @property
+    def address(self):
+        ffi_calls['address'] += 1
+        return 0x1000 + self.node[1]
+
+    @property
+    def vars_read(self):
+        ffi_calls['vars_read'] += 1
+        return ['var_' + str(self.node[1] % 7)]
+
+    @property
+    def vars_written(self):
+        ffi_calls['vars_written'] += 1
+        return ['var_' + str(self.node[1] % 5)]
+
+    @property
+    def possible_values(self):
+        ffi_calls['possible_values'] += 1
+        return self.node[1]
+
+    def __repr__(self):
+        # Binary Ninja renders the tokens of the expression through the core
+        ffi_calls['repr'] += 1
+        return '<il: ' + self.node[0].name + ' ' + str(self.node[1]) + '>'
+
+
+def random_instructions(instruction_count: int):
+    expr_index = 0
+
+    def node(operation, *operands):
+        nonlocal expr_index
+        expr_index += 1
+        return operation, expr_index, operands
+
+    def value(depth):
+        if depth == 0 or random.random() < 0.3:
+            return node(Operation.MLIL_VAR, 'var_1') if random.random() < 0.5 else node(Operation.MLIL_CONST, 4)
+        if random.random() < 0.3:
+            return node(Operation.MLIL_LOAD, value(depth - 1))
+        return node(Operation.MLIL_ADD, value(depth - 1), value(depth - 1))
+
+    instructions = list()
+    for _ in range(instruction_count):
+        if random.random() < 0.2:
+            instruction = node(Operation.MLIL_CALL, ['var_0'], node(Operation.MLIL_CONST, 0x2000),
+                               [value(2) for _ in range(3)])
+        else:
+            instruction = node(Operation.MLIL_SET_VAR, 'var_0', value(4))
+        instructions.append(CountingExpression(instruction))
+    return instructions
+
+
+def extract(instructions):
+    # The property accesses of VarDefUseIndex, Neo4jInstruction, expression_extract and Neo4jExpression
+    for instruction in instructions:
+        instruction.vars_written, instruction.vars_read
+
+    for instruction in instructions:
+        instruction_operands = str(instruction.operands)
+        instruction_hash = instruction_operands + str(instruction.operation)
+        (instruction.address, instruction.instr_index, instruction.possible_values, instruction.vars_read,
+         instruction.vars_written)
+
+        pending_expressions = [instruction]
+        while pending_expressions:
+            expression = pending_expressions.pop()
+            expression_text = str(expression.operands) + expression.operation.name
+            expression.operation.value, str(expression.ILOperations[expression.operation])
+            if expression.operation.name == 'MLIL_CALL':
+                expression.dest.operation
+            for operand_index, (operand_name, operand_kind) in enumerate(
+                    expression.ILOperations[expression.operation]):
+                operand = expression.operands[operand_index]
+                if operand_kind == 'expr':
+                    pending_expressions.append(operand)
+                elif operand_kind == 'expr_list':
+                    pending_expressions.extend(operand)
+
+
+def profile(instructions, use_snapshots: bool):
+    ffi_calls.clear()
+    start_time = time.perf_counter()
+    # Functions are extracted one at a time, only the snapshots of the current function are alive
+    for function_start in range(0, len(instructions), FUNCTION_SIZE):
+        function_instructions = instructions[function_start:function_start + FUNCTION_SIZE]
+        if use_snapshots:
+            function_instructions = [MLILSnapshot.snapshot_expression(instruction)
+                                     for instruction in function_instructions]
+        extract(function_instructions)
+    return time.perf_counter() - start_time, sum(ffi_calls.values()), dict(ffi_calls)
+
+
+# CountingExpression has no dest property, resolve it like Binary Ninja does: by operand name
+CountingExpression.dest = property(lambda expression: expression.operands[1])
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    instruction_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    call_cost = float(sys.argv[2]) / 1e6 if len(sys.argv) > 2 else 2e-6
+    instructions = random_instructions(instruction_count)
+
+    for title, use_snapshots in (('direct', False), ('snapshots', True)):
+        elapsed_time, call_count, calls = profile(instructions, use_snapshots)
+        print("{:<10} {:>10} core calls  ({:.1f} per instruction)  {:.2f} s measured, {:.2f} s estimated".format(
+            title, call_count, call_count / instruction_count, elapsed_time, elapsed_time + call_count * call_cost))
+        for property_name, property_calls in sorted(calls.items(), key=lambda item: -item[1]):
+            print("    {:<16} {:>10}".format(property_name, property_calls))
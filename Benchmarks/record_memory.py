@@ -0,0 +1,131 @@
+"""
+Memory benchmark of the object_cache entity layout.
+
+Builds the same synthetic binary (functions -> basic blocks -> instructions -> expressions -> variables\\constants)
+twice: once with the original dict layout of the object_cache entities and once with Records.EntityRecord, and
+reports the amount of bytes allocated per entity for each layout.
+
+Usage (from the repository root):
+    python Benchmarks/record_memory.py [function_count]
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Core.Common import ContextManagement, Hashing
+from Core.CSV_Processing import Records
+
+
+def synthetic_templates(function_count: int):
+    # Yield csv_templates shaped like the ones produced by the /extraction_helpers serialize() functions
+    bv_hash = Hashing.hash_text('bv')
+    for function_index in range(function_count):
+        function_context = ContextManagement.Context(bv_hash)
+        function_context.set_hash(Hashing.hash_text('func' + str(function_index)))
+        function_context.set_parent_hash(bv_hash)
+        yield 'Function', {
+            'mandatory_node_dict': {'HASH': function_context.SelfHASH, 'LABEL': 'Function'},
+            'mandatory_relationship_dict': {'START_ID': bv_hash, 'END_ID': function_context.SelfHASH,
+                                            'TYPE': 'MemberFunc', 'StartNodeLabel': 'BinaryView',
+                                            'EndNodeLabel': 'Function', 'Name': 'sub_' + str(function_index),
+                                            'Offset': function_index * 0x100},
+            'mandatory_context_dict': function_context.get_context(),
+            'node_attributes': {'ClobberedRegisters': ['eax', 'ecx'], 'CallingConvention': 'cdecl'},
+            'relationship_attributes': {},
+        }
+        for bb_index in range(8):
+            bb_context = ContextManagement.Context(bv_hash, function_context.SelfHASH)
+            bb_context.set_hash(Hashing.combine(function_context.SelfHASH, bb_index))
+            bb_context.set_parent_hash(function_context.SelfHASH)
+            yield 'BasicBlock', {
+                'mandatory_node_dict': {'HASH': bb_context.SelfHASH, 'LABEL': 'BasicBlock'},
+                'mandatory_relationship_dict': {'START_ID': bb_context.ParentHASH, 'BranchCondition': 0,
+                                                'END_ID': bb_context.SelfHASH, 'TYPE': 'Branch',
+                                                'StartNodeLabel': 'BasicBlock', 'EndNodeLabel': 'BasicBlock',
+                                                'BackEdge': False},
+                'mandatory_context_dict': bb_context.get_context(),
+                'node_attributes': {},
+                'relationship_attributes': {},
+            }
+            for instr_index in range(6):
+                instr_context = ContextManagement.Context(bv_hash, function_context.SelfHASH, bb_context.SelfHASH)
+                instr_context.set_hash(Hashing.combine(bb_context.SelfHASH, instr_index))
+                instr_context.set_parent_hash(bb_context.SelfHASH)
+                yield 'Instruction', {
+                    'mandatory_node_dict': {'HASH': instr_context.SelfHASH, 'LABEL': 'Instruction'},
+                    'mandatory_relationship_dict': {'START_ID': instr_context.ParentHASH,
+                                                    'END_ID': instr_context.SelfHASH, 'TYPE': 'NextInstruction',
+                                                    'StartNodeLabel': 'Instruction', 'EndNodeLabel': 'Instruction',
+                                                    'AssemblyOffset': 0x401000 + instr_index},
+                    'mandatory_context_dict': instr_context.get_context(),
+                    'node_attributes': {},
+                    'relationship_attributes': {'InstructionIndex': instr_index, 'PossibleValues': 0,
+                                                'VarsRead': ['var_8'], 'VarsWritten': ['eax']},
+                }
+                for expr_index in range(3):
+                    expr_context = ContextManagement.Context(bv_hash, function_context.SelfHASH, bb_context.SelfHASH,
+                                                             instr_context.SelfHASH, 0, expr_index)
+                    expr_context.set_hash(Hashing.combine(instr_context.SelfHASH, expr_index))
+                    expr_context.set_parent_hash(instr_context.SelfHASH)
+                    yield 'Expression', {
+                        'mandatory_node_dict': {'HASH': expr_context.SelfHASH, 'LABEL': 'Expression',
+                                                'Operands': '[<il: var_8>, <il: 0x10>]',
+                                                'OperationName': 'MLIL_ADD', 'OperationEnum': 20,
+                                                'OperationType': "[('left', 'expr'), ('right', 'expr')]"},
+                        'mandatory_relationship_dict': {'START_ID': expr_context.ParentHASH,
+                                                        'END_ID': expr_context.SelfHASH, 'TYPE': 'Operand',
+                                                        'StartNodeLabel': 'Instruction',
+                                                        'EndNodeLabel': 'Expression'},
+                        'mandatory_context_dict': expr_context.get_context(),
+                        'node_attributes': {},
+                        'relationship_attributes': {},
+                    }
+                    leaf_context = ContextManagement.Context(bv_hash, function_context.SelfHASH, bb_context.SelfHASH,
+                                                             instr_context.SelfHASH, expr_context.SelfHASH, 0)
+                    leaf_context.set_hash(Hashing.hash_text('const' + str(expr_index)))
+                    leaf_context.set_parent_hash(expr_context.SelfHASH)
+                    yield 'Constant', {
+                        'mandatory_node_dict': {'HASH': leaf_context.SelfHASH, 'LABEL': 'Constant',
+                                                'ConstantValue': expr_index},
+                        'mandatory_relationship_dict': {'START_ID': leaf_context.ParentHASH,
+                                                        'END_ID': leaf_context.SelfHASH, 'TYPE': 'ConstantOperand',
+                                                        'StartNodeLabel': 'Expression', 'EndNodeLabel': 'Constant'},
+                        'mandatory_context_dict': leaf_context.get_context(),
+                        'node_attributes': {'ConstType': int},
+                        'relationship_attributes': {},
+                    }
+
+
+def dict_layout(csv_template):
+    return {'Attributes': csv_template, 'WriteNode': True, 'WriteRelationship': True}
+
+
+def record_layout(csv_template):
+    return Records.EntityRecord.from_template(csv_template, True, True)
+
+
+def measure(function_count: int, layout):
+    object_cache = dict()
+    entity_count = 0
+
+    tracemalloc.start()
+    for label, csv_template in synthetic_templates(function_count):
+        object_cache.setdefault(label, dict()).setdefault(
+            csv_template['mandatory_context_dict']['SelfHASH'], list()).append(layout(csv_template))
+        entity_count += 1
+    allocated_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return entity_count, allocated_bytes
+
+
+if __name__ == "__main__":
+    function_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    for layout_name, layout in (('dict', dict_layout), ('EntityRecord', record_layout)):
+        entity_count, allocated_bytes = measure(function_count, layout)
+        print("{:<14} {:>9} entities {:>14,} bytes {:>8.1f} bytes/entity".format(
+            layout_name, entity_count, allocated_bytes, allocated_bytes / entity_count))
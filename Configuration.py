@@ -1,3 +1,5 @@
+import os
+
 # PATH to the import directory of the activated Neo4j DB, e.g:
 
 analysis_database_path = 'C:\\Users\\user\\.Neo4jDesktop\\neo4jDatabases\\database-fcc352f4-1ce6-469c-8081-39ae41e637e5\\installation-3.5.7\\import\\'
@@ -9,14 +11,178 @@ analysis_database_uri = "bolt://localhost:7687"
 analysis_database_user = "neo4j"
 analysis_database_password = "user"
 
+# Hash algorithm of all the node identities: 'xxh64', 'xxh3_64' or 'xxh128'.
+# Identities are integers during the extraction and written as hex strings into the CSV files, changing the algorithm
+# changes all the identities in the graph.
+HASH_ALGORITHM = 'xxh64'
+
+# What the BinaryView hash is computed from:
+# 'view' - the content of the BinaryView, from its start up to the first unreadable address (read in large chunks).
+# 'file' - the raw backing file on disk, hashed through a memory map. Much faster on large images, but gives
+#          different BinaryView identities than 'view', so graphs exported with either should not be mixed.
+BV_HASH_SOURCE = 'view'
+
+# Cache of the BinaryView hashes, keyed by the path, size and modification time of the backing file
+bv_hash_cache_path = os.path.join(analysis_database_path, 'bv_hash_cache.json')
+
+# Hash basic blocks from their rendered disassembly text instead of from their MLIL operations and the bytes of the
+# native instructions they were lifted from. Slower, only needed to keep the BasicBlock identities of graphs exported
+# before the byte based hash was added.
+TEXT_BASED_BLOCK_HASH = False
+
+# Hash expressions and instructions by their structure (Merkle style: operation + hashes of the operands) instead of
+# by the text of their whole operand sub-tree. Linear instead of quadratic in the expression depth.
+STRUCTURAL_EXPRESSION_HASH = False
+
+# Add the text of the operands as the 'Operands' property of Expression nodes.
+# Only optional with STRUCTURAL_EXPRESSION_HASH, the text based hash needs the operands text anyway.
+EXPRESSION_OPERANDS_PROPERTY = True
+
+# Which optional node\relationship attributes are computed (see Core/Common/AttributeProfiles.py):
+# 'full' - every attribute.
+# 'structure' - skip the attributes that run dataflow analysis (PossibleValues, ClobberedRegisters).
+# 'minimal' - only the graph structure, the cheapest export of huge binaries.
+# The Diaphora module reads ClobberedRegisters and CallingConvention, use 'full' for graphs it analyzes.
+ATTRIBUTE_PROFILE = 'full'
+
+# Read the MLIL of every function from Binary Ninja once into cached snapshot objects (see
+# Core/extraction_helpers/MLILSnapshot.py) instead of crossing the core API on every property access. Off until the
+# snapshots were checked against the extraction of the live expressions.
+USE_MLIL_SNAPSHOTS = False
+
 # Minimum amount of mlil basic blocks required in each analyzed function
 MIN_MLIL_BASIC_BLOCKS = 1
 
-# Amount of threads to employ when committing data to the neo4j DB
+# Amount of worker processes used to extract functions from the BinaryView.
+# 1 keeps the classic serial extraction. Any higher value splits the function list into shards that are extracted
+# by separate processes, each opening the binary once with headless Binary Ninja (requires a headless license), and
+# merges the results so that the CSV output is identical to a serial run. The workers open the binary from the disk, a
+# BinaryView with unsaved changes is extracted serially.
+EXTRACTION_PROCESSES = 1
+
+# Amount of shards handed to every extraction process, more shards give a better load balance between the processes
+EXTRACTION_SHARDS_PER_PROCESS = 4
+
+# Write the entities of every function into the CSV files as soon as the function is extracted, instead of buffering
+# the whole BinaryView in memory. Only a small de-duplication index is kept, so the peak memory is bounded by the
+# largest function rather than by the whole binary.
+STREAMING_EXTRACTION = False
+
+# Only re-extract the functions that were added or changed since the previous export of the same BinaryView, and
+# list the changed\removed ones in Delete-functions.csv so ExportNeo4j detaches them before loading the delta.
+INCREMENTAL_EXPORT = False
+
+# Directory of the per BinaryView function manifests used by incremental exports. Every export writes its manifest
+# next to its CSV files, ExportNeo4j (or BulkImport.py --run) moves it here once the export is loaded into the graph.
+manifest_path = os.path.join(analysis_database_path, 'manifests')
+
+# Amount of binaries exported in parallel by BatchExport.py (every binary is opened by its own headless Binary Ninja
+# process, requires a headless license). The functions of every binary are extracted serially within its process.
+BATCH_EXPORT_PROCESSES = 4
+
+# Default root directory of BatchExport.py, every binary gets its own sub-directory of CSV files under it. It is kept
+# next to the import directory rather than inside it, ExportNeo4j loads the CSV files of the import directory itself.
+batch_output_path = os.path.join(os.path.dirname(os.path.normpath(analysis_database_path)), 'batch')
+
+# Compress the CSV files: None, 'gzip' (.csv.gz, read by Neo4j LOAD CSV directly) or 'zstd' (.csv.zst, needs the
+# zstandard package, falls back to gzip without it). ExportNeo4j reads both: the files Neo4j can not read itself (zstd
+# files, and the relationship files read by apoc.load.csv) are decompressed next to themselves for the duration of
+# their load.
+CSV_COMPRESSION = None
+
+# Compression level of the CSV files (gzip 1-9, zstd 1-22), lower levels compress faster into larger files
+CSV_COMPRESSION_LEVEL = 3
+
+# Write the CSV files on a background thread, so the extraction does not wait for the disk (mostly useful when the
+# import directory is on a slow or network disk). The rows are handed to the thread in batches through a bounded queue.
+ASYNC_CSV_WRITER = False
+
+# Amount of row batches (of BackgroundWriter.BATCH_SIZE characters) that may wait for the writer thread, the extraction
+# blocks while the queue is full
+CSV_WRITER_QUEUE_SIZE = 64
+
+# Also write the CSV files in the input format of the offline neo4j-admin import (into an 'admin-import' sub-directory
+# of the CSV files), to build a fresh DB much faster than ExportNeo4j can load it. The import itself is run by
+# Core/Neo4j_Processing/BulkImport.py. Only meant for full exports: the files of an incremental export, or of an export
+# with NODE_HASH_STORE, miss nodes that the import needs.
+ADMIN_IMPORT_CSV = False
+
+# The neo4j-admin executable of the Neo4j installation, and its major version: 5 imports with
+# "neo4j-admin database import full", earlier versions with "neo4j-admin import"
+neo4j_admin_path = 'neo4j-admin'
+NEO4J_ADMIN_VERSION = 4
+
+# Name of the DB created by BulkImport.py ('graph.db' on Neo4j 3.5)
+admin_import_database = 'neo4j'
+
+# Skip the nodes that are already in the graph: ExportNeo4j records the hashes of every node it loads into a local
+# hash store, and the extraction only writes the relationships to nodes found in it (e.g the nodes of library code
+# shared by many binaries). Only the nodes that were committed are recorded. The store remembers the graph DB it
+# describes (by the GraphIdentity node of the graph), and is emptied when it is used with another DB or once the DB was
+# cleared. Exports extracted with the store before it was emptied miss nodes, extract them again.
+NODE_HASH_STORE = False
+
+# Path of the node hash store (a sqlite DB)
+node_hash_store_path = os.path.join(analysis_database_path, 'node_hashes.sqlite')
+
+# Write a JSON run report (stage timings, entity counts, cache hit rates) next to the CSV files after every extraction
+# and every load into the neo4j DB, see Core/Common/Instrumentation.py
+RUN_REPORT = True
+
+# Add a cProfile capture of the run to the run report (the full capture is written next to it as a .prof file)
+PROFILE_CPU = False
+
+# Add the peak memory and the top allocations of the run (traced with tracemalloc) to the run report.
+# Slows the run down considerably.
+PROFILE_MEMORY = False
+
+# Amount of threads to employ when committing data to the neo4j DB, the maximal amount of concurrent transactions
 THREAD_COUNT = 25
 
-# Amount of relationship dictionaries to send in a single transaction to the neo4j DB
+# Amount of node dictionaries to send in a single transaction to the neo4j DB (the initial amount with ADAPTIVE_WRITES)
+NODE_BATCH_SIZE = 1000
+
+# CREATE the nodes instead of merging them when the DB holds no nodes at all (checked before the load), which skips the
+# index lookup of every node. Requires the node files to hold every node once, as the files of a single export do.
+CREATE_NODES_IN_EMPTY_DB = False
+
+# Amount of relationship dictionaries to send in a single transaction to the neo4j DB (the initial amount with
+# ADAPTIVE_WRITES)
 BATCH_SIZE = 150
 
-# Number of retry attempts to make when an error occured in the relationship committing process
+# Amount of node or relationship batches that may wait for every DB writer thread, the CSV reading blocks while the
+# queue of a writer is full
+DB_WRITER_QUEUE_SIZE = 4
+
+# The relationship column that partitions the relationships between the DB writer threads: all the relationships with
+# the same value are merged by the same thread, so their transactions never compete for the lock of that node.
+# 'START_ID' (the start node), 'END_ID' (the end node), 'RootFunction' (the whole sub-tree of a function) or 'auto'
+# (the endpoint of the label ranked first in HOT_NODE_LABELS, see ExportNeo4j.partition_column).
+# Merging a relationship locks both its nodes, so batches of different threads may still share the other endpoint and
+# deadlock. Such conflicts are transient errors, retried by ExportNeo4j.run_batch after a backoff.
+RELATIONSHIP_PARTITION_FIELD = 'auto'
+
+# Node labels ordered from the most shared to the least shared by relationships of different start nodes (a String is
+# referenced by the constants of many functions, a BasicBlock only by its own function). The 'auto' partitioning keys
+# a relationship on its endpoint of the first label in this list, labels that are not listed come last.
+HOT_NODE_LABELS = ('BinaryView', 'Symbol', 'String', 'Constant', 'Variable', 'Function', 'Expression', 'Instruction',
+                   'BasicBlock')
+
+# Number of retry attempts of a batch that failed on a transient error (e.g a deadlock) or on an unavailable server,
+# after a jittered exponential backoff. The rows of a batch that still fails are written to the dead letter file.
 RETRIES = 5
+
+# Adapt the batch sizes and the amount of concurrent transactions to the commit latency and the transient errors of the
+# DB (AIMD: grow them while the commits are fast, halve them on congestion), see Core/Neo4j_Processing/WriteControl.py.
+# Otherwise the batch sizes and THREAD_COUNT stay fixed, as they always were.
+ADAPTIVE_WRITES = False
+
+# Seconds a batch may take to commit before ADAPTIVE_WRITES decreases the write load
+TARGET_COMMIT_SECONDS = 2.0
+
+# ADAPTIVE_WRITES never grows a batch beyond this amount of rows
+MAX_BATCH_SIZE = 10000
+
+# CSV file of the rows that could not be written into the DB (after all the retries), with the query and the error.
+# Removed at the start of every load.
+dead_letter_path = os.path.join(analysis_database_path, 'Dead-letters.csv')
@@ -0,0 +1,276 @@
+"""
+Conversion of the CSV files of finished exports into the input files of the offline neo4j-admin import.
+
+ExportNeo4j merges every node and relationship into a running DB, a row per Cypher call. A fresh DB is built orders of
+magnitude faster by neo4j-admin import, which reads:
+    - a header file and a data file per node label, with a HASH:ID(<label>) identity column (an ID space per label,
+      nodes of different labels may share a hash) and a :LABEL column.
+    - a header file and a data file per relationship type and the labels of its start and end nodes, since their ID
+      spaces are part of the :START_ID(<label>) and :END_ID(<label>) columns of the header.
+    - no duplicate node IDs, and no relationships to nodes that are not imported.
+convert() writes these files from the CSV files of one or more exports (e.g all the binaries of a BatchExport into a
+single DB), and import_command() assembles the neo4j-admin command line that imports them, see
+Neo4j_Processing/BulkImport.py.
+
+The imported graph is the one ExportNeo4j loads: nodes and relationships are de-duplicated by the same keys that
+ExportNeo4j merges them on, every property column is typed as a string (LOAD CSV reads every value as a string, and
+the Cypher of ExportNeo4j and of incremental exports matches the string values), and the helper columns removed by
+ExportNeo4j.GraphCleanup are not imported at all.
+
+Imports neither binaryninja nor the Configuration, the import driver runs outside of Binary Ninja.
+"""
+
+import collections
+import csv
+import os
+
+from ..Common import CompressedIO, Hashing
+
+# Sub-directory of an export that CSV_Serialize writes the import files into (see Configuration.ADMIN_IMPORT_CSV).
+# ExportNeo4j only loads the top level of the export, never the files of its sub-directories.
+IMPORT_DIRECTORY = 'admin-import'
+
+# Write buffer of the data files
+WRITE_BUFFER_SIZE = 1 << 20
+
+# File name prefixes of the node and relationship files, the data file of '<prefix><name>-header.csv' is
+# '<prefix><name>.csv' (or '.csv.gz')
+NODE_PREFIX = 'Node-'
+RELATIONSHIP_PREFIX = 'Relationship-'
+HEADER_SUFFIX = '-header.csv'
+
+# Columns that only serve the transactional load, see ExportNeo4j.GraphCleanup
+NODE_HELPER_FIELDS = ('HASH', 'LABEL', 'RootFunction', 'RootBasicBlock', 'RootInstruction', 'RootExpression')
+RELATIONSHIP_HELPER_FIELDS = ('START_ID', 'END_ID', 'TYPE', 'StartNodeLabel', 'EndNodeLabel')
+
+
+def export_files(export_path: str, suffix: str):
+    """
+    :param suffix: (STR) '-nodes.csv' or '-relationships.csv'
+    :return: (LIST) the sorted paths of the CSV files of an export, plain or compressed, with the given suffix
+    """
+    return sorted(os.path.join(export_path, filename) for filename in os.listdir(export_path)
+                  if CompressedIO.base_name(filename).endswith(suffix))
+
+
+class ImportFile:
+    # A data file of the import directory. Its header file is written as soon as it is created: the identity columns
+    # followed by the property columns of the first CSV file converted into it.
+
+    __slots__ = ('csv_file', 'writer', 'properties', 'helper_fields', 'plans')
+
+    def __init__(self, path: str, id_columns: tuple, properties: tuple, helper_fields: tuple, compression=None,
+                 level=None):
+        """
+        :param path: (STR) path of the data file, without the extension of its compression
+        :param id_columns: (TUPLE) the typed identity columns of the header (e.g 'HASH:ID(Function)', ':LABEL')
+        :param properties: (TUPLE) the property names of the rows
+        :param helper_fields: (TUPLE) the fields of the CSV files that are not imported as properties
+        :param compression: None or 'gzip', the compressions neo4j-admin reads
+        """
+        with open(path[:-len('.csv')] + HEADER_SUFFIX, 'w', encoding='utf-8', newline='') as header_file:
+            csv.writer(header_file).writerow(id_columns + tuple(field + ':string' for field in properties))
+
+        self.csv_file = CompressedIO.open_text(path + CompressedIO.EXTENSIONS.get(compression, ''), 'w', level,
+                                               buffering=WRITE_BUFFER_SIZE)
+        self.writer = csv.writer(self.csv_file)
+        self.properties = properties
+        self.helper_fields = helper_fields
+        # Header fields of a CSV file -> indexes of the property columns within its rows
+        self.plans = dict()
+
+    def property_indexes(self, fields: tuple):
+        plan = self.plans.get(fields)
+        if plan is None:
+            unknown_fields = set(fields).difference(self.properties, self.helper_fields)
+            if unknown_fields:
+                raise ValueError("CSV file contains fields not in the import header: " +
+                                 ', '.join(map(repr, unknown_fields)))
+            plan = tuple(fields.index(field) if field in fields else None for field in self.properties)
+            self.plans.update({fields: plan})
+
+        return plan
+
+    def write(self, id_values: list, fields: tuple, row: list):
+        """
+        :param id_values: (LIST) the values of the identity columns
+        :param fields: (TUPLE) the header of the CSV file the row was read from
+        """
+        id_values.extend('' if index is None else row[index] for index in self.property_indexes(fields))
+        self.writer.writerow(id_values)
+
+    def close(self):
+        self.csv_file.close()
+
+
+class ImportDirectory:
+    # The import files written by a conversion. Nodes and relationships already written are skipped, keyed the same
+    # way ExportNeo4j merges them: nodes by their label and HASH, relationships by their start node, TYPE, end node
+    # and ContextHash.
+
+    def __init__(self, import_path: str, compression=None, level=None):
+        self.import_path = import_path
+        self.compression = compression
+        self.level = level
+
+        # file name -> its ImportFile
+        self.files = dict()
+        # node label -> the INT identities of its nodes written so far
+        self.node_ids = collections.defaultdict(set)
+        # Digests of the merge keys of the relationships written so far
+        self.relationship_keys = set()
+        self.counts = collections.Counter()
+
+    def import_file(self, name: str, id_columns: tuple, fields: tuple, helper_fields: tuple):
+        import_file = self.files.get(name)
+        if import_file is None:
+            import_file = ImportFile(os.path.join(self.import_path, name + '.csv'), id_columns,
+                                     tuple(field for field in fields if field not in helper_fields), helper_fields,
+                                     self.compression, self.level)
+            self.files.update({name: import_file})
+
+        return import_file
+
+    def add_nodes(self, path: str):
+        with CompressedIO.open_text(path) as csv_file:
+            reader = csv.reader(csv_file)
+            fields = tuple(next(reader, ()))
+            if not fields:
+                return
+            hash_index = fields.index('HASH')
+            label_index = fields.index('LABEL')
+
+            for row in reader:
+                label = row[label_index]
+                node_ids = self.node_ids[label]
+                node_id = Hashing.parse_hash(row[hash_index])
+                if node_id in node_ids:
+                    self.counts['duplicate_nodes'] += 1
+                    continue
+                node_ids.add(node_id)
+
+                self.import_file(NODE_PREFIX + label, ('HASH:ID(' + label + ')', ':LABEL'), fields,
+                                 NODE_HELPER_FIELDS).write([row[hash_index], label], fields, row)
+                self.counts['nodes'] += 1
+
+    def add_relationships(self, path: str):
+        with CompressedIO.open_text(path) as csv_file:
+            reader = csv.reader(csv_file)
+            fields = tuple(next(reader, ()))
+            if not fields:
+                return
+            start_index, end_index, type_index, start_label_index, end_label_index = map(
+                fields.index, RELATIONSHIP_HELPER_FIELDS)
+            context_hash_index = fields.index('ContextHash') if 'ContextHash' in fields else None
+
+            for row in reader:
+                start_id, end_id = row[start_index], row[end_index]
+                start_label, end_label = row[start_label_index], row[end_label_index]
+                # Relationships whose node is not part of the import can not be created (e.g relationships to the
+                # nodes of an export with Configuration.NODE_HASH_STORE, that are already in another graph)
+                if Hashing.parse_hash(start_id) not in self.node_ids.get(start_label, ()) or \
+                        Hashing.parse_hash(end_id) not in self.node_ids.get(end_label, ()):
+                    self.counts['dangling_relationships'] += 1
+                    continue
+
+                relationship_type = row[type_index]
+                relationship_key = Hashing.hash_text(','.join((
+                    start_label, start_id, relationship_type, end_label, end_id,
+                    '' if context_hash_index is None else row[context_hash_index])))
+                if relationship_key in self.relationship_keys:
+                    self.counts['duplicate_relationships'] += 1
+                    continue
+                self.relationship_keys.add(relationship_key)
+
+                self.import_file(RELATIONSHIP_PREFIX + relationship_type + '-' + start_label + '-' + end_label,
+                                 (':START_ID(' + start_label + ')', ':END_ID(' + end_label + ')', ':TYPE'), fields,
+                                 RELATIONSHIP_HELPER_FIELDS).write([start_id, end_id, relationship_type], fields, row)
+                self.counts['relationships'] += 1
+
+    def close(self):
+        for import_file in self.files.values():
+            import_file.close()
+
+
+def remove_import_files(import_path: str):
+    # Import files left behind by a previous conversion would be imported as well
+    for filename in os.listdir(import_path):
+        if filename.startswith((NODE_PREFIX, RELATIONSHIP_PREFIX)):
+            os.remove(os.path.join(import_path, filename))
+
+
+def convert(export_paths: list, import_path: str, compression=None, level=None):
+    """
+    Write the neo4j-admin import files of the CSV files of finished exports.
+    Holds the identities of all the nodes and relationships in memory, to de-duplicate them.
+    :param export_paths: (LIST) the output directories of the exports
+    :param import_path: (STR) directory to write the import files into, its previous import files are removed
+    :param compression: None or 'gzip', the compression of the data files
+    :param level: (INT) compression level of the data files
+    :return: (DICT) amount of nodes and relationships written, and of the duplicate and dangling rows skipped
+    """
+    os.makedirs(import_path, exist_ok=True)
+    remove_import_files(import_path)
+
+    import_directory = ImportDirectory(import_path, compression, level)
+    try:
+        # All the nodes first, the relationships of every export may point to the nodes of any other
+        for export_path in export_paths:
+            for path in export_files(export_path, '-nodes.csv'):
+                import_directory.add_nodes(path)
+        for export_path in export_paths:
+            for path in export_files(export_path, '-relationships.csv'):
+                import_directory.add_relationships(path)
+    finally:
+        import_directory.close()
+
+    if import_directory.counts['dangling_relationships']:
+        print("Skipped ", import_directory.counts['dangling_relationships'],
+              " relationships to nodes that are not part of the import")
+
+    return dict(import_directory.counts)
+
+
+def import_files(import_path: str):
+    """
+    :return: (TUPLE) two sorted lists of 'header,data' file pairs: of the nodes and of the relationships
+    """
+    node_files = list()
+    relationship_files = list()
+    for filename in sorted(os.listdir(import_path)):
+        if not filename.endswith(HEADER_SUFFIX):
+            continue
+        data_file = CompressedIO.find(os.path.join(import_path, filename[:-len(HEADER_SUFFIX)] + '.csv'))
+        if data_file is None:
+            continue
+        file_pair = os.path.join(import_path, filename) + ',' + data_file
+        if filename.startswith(NODE_PREFIX):
+            node_files.append(file_pair)
+        elif filename.startswith(RELATIONSHIP_PREFIX):
+            relationship_files.append(file_pair)
+
+    return node_files, relationship_files
+
+
+def import_command(import_path: str, database: str, neo4j_admin='neo4j-admin', version=4):
+    """
+    :param database: (STR) name of the DB to create
+    :param neo4j_admin: (STR) the neo4j-admin executable
+    :param version: (INT) major version of Neo4j: 5 imports with "neo4j-admin database import full", earlier versions
+                    with "neo4j-admin import"
+    :return: (LIST) the arguments of the neo4j-admin import of all the import files in the directory
+    """
+    node_files, relationship_files = import_files(import_path)
+
+    if version >= 5:
+        command = [neo4j_admin, 'database', 'import', 'full']
+    else:
+        command = [neo4j_admin, 'import', '--database=' + database]
+    # String properties (e.g the RawString of String nodes) may hold line breaks
+    command.append('--multiline-fields=true')
+    command.extend('--nodes=' + file_pair for file_pair in node_files)
+    command.extend('--relationships=' + file_pair for file_pair in relationship_files)
+    if version >= 5:
+        command.append(database)
+
+    return command
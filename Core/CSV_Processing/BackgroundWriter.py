@@ -0,0 +1,107 @@
+"""
+Asynchronous writing of the CSV files (see Configuration.ASYNC_CSV_WRITER).
+
+The rows are still encoded on the extraction thread (the csv.writer of every RecordWriter writes into a QueuedFile),
+but the disk writes happen on a dedicated writer thread: every QueuedFile hands its encoded rows in batches to the
+BackgroundWriter, which drains them into the real files. The file writes release the GIL, so the extraction (Binary
+Ninja API calls) keeps running while the rows are written.
+The queue is bounded: once the disk falls behind, the extraction blocks on the next batch until there is room again.
+
+This module has no dependencies on binaryninja or on the Configuration, so it can be imported by the benchmarks as
+well.
+"""
+
+import queue
+import threading
+
+# Size (in characters) of the encoded row batches handed to the writer thread
+BATCH_SIZE = 1 << 18
+
+
+class BackgroundWriter:
+
+    def __init__(self, queue_size: int):
+        """
+        :param queue_size: (INT) amount of batches that may wait for the writer thread before the producers block
+        """
+        self.queue = queue.Queue(maxsize=queue_size)
+        # The first error of the writer thread, raised to the producer on its next call
+        self.error = None
+        self.thread = threading.Thread(target=self.write_batches, name='BackgroundWriter', daemon=True)
+        self.thread.start()
+
+    def write_batches(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is None:
+                    return
+                target_file, text = batch
+                # After an error the remaining batches are only consumed, so that no producer blocks forever
+                if self.error is None:
+                    target_file.write(text)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def submit(self, target_file, text: str):
+        """
+        Queue text to be written into a file, blocks while the queue is full.
+        """
+        self.raise_error()
+        self.queue.put((target_file, text))
+
+    def drain(self):
+        """
+        Wait until every queued batch was written.
+        """
+        self.queue.join()
+        self.raise_error()
+
+    def close(self):
+        """
+        Write the remaining batches and stop the writer thread.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.raise_error()
+
+
+class QueuedFile:
+    # The file object given to the csv.writer of a CSV file when the BackgroundWriter is used: collects the encoded
+    # rows of the file and submits them to the BackgroundWriter in batches.
+
+    __slots__ = ('background_writer', 'target_file', 'parts', 'size')
+
+    def __init__(self, background_writer: BackgroundWriter, target_file):
+        """
+        :param background_writer: the BackgroundWriter that writes the batches
+        :param target_file: the file the batches are written into
+        """
+        self.background_writer = background_writer
+        self.target_file = target_file
+        self.parts = list()
+        self.size = 0
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= BATCH_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        """
+        Submit the rows collected so far (the submitted batch is not necessarily written yet, see
+        BackgroundWriter.drain)
+        """
+        if self.parts:
+            self.background_writer.submit(self.target_file, ''.join(self.parts))
+            self.parts = list()
+            self.size = 0
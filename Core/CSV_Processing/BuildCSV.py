@@ -2,16 +2,24 @@
 this module contains all the procedures for extracting data from a binary ninja binary view.
 """
 
-from ..extraction_helpers import BinaryView, Function, BasicBlock, Instruction, Expression, Constant, \
-    Variable, String, ProgramSymbol, CallSite
+from ..extraction_helpers import SegmentBuffer, AddressIndex, MLILSnapshot, OperandLayout, BinaryView, Function, \
+    BasicBlock, Instruction, Expression, Constant, Variable, String, ProgramSymbol, CallSite
 
-from . import CSV_Helper, PostProcessing
+from . import CSV_Helper, PostProcessing, Records, IncrementalExport
 
 from ... import Configuration
 
-from ..Common import ContextManagement
+from ..Common import ContextManagement, Hashing, AttributeProfiles, Instrumentation, HashStore
 
-import time
+from binaryninja import BinaryViewType
+
+from concurrent.futures import ProcessPoolExecutor
+import collections
+import multiprocessing
+import multiprocessing.util
+
+# object_cache key -> label of its nodes in the graph, where the two differ
+GRAPH_LABELS = {'ProgramSymbol': 'Symbol'}
 
 
 class BinjaGraph:
@@ -21,16 +29,31 @@ class BinjaGraph:
     #   3. Collect any additional information requested by the analysis_database_user
     #      from each object (via the /extraction_helpers)
 
-    def __init__(self, driver, bv: BinaryView.BinaryView):
+    def __init__(self, driver, bv: BinaryView.BinaryView, bv_hash=None, output_path=None):
         """
         :param driver: The Neo4jBoltDriver object, facilitates communication with the DB
         :param uuid_generator: Provides UUID's for newly created objects
         :param bv: BinaryNinja BinaryView object, all information is extracted from this object
+        :param bv_hash: (INT) an already calculated hash of the BinaryView (see Neo4jBinaryView)
+        :param output_path: (STR) directory of the CSV files and the run report, Configuration.analysis_database_path
+                            if None
         """
+        Hashing.configure(Configuration.HASH_ALGORITHM)
+        AttributeProfiles.configure(Configuration.ATTRIBUTE_PROFILE)
+
+        # Stage timings, entity counts and cache hit rates of this export, see bv_extract
+        self.run_report = Instrumentation.RunReport('extraction', Configuration.PROFILE_CPU,
+                                                    Configuration.PROFILE_MEMORY)
+
         self.driver = driver
         self.bv = bv
-        self.CSV_serializer = CSV_Helper.CSV_Serialize()
-        self.bv_object = BinaryView.Neo4jBinaryView(self.bv)
+        self.output_path = output_path or Configuration.analysis_database_path
+        # The CSV files are only opened once the export starts, extraction worker processes never open them
+        self.CSV_serializer = None
+        with self.run_report.stage('hashing'):
+            self.bv_object = BinaryView.Neo4jBinaryView(self.bv, bv_hash)
+        # The executable segments, read on first use and shared by all function and basic block hashes
+        self.segment_buffer = SegmentBuffer.SegmentBuffer(self.bv)
 
         self.object_cache = dict({
             'BinaryView': dict(), 'Function': dict(), 'BasicBlock': dict(),
@@ -40,55 +63,284 @@ class BinjaGraph:
         }
         )
 
+        # A set of all node hashes already inserted into the object_cache, per label. Unlike the object_cache this
+        # index is never flushed, so it keeps de-duplicating nodes in streaming mode.
+        self.node_index = {label: set() for label in self.object_cache}
+
+        # Hashes of the nodes already loaded into the graph by previous exports, these nodes are not written again
+        self.hash_store = None
+        if Configuration.NODE_HASH_STORE:
+            self.hash_store = HashStore.HashStore(Configuration.node_hash_store_path, self.graph_identity()).open()
+            if self.hash_store.cleared:
+                print("The node hash store described a different graph DB, it was emptied")
+
         # A dict of all context hashes already inserted into the object_cache
         self.context_hash_cache = dict()
 
-        self.string_mapping = dict()
-        for string in self.bv.strings:
-            self.string_mapping.update({str(string.start): str(string.value)})
+        # Structural hashes of the expressions of the function currently extracted (see func_extract)
+        self.structural_hasher = None
+
+        # Variable definitions and uses of the function currently extracted (see func_extract)
+        self.var_def_use_index = None
+
+        # operand kind -> amount of operands of that kind that the extraction does not support
+        self.unhandled_operands = collections.Counter()
 
-        self.symbol_mapping = dict()
-        for program_symbol in self.bv.symbols.values():
-            self.symbol_mapping.update({str(program_symbol.address): program_symbol})
+        # The call graph, recorded while the call expressions are extracted (see expression_node_extract).
+        # list of (call destination address, RootBinaryView, RootFunction, RootBasicBlock, RootInstruction,
+        #          ContextHash of the call expression), resolved into CallSite objects by def_function_calls.
+        self.call_graph = list()
 
-    def bv_extract(self):
+        # function offset -> (function hash, function name) of every function exported so far, persisted as the
+        # FunctionManifest of this export
+        self.function_manifest = dict()
+
+        # function hash -> the addresses its call expressions call (see def_function_calls), persisted in the
+        # FunctionManifest of this export
+        self.function_calls = collections.defaultdict(set)
+
+        # function offset -> function hash, of the functions hashed ahead of the extraction
+        self.function_hashes = dict()
+
+        # Resolve pointer constants into strings and program symbols, both built on first use
+        self.string_index = AddressIndex.StringIndex(self.bv)
+        self.symbol_index = AddressIndex.SymbolIndex(self.bv)
+
+    def graph_identity(self):
+        """
+        :return: (STR) the identity of the graph DB the export is loaded into (see HashStore.graph_identity), None
+                 when there is no driver (e.g extraction workers and batch exports) or the DB can not be reached
+        """
+        if self.driver is None:
+            return None
+        try:
+            return HashStore.graph_identity(self.driver)
+        except Exception as e:
+            print("Could not read the identity of the graph DB, using the node hash store unchecked: ", repr(e))
+            return None
+
+    def bv_extract(self, process_count=None):
         """
         populate the graph with relevant info from the bv itself
+        :param process_count: (INT) amount of function extraction processes, Configuration.EXTRACTION_PROCESSES if None
         """
+        if process_count is None:
+            process_count = Configuration.EXTRACTION_PROCESSES
+
+        self.CSV_serializer = CSV_Helper.CSV_Serialize(self.output_path)
+
+        # Offsets of the functions to extract, None stands for all the functions in the BinaryView
+        function_starts = None
+        if Configuration.INCREMENTAL_EXPORT:
+            with self.run_report.stage('incremental_diff'):
+                function_starts = self.incremental_function_starts()
 
         self.update_object_cache('BinaryView', self.bv_object, True, True)
 
-        start_time = time.time()
-        # Iterate all functions in the BinaryView
-        for func in self.bv:
-            if len(func.mlil.basic_blocks) >= Configuration.MIN_MLIL_BASIC_BLOCKS:
-                self.func_extract(func, self.bv_object)
-        end_time = time.time()
-        print("Finished defining function AST in ", end_time - start_time, " seconds")
+        if process_count > 1 and self.bv.file.modified:
+            # The extraction workers open the binary from the disk, they would not see the unsaved changes
+            print("The BinaryView has unsaved changes (e.g renames or types), save it to extract its functions in "
+                  "parallel. Extracting them serially instead.")
+            process_count = 1
+
+        # Iterate all functions in the BinaryView.
+        # In streaming mode the function walk includes the csv_write of every function.
+        with self.run_report.stage('function_walk'):
+            if process_count > 1:
+                self.parallel_func_extract(process_count, function_starts)
+            else:
+                functions = self.bv if function_starts is None else map(self.bv.get_function_at, function_starts)
+                for func in functions:
+                    if len(func.mlil.basic_blocks) >= Configuration.MIN_MLIL_BASIC_BLOCKS:
+                        self.func_extract(func, self.bv_object)
+                        if Configuration.STREAMING_EXTRACTION:
+                            self.flush_object_cache()
+        print("Finished defining function AST in ", self.run_report.stages['function_walk']['wall'], " seconds")
+        if self.unhandled_operands:
+            print("Skipped unsupported expression operands: ", dict(self.unhandled_operands))
+            for operand_kind, operand_count in self.unhandled_operands.items():
+                self.run_report.count('UnhandledOperands.' + operand_kind, operand_count)
 
         # Define function calls (instruction to function objects)
-        self.def_function_calls()
+        with self.run_report.stage('call_resolution'):
+            self.def_function_calls()
+
+        self.flush_object_cache()
+
+        with self.run_report.stage('post_processing'):
+            post_processor = PostProcessing.CSVPostProcessor(self.bv, self.CSV_serializer)
+            post_processor.run_all()
+        with self.run_report.stage('csv_write'):
+            self.CSV_serializer.close_file_handles()
+
+        if Configuration.ADMIN_IMPORT_CSV:
+            with self.run_report.stage('admin_import_csv'):
+                for name, count in self.CSV_serializer.write_admin_import_files().items():
+                    self.run_report.count('AdminImport.' + name, count)
+
+        # Committed into Configuration.manifest_path once the export is loaded into the graph
+        IncrementalExport.FunctionManifest(self.bv_object.FILENAME, self.bv_object.context.SelfHASH,
+                                           self.function_manifest, self.function_calls).save_pending(self.output_path)
+
+        if self.hash_store is not None:
+            self.hash_store.close()
+
+        if Configuration.RUN_REPORT:
+            self.run_report.write(self.output_path)
+
+    def incremental_function_starts(self):
+        """
+        Compare the functions of the BinaryView against the manifest of its previous export.
+        Functions that did not change are not extracted again, but stay known to def_function_calls and to the
+        manifest of this export. Changed and removed functions are written into Delete-functions.csv.
+        The unchanged callers of new, changed and removed functions are extracted again, so their FunctionCall
+        relationships point at the current functions, and their calls to the previous hashes are written into
+        Delete-calls.csv.
+        :return: (LIST) offsets of the functions to extract, None if there is no previous export
+        """
+        manifest = IncrementalExport.FunctionManifest.load(Configuration.manifest_path, self.bv_object.FILENAME,
+                                                           self.bv_object.context.SelfHASH)
+        if manifest is None:
+            return None
+
+        # Keep the identity of the BinaryView node in the graph, even if the binary was patched since
+        self.bv_object.context.set_hash(manifest.bv_hash)
+
+        current_functions = dict()
+        for func in self.bv:
+            if len(func.mlil.basic_blocks) >= Configuration.MIN_MLIL_BASIC_BLOCKS:
+                func_hash = Function.Neo4jFunction(func.mlil, ContextManagement.Context(), None,
+                                                   self.segment_buffer).context.SelfHASH
+                self.function_hashes.update({func.start: func_hash})
+                current_functions.update({func.start: (func_hash, str(func.name))})
+
+        changed_offsets, stale_functions = manifest.diff(current_functions)
+
+        current_function_hashes = set(self.function_hashes.values())
+        self.CSV_serializer.serialize_deleted_functions([
+            {'RootBinaryView': manifest.bv_hash, 'HASH': func_hash, 'Offset': offset, 'Name': name,
+             # The sub-tree of a function is shared by all identical functions, only detach it if no current
+             # function still uses it
+             'DeleteSubtree': func_hash not in current_function_hashes}
+            for offset, (func_hash, name) in stale_functions.items()
+        ])
+
+        changed_offsets = set(changed_offsets)
+        deleted_calls = set()
+        if manifest.calls is None:
+            # The calls of the unchanged functions are unknown, extract them all again and delete all the calls to the
+            # previous hashes
+            print("The manifest of the previous export does not record the calls, extracting all the callers again")
+            callers = {offset: set() for offset in current_functions if offset not in changed_offsets}
+            deleted_calls.update((0, func_hash) for func_hash, name in stale_functions.values())
+        else:
+            callers = manifest.callers(current_functions, changed_offsets.union(stale_functions))
+            for offset, callees in callers.items():
+                deleted_calls.update((current_functions[offset][0], stale_functions[callee][0])
+                                     for callee in callees.intersection(stale_functions))
+        self.CSV_serializer.serialize_deleted_calls([
+            {'RootBinaryView': manifest.bv_hash, 'RootFunction': caller_hash, 'HASH': callee_hash}
+            for caller_hash, callee_hash in sorted(deleted_calls)
+        ])
+
+        extracted_offsets = changed_offsets.union(callers)
+        for offset, (func_hash, name) in current_functions.items():
+            if offset not in extracted_offsets:
+                self.function_manifest.update({offset: (func_hash, name)})
+                self.function_calls[func_hash].update(manifest.calls.get(func_hash, ()))
+
+        print("Incremental export: ", len(changed_offsets), " new or changed functions, ", len(callers),
+              " unchanged callers of them, ", len(stale_functions), " functions to detach")
+
+        return [func.start for func in self.bv if func.start in extracted_offsets]
+
+    def flush_object_cache(self):
+        """
+        Write all the entities currently held in the object_cache into the CSV files and release them.
+        The node_index, context_hash_cache and call_graph are kept, so later entities are still de-duplicated.
+        """
 
         # object_cache structure example:
         # {'Function':
         #       {
-        #        function_hash: [{
-        #                         'Attributes': object_attributes (I.E object.serialize()),
-        #                         'WriteNode': write_node,
-        #                         'WriteRelationship': write_relationship
-        #                         },
+        #        function_hash: [Records.EntityRecord(object.serialize(), write_node, write_relationship),
         #                         .....]
 
-        for label in self.object_cache:
-            for object_hash in self.object_cache[label].values():
-                for object_entity in object_hash:
-                    self.CSV_serializer.serialize_object(object_entity['Attributes'],
-                                                         object_entity['WriteNode'],
-                                                         object_entity['WriteRelationship'])
-
-        post_processor = PostProcessing.CSVPostProcessor(self.bv, self.CSV_serializer)
-        post_processor.run_all()
-        self.CSV_serializer.close_file_handles()
+        with self.run_report.stage('csv_write'):
+            for label in self.object_cache:
+                node_count = 0
+                relationship_count = 0
+                for object_hash in self.object_cache[label].values():
+                    for object_entity in object_hash:
+                        self.CSV_serializer.serialize_record(object_entity, object_entity.write_node,
+                                                             object_entity.write_relationship)
+                        node_count += bool(object_entity.write_node)
+                        relationship_count += bool(object_entity.write_relationship)
+                self.object_cache[label].clear()
+
+                self.run_report.count(label + '.nodes', node_count)
+                self.run_report.count(label + '.relationships', relationship_count)
+
+    def parallel_func_extract(self, process_count: int, function_starts=None):
+        """
+        Split the function list of the BinaryView into contiguous shards and extract each shard in a separate
+        process. The shard results are merged in the original function order, so the resulting object_cache is
+        identical to the one produced by the serial loop in bv_extract.
+        :param process_count: (INT) amount of worker processes to spawn
+        :param function_starts: (LIST) offsets of the functions to extract, all the functions if None
+        """
+        if function_starts is None:
+            function_starts = [func.start for func in self.bv]
+        shard_count = min(len(function_starts), process_count * Configuration.EXTRACTION_SHARDS_PER_PROCESS) or 1
+        shard_size = -(-len(function_starts) // shard_count)
+        shards = [function_starts[index:index + shard_size]
+                  for index in range(0, len(function_starts), shard_size)]
+
+        # Binary Ninja is not fork safe, every worker starts a fresh interpreter and opens the binary once, for all
+        # the shards it extracts
+        with ProcessPoolExecutor(max_workers=process_count, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_extraction_worker,
+                                 initargs=(self.bv.file.filename, self.bv_object.context.SelfHASH)) as executor:
+            shard_results = executor.map(extract_function_shard, shards)
+            # executor.map yields the results in submission order, which keeps the merge deterministic
+            for shard_object_cache, shard_call_graph, shard_unhandled_operands, shard_run_report in shard_results:
+                self.merge_object_cache(shard_object_cache, shard_call_graph)
+                self.unhandled_operands.update(shard_unhandled_operands)
+                self.run_report.merge(shard_run_report, 'worker.')
+                if Configuration.STREAMING_EXTRACTION:
+                    self.flush_object_cache()
+
+    def merge_object_cache(self, shard_object_cache: dict, shard_call_graph: list):
+        """
+        Merge the object_cache of an extraction shard into this object_cache, replaying the de-duplication that
+        the serial extraction would have done had it met the shard functions after all previously merged ones.
+        :param shard_object_cache: (DICT) the object_cache of a BinjaGraph that extracted a single shard
+        :param shard_call_graph: (LIST) the call_graph of the same BinjaGraph
+        """
+        # Only hashes of previously merged shards count (the shard itself was already de-duplicated by the worker
+        # exactly like the serial extraction does), so the indexes are only updated once the whole shard is merged.
+        merged_entities = list()
+
+        for label, shard_objects in shard_object_cache.items():
+            for object_hash, object_entities in shard_objects.items():
+                node_exists = object_hash in self.node_index[label]
+                for object_entity in object_entities:
+                    context_hash = object_entity.get('ContextHash')
+                    if label not in ('BinaryView', 'Function', 'CallSite') and context_hash in self.context_hash_cache:
+                        # The serial extraction would have reached this object (and its whole sub-tree) via an
+                        # already explored path and skipped it.
+                        continue
+                    if node_exists:
+                        object_entity.write_node = False
+
+                    self.object_cache[label].setdefault(object_hash, list()).append(object_entity)
+                    merged_entities.append((label, object_entity))
+
+        # Calls made by call expressions that were skipped above were already recorded by a previous shard
+        self.call_graph.extend(call for call in shard_call_graph if call[-1] not in self.context_hash_cache)
+
+        for label, object_entity in merged_entities:
+            self.index_object_entity(label, object_entity)
 
     def func_extract(self, func, bv_object):
         """
@@ -96,13 +348,32 @@ class BinjaGraph:
         :param bv_uuid: UUID of the containing BinaryView
         """
 
+        if Configuration.STRUCTURAL_EXPRESSION_HASH:
+            # Expression indexes are only unique within a function, start a fresh hasher for every function
+            self.structural_hasher = Expression.StructuralHasher()
+
+        if Configuration.USE_MLIL_SNAPSHOTS:
+            # Read every MLIL property of the function from Binary Ninja once
+            func = MLILSnapshot.FunctionSnapshot(func)
+            mlil = func.mlil
+            basic_blocks = func.basic_blocks
+            instruction_source = func
+        else:
+            mlil = func.mlil
+            basic_blocks = mlil.basic_blocks
+            instruction_source = mlil
+
+        # Shared by all the variable operands of this function
+        self.var_def_use_index = Variable.VarDefUseIndex(instruction_source)
+
         # Create the context for this function
         function_context = ContextManagement.Context(bv_object.context.SelfHASH)
 
-        func_object = Function.Neo4jFunction(func.mlil, function_context)
+        func_object = Function.Neo4jFunction(mlil, function_context, self.function_hashes.get(func.start),
+                                             self.segment_buffer)
         function_context.set_parent_hash(bv_object.context.SelfHASH)
 
-        if function_context.SelfHASH in self.object_cache['Function']:
+        if self.node_exists('Function', function_context.SelfHASH):
             # Function object already exists in the cache, only create the relationship (not the node itself)
             # and connect it with the existing node, then continue analysis of the function contents
             self.update_object_cache('Function', func_object, False, True)
@@ -110,7 +381,7 @@ class BinjaGraph:
         else:
             self.update_object_cache('Function', func_object, True, True)
 
-        bb_control_flow_graph = [{'BasicBlockBinjaObject': func.mlil.basic_blocks[0],
+        bb_control_flow_graph = [{'BasicBlockBinjaObject': basic_blocks[0],
                                   'BranchCondition': 0,
                                   'Context': function_context,
                                   'ParentHash': function_context.SelfHASH
@@ -140,8 +411,14 @@ class BinjaGraph:
             else:
                 current_bb = False
 
+    def block_hash_buffer(self):
+        """
+        :return: the SegmentBuffer basic blocks are hashed from, None for the text based block hashes
+        """
+        return None if Configuration.TEXT_BASED_BLOCK_HASH else self.segment_buffer
+
     def bb_extract(self, basic_block, branch_condition: bool,
-                   parent_context: ContextManagement.Context, parent_node_hash: str):
+                   parent_context: ContextManagement.Context, parent_node_hash: int):
         """
         :param parent_node_hash:
         :param basic_block: BinaryNinja basic block object to parse
@@ -155,10 +432,11 @@ class BinjaGraph:
                                                         # otherwise if its a basicblock then it does have RootFunction.
                                                         parent_context.RootFunction or parent_context.SelfHASH)
         basic_block_context.set_parent_hash(parent_node_hash)
-        bb_object = BasicBlock.Neo4jBasicBlock(basic_block, branch_condition, basic_block_context)
+        bb_object = BasicBlock.Neo4jBasicBlock(basic_block, branch_condition, basic_block_context,
+                                               segment_buffer=self.block_hash_buffer())
 
-        if basic_block_context.SelfHASH in self.object_cache['BasicBlock']:
-            if self.context_hash_cache.get(basic_block_context.context_hash()):
+        if self.node_exists('BasicBlock', basic_block_context.SelfHASH):
+            if self.context_explored(basic_block_context):
                 # This basic block was already explored by a different path through the function (since it has the same
                 # context hash), just skip it completely
                 return list(), None
@@ -194,7 +472,7 @@ class BinjaGraph:
                 back_edge_context.set_parent_hash(basic_block_context.SelfHASH)
 
                 back_edge_object = BasicBlock.Neo4jBasicBlock(branch.target, branch.type.value, back_edge_context,
-                                                              back_edge=True)
+                                                              back_edge=True, segment_buffer=self.block_hash_buffer())
                 self.update_object_cache('BasicBlock', back_edge_object, False, True)
 
         return outgoing_edges_list, bb_object
@@ -214,10 +492,11 @@ class BinjaGraph:
                                                         )
 
         instruction_context.set_parent_hash(parent_node_hash)
-        instr_object = Instruction.Neo4jInstruction(instruction, instruction_context, parent_node_type)
+        instr_object = Instruction.Neo4jInstruction(instruction, instruction_context, parent_node_type,
+                                                    self.structural_hasher)
 
-        if instruction_context.SelfHASH in self.object_cache['Instruction']:
-            if self.context_hash_cache.get(instruction_context.context_hash()):
+        if self.node_exists('Instruction', instruction_context.SelfHASH):
+            if self.context_explored(instruction_context):
                 # We already encountered this instruction via another code path (same context), so no need to
                 # re-create it.
                 return instruction_context.SelfHASH
@@ -237,14 +516,52 @@ class BinjaGraph:
                            parent_node_type='Expression'):
         """
         An RootExpression is a breakdown of an MLIL RootInstruction into its individual operands under a single
-        operation
+        operation.
+        The expression tree is walked with an explicit stack (pre-order, same order as a recursive walk), so huge
+        expressions never hit the recursion limit. The operands of every operation are dispatched according to
+        the operand table of that operation (see operand_dispatch_table).
         :param instruction: BinaryNinja MLIL Insutrction object
         :param parent_context
         :param operand_index: (INT) index of the RootExpression within the parent RootInstruction or RootExpression
                                     operand list
-        :param parent_node_hash
         :param parent_node_type: (STR) parent of an RootExpression can be either an RootInstruction or an RootExpression
         """
+        # Stack of (operand_kind, operand, operand_index, parent_context, parent_node_type)
+        pending_operands = [('expr', instruction, operand_index, parent_context, parent_node_type)]
+
+        while pending_operands:
+            operand_kind, operand, index, context, node_type = pending_operands.pop()
+
+            if operand_kind == 'var':
+                self.var_extract(operand, index, context)
+                continue
+            if operand_kind == 'const':
+                self.constant_extract(operand, index, context)
+                continue
+
+            expression_context = self.expression_node_extract(operand, context, index, node_type)
+            if expression_context is None:
+                # Already explored via another code path
+                continue
+
+            operand_items = list()
+            for operand_position, operand_type, operand_handler in operand_dispatch_table(operand):
+                if operand_handler is None:
+                    self.unhandled_operands[operand_type] += 1
+                    continue
+                operand_items.extend(operand_handler(operand.operands[operand_position], operand_position,
+                                                     expression_context))
+
+            # Pushed in reverse so the operands are popped (and extracted) in their original order
+            pending_operands.extend(reversed(operand_items))
+
+    def expression_node_extract(self, expression, parent_context: ContextManagement.Context, operand_index,
+                                parent_node_type: str):
+        """
+        Create a single Expression node and its relationship to its parent.
+        :return: the context of the new expression, None if this expression was already explored with the same
+                 context (so its operands should not be walked again)
+        """
         expression_context = ContextManagement.Context(
             parent_context.RootBinaryView,
             parent_context.RootFunction,
@@ -261,11 +578,12 @@ class BinjaGraph:
 
         expression_context.set_parent_hash(parent_context.SelfHASH)
 
-        expr_object = Expression.Neo4jExpression(instruction, expression_context, parent_node_type)
+        expr_object = Expression.Neo4jExpression(expression, expression_context, parent_node_type,
+                                                 self.structural_hasher, Configuration.EXPRESSION_OPERANDS_PROPERTY)
 
-        if expression_context.SelfHASH in self.object_cache['Expression']:
-            if self.context_hash_cache.get(expression_context.context_hash()):
-                return
+        if self.node_exists('Expression', expression_context.SelfHASH):
+            if self.context_explored(expression_context):
+                return None
             else:
                 # Expression object already exists in the cache, only create the relationship (not the node itself)
                 # and connect it with the existing node, then continue analysis of the Expression contents
@@ -273,71 +591,13 @@ class BinjaGraph:
         else:
             self.update_object_cache('Expression', expr_object, True, True)
 
-        # Iterate the operand list according to the object types specified in the MLIL_Operations enum
-        index = 0
-        for op_description in instruction.ILOperations[instruction.operation]:
-            op_description_type = op_description[1]
+        destination = Expression.call_destination(expression)
+        if destination is not None:
+            self.call_graph.append((destination, expression_context.RootBinaryView, expression_context.RootFunction,
+                                    expression_context.RootBasicBlock, expression_context.RootInstruction,
+                                    expression_context.context_hash()))
 
-            if op_description_type == 'expr':
-                self.expression_extract(instruction.operands[index], expression_context, index)
-                index += 1
-                continue
-            if op_description_type == 'var':
-                self.var_extract(instruction.operands[index],
-                                 index, expression_context)
-                index += 1
-                continue
-            if op_description_type == 'expr_list':
-                expression_index = 0
-                for expr in instruction.operands[index]:
-                    self.expression_extract(expr, expression_context, 'func_param_' + str(expression_index))
-                    expression_index += 1
-                index += 1
-                continue
-            if op_description_type == 'var_list':
-                var_index = 0
-                for il_variable in instruction.operands[index]:
-                    self.var_extract(il_variable, var_index, expression_context)
-                    var_index += 1
-                index += 1
-                continue
-            if op_description_type == 'int':
-                self.constant_extract(instruction.operands[index],
-                                      index, expression_context)
-                index += 1
-                continue
-            if op_description_type == 'int_list':
-                print("Encountered an int_list operation at ", index, ": ", instruction)
-                # TODO: implement this
-                index += 1
-                continue
-            if op_description_type == 'float':
-                self.constant_extract(instruction.operands[index],
-                                      index, expression_context)
-                index += 1
-                continue
-            if op_description_type == 'var_ssa':
-                print("Encountered a var_ssa operation at ", index, ": ", instruction)
-                # TODO: implement this
-                index += 1
-                continue
-            if op_description_type == 'var_ssa_dest_and_src':
-                print("Encountered a var_ssa_dest_and_src operation at ", index, ": ", instruction)
-                # TODO: implement this
-                index += 1
-                continue
-            if op_description_type == 'var_ssa_list':
-                print("Encountered a var_ssa_list operation at ", index, ": ", instruction)
-                # TODO: implement this
-                index += 1
-                continue
-            if op_description_type == 'intrinsic':
-                print("Encountered an intrinsic operation at ", index, ": ", instruction)
-                # TODO: implement this
-                index += 1
-                continue
-            print("op_description_type un-parsed:", op_description)
-            index += 1
+        return expression_context
 
     def var_extract(self, var, index: int, context: ContextManagement.Context):
         """
@@ -358,10 +618,10 @@ class BinjaGraph:
 
         variable_context.set_parent_hash(context.SelfHASH)
 
-        var_object = Variable.Neo4jVar(var, index, variable_context)
+        var_object = Variable.Neo4jVar(var, index, variable_context, self.var_def_use_index)
 
-        if variable_context.SelfHASH in self.object_cache['Variable']:
-            if self.context_hash_cache.get(variable_context.context_hash()):
+        if self.node_exists('Variable', variable_context.SelfHASH):
+            if self.context_explored(variable_context):
                 return
             else:
                 # Expression object already exists in the cache, only create the relationship (not the node itself)
@@ -389,8 +649,8 @@ class BinjaGraph:
 
         const_object = Constant.Neo4jConstant(constant, index, constant_context)
 
-        if constant_context.SelfHASH in self.object_cache['Constant']:
-            if self.context_hash_cache.get(constant_context.context_hash()):
+        if self.node_exists('Constant', constant_context.SelfHASH):
+            if self.context_explored(constant_context):
                 return
             else:
                 # Expression object already exists in the cache, only create the relationship (not the node itself)
@@ -399,12 +659,16 @@ class BinjaGraph:
         else:
             self.update_object_cache('Constant', const_object, True, True)
 
-        raw_string = self.string_mapping.get(str(constant))
+        if not isinstance(constant, int) or isinstance(constant, bool):
+            # Floats and intrinsic names are never pointers
+            return
+
+        raw_string = self.string_index.lookup(constant)
         if raw_string:
-            # This constant is a pointer to a string, we need to create the string object
+            # This constant is a pointer to (or into) a string, we need to create the string object
             self.string_extract(raw_string, constant_context)
 
-        raw_symbol = self.symbol_mapping.get(str(constant))
+        raw_symbol = self.symbol_index.lookup(constant)
         if raw_symbol:
             # This constant represents a program symbol, we need to create the string object
             self.symbol_extract(raw_symbol, constant_context)
@@ -418,8 +682,8 @@ class BinjaGraph:
 
         string_object = String.Neo4jString(raw_string, string_context)
 
-        if string_context.SelfHASH in self.object_cache['String']:
-            if self.context_hash_cache.get(string_context.context_hash()):
+        if self.node_exists('String', string_context.SelfHASH):
+            if self.context_explored(string_context):
                 return
             else:
                 self.update_object_cache('String', string_object, False, True)
@@ -435,90 +699,196 @@ class BinjaGraph:
 
         symbol_object = ProgramSymbol.Neo4jSymbol(raw_symbol, symbol_context)
 
-        if symbol_context.SelfHASH in self.object_cache['ProgramSymbol']:
-            if self.context_hash_cache.get(symbol_context.context_hash()):
+        if self.node_exists('ProgramSymbol', symbol_context.SelfHASH):
+            if self.context_explored(symbol_context):
                 return
             else:
                 self.update_object_cache('ProgramSymbol', symbol_object, False, True)
         else:
             self.update_object_cache('ProgramSymbol', symbol_object, True, True)
 
+    def node_exists(self, object_type: str, object_hash: int):
+        """
+        :return: (BOOL) whether a node of this hash was already extracted (or loaded into the graph, see HashStore)
+        """
+        node_exists = object_hash in self.node_index[object_type]
+        self.run_report.cache_lookup('node_index.' + object_type, node_exists)
+
+        if not node_exists and self.hash_store is not None:
+            # Loaded into the graph by a previous export, only the relationships to it are written.
+            # Once indexed, the node is found in the node_index like any other node that was already extracted.
+            node_exists = self.hash_store.contains(GRAPH_LABELS.get(object_type, object_type), object_hash)
+            self.run_report.cache_lookup('hash_store.' + object_type, node_exists)
+
+        return node_exists
+
+    def context_explored(self, context: ContextManagement.Context):
+        """
+        :return: (BOOL) whether an object was already extracted under this exact context (I.E via the same path)
+        """
+        context_explored = context.context_hash() in self.context_hash_cache
+        self.run_report.cache_lookup('context_hash_cache', context_explored)
+        return context_explored
+
     def update_object_cache(self, object_type: str, program_object, write_node, write_relationship):
 
-        object_attributes = program_object.serialize()
-        if not object_attributes['mandatory_context_dict']['SelfHASH'] in self.object_cache[object_type]:
-            self.object_cache[object_type][object_attributes['mandatory_context_dict']['SelfHASH']] = list()
+        object_entity = Records.EntityRecord.from_template(program_object.serialize(), write_node,
+                                                            write_relationship)
+        object_hash = object_entity.get('SelfHASH')
+        if not object_hash in self.object_cache[object_type]:
+            self.object_cache[object_type][object_hash] = list()
+
+        self.object_cache[object_type][object_hash].append(object_entity)
 
-        self.object_cache[object_type][object_attributes['mandatory_context_dict']['SelfHASH']].append(
-            {'Attributes': object_attributes, 'WriteNode': write_node, 'WriteRelationship': write_relationship})
+        self.index_object_entity(object_type, object_entity)
 
+    def index_object_entity(self, object_type: str, object_entity: Records.EntityRecord):
+        """
+        Record an entity that was just inserted into the object_cache in all the indexes that outlive it
+        (node_index, context_hash_cache and the function manifest).
+        """
+        self_hash = object_entity.get('SelfHASH')
+
+        self.node_index[object_type].add(self_hash)
         self.context_hash_cache.update({
-            object_attributes['mandatory_context_dict']['ContextHash']: True
+            object_entity.get('ContextHash'): True
         }
         )
 
+        if object_type == 'Function':
+            self.function_manifest.update({
+                object_entity.get('Offset'): (self_hash, object_entity.get('Name'))
+            })
+
     def def_function_calls(self):
+        """
+        Resolve the call_graph into CallSite relationships (instruction to function objects).
+        The function manifest maps the offset of every exported function to its hash, calls to addresses that are
+        not the start of an exported function (imports, functions filtered by MIN_MLIL_BASIC_BLOCKS) are dropped.
+        """
+        for destination, root_bv, root_function, root_basic_block, root_instruction, call_context_hash \
+                in self.call_graph:
+            self.function_calls[root_function].add(destination)
+            function_entry = self.function_manifest.get(destination)
+            if function_entry:
+                # Create the context of the call_site (same as the instruction context)
+                call_site_context = ContextManagement.Context(root_bv, root_function, root_basic_block,
+                                                              root_instruction)
+                call_site_context.set_parent_hash(call_site_context.RootInstruction)
+                call_site_context.set_hash(function_entry[0])
+
+                # Create the call_site_object and update the object_cache
+                call_site_object = CallSite.Neo4jCallSite(call_site_context)
+                self.update_object_cache('CallSite', call_site_object, False, True)
+
+
+# The BinaryView of an extraction worker process and the state shared by all the shards it extracts, set up by
+# init_extraction_worker
+worker_state = dict()
+
+
+def init_extraction_worker(filename: str, bv_hash: int):
+    """
+    Initializer of the extraction worker processes of BinjaGraph.parallel_func_extract: opens (and analyzes) the
+    binary once per process.
+    :param filename: path of the binary (or Binary Ninja database) to open headlessly
+    :param bv_hash: (INT) the hash of the BinaryView calculated by the parent process
+    """
+    bv = BinaryViewType.get_view_of_file(filename)
+    worker_state.update({'bv': bv, 'bv_hash': bv_hash})
+    # The view stays open for all the shards, it is closed when the worker process exits
+    multiprocessing.util.Finalize(None, bv.file.close, exitpriority=0)
+
+
+def extract_function_shard(function_starts: list):
+    """
+    Worker process entry point of BinjaGraph.parallel_func_extract.
+    :param function_starts: (LIST) start addresses of the functions in this shard, in BinaryView order
+    :return: the object_cache of the shard, its call_graph, its count of unhandled expression operands and its
+             RunReport
+    """
+    bv = worker_state['bv']
+    binja_graph = BinjaGraph(None, bv, worker_state['bv_hash'])
+    # The executable segments and the address indexes only depend on the BinaryView, all the shards of the worker
+    # use those of its first shard
+    binja_graph.segment_buffer, binja_graph.string_index, binja_graph.symbol_index = worker_state.setdefault(
+        'view_indexes', (binja_graph.segment_buffer, binja_graph.string_index, binja_graph.symbol_index))
+
+    with binja_graph.run_report.stage('function_walk'):
+        for function_start in function_starts:
+            func = bv.get_function_at(function_start)
+            if func and len(func.mlil.basic_blocks) >= Configuration.MIN_MLIL_BASIC_BLOCKS:
+                binja_graph.func_extract(func, binja_graph.bv_object)
+
+    if binja_graph.hash_store is not None:
+        binja_graph.hash_store.close()
+
+    return binja_graph.object_cache, binja_graph.call_graph, binja_graph.unhandled_operands, binja_graph.run_report
+
+
+################################################################################################################
+#                                       Expression operand dispatch                                            #
+################################################################################################################
+# Every operand handler turns an operand of a given kind (as described by MediumLevelILInstruction.ILOperations) into
+# the work items of BinjaGraph.expression_extract: (operand_kind, operand, operand_index, parent_context,
+# parent_node_type), where operand_kind is 'expr', 'var' or 'const'.
+
+def expr_operand(operand, index, context):
+    return (('expr', operand, index, context, 'Expression'),)
+
+
+def expr_list_operand(operand, index, context):
+    return [('expr', expr, 'func_param_' + str(expression_index), context, 'Expression')
+            for expression_index, expr in enumerate(operand)]
+
+
+def var_operand(operand, index, context):
+    return (('var', operand, index, context, None),)
+
+
+def var_list_operand(operand, index, context):
+    return [('var', il_variable, var_index, context, None) for var_index, il_variable in enumerate(operand)]
+
+
+def constant_operand(operand, index, context):
+    return (('const', operand, index, context, None),)
+
+
+def constant_list_operand(operand, index, context):
+    return [('const', constant, constant_index, context, None) for constant_index, constant in enumerate(operand)]
+
+
+def intrinsic_operand(operand, index, context):
+    # An intrinsic is exported as a constant holding its name
+    return (('const', operand.name, index, context, None),)
+
+
+OPERAND_HANDLERS = {
+    'expr': expr_operand,
+    'expr_list': expr_list_operand,
+    'var': var_operand,
+    'var_list': var_list_operand,
+    'int': constant_operand,
+    'float': constant_operand,
+    'int_list': constant_list_operand,
+    'intrinsic': intrinsic_operand,
+}
+
+# MLIL operation -> tuple of (operand_index, operand_kind, operand_handler), computed once per operation. The
+# operand_index is the position of the operand in expression.operands, see OperandLayout
+_operand_dispatch_tables = dict()
+
+
+def operand_dispatch_table(expression):
+    """
+    :param expression: BinaryNinja MLIL expression
+    :return: the operand dispatch table of the operation of the expression. The handler of operand kinds that are not
+             supported (e.g the SSA variables, the extraction walks the non-SSA MLIL) is None.
+    """
+    dispatch_table = _operand_dispatch_tables.get(expression.operation)
+    if dispatch_table is None:
+        dispatch_table = tuple((operand_index, operand_kind, OPERAND_HANDLERS.get(operand_kind))
+                               for operand_index, operand_kind in OperandLayout.operand_layout(expression))
+        _operand_dispatch_tables.update({expression.operation: dispatch_table})
 
-        function_offset_to_hash_cache = dict()
-        expr_hash_to_first_argument_expr = dict()
-        expr_hash_to_function_pointer = dict()
-
-        for func in self.object_cache['Function'].values():
-            for func_entity in func:
-                func_offset = func_entity['Attributes']['mandatory_relationship_dict']['Offset']
-                func_hash = func_entity['Attributes']['mandatory_context_dict']['SelfHASH']
-                function_offset_to_hash_cache.update({
-                    func_offset: func_hash
-                })
-
-        for expr in self.object_cache['Expression'].values():
-            for expr_entity in expr:
-                if expr_entity['Attributes']['mandatory_context_dict']['OperandIndex'] == '1':
-                    # We are only interested in the first argument of the call instruction
-                    expr_hash = expr_entity['Attributes']['mandatory_context_dict']['SelfHASH']
-                    parent_expr_hash = expr_entity['Attributes']['mandatory_context_dict']['ParentHASH']
-                    expr_hash_to_first_argument_expr.update({
-                        parent_expr_hash: expr_hash
-                    })
-
-        for const in self.object_cache['Constant'].values():
-            for const_entity in const:
-                const_value = const_entity['Attributes']['mandatory_node_dict']['ConstantValue']
-                parent_expr_hash = const_entity['Attributes']['mandatory_context_dict']['ParentHASH']
-                expr_hash_to_function_pointer.update({
-                    parent_expr_hash: const_value
-                })
-
-        for expr in self.object_cache['Expression'].values():
-            for expr_entity in expr:
-                if expr_entity['Attributes']['mandatory_node_dict']['OperationName'] == 'MLIL_CALL' or 'MLIL_TAILCALL':
-                    first_argument_expr_hash = expr_hash_to_first_argument_expr.get(
-                        expr_entity['Attributes']['mandatory_context_dict']['SelfHASH']
-                    )
-                    if first_argument_expr_hash:
-                        function_offset = expr_hash_to_function_pointer.get(first_argument_expr_hash)
-                        if function_offset:
-                            function_hash = function_offset_to_hash_cache.get(function_offset)
-                            if function_hash:
-                                context_dict = expr_entity['Attributes']['mandatory_context_dict']
-                                # Create the context of the call_site (same as the instruction context)
-                                call_site_context = ContextManagement.Context(context_dict['RootBinaryView'],
-                                                                              context_dict['RootFunction'],
-                                                                              context_dict['RootBasicBlock'],
-                                                                              context_dict['RootInstruction'])
-                                call_site_context.set_parent_hash(call_site_context.RootInstruction)
-                                call_site_context.set_hash(function_hash)
-
-                                # Create the call_site_object and update the object_cache
-                                call_site_object = CallSite.Neo4jCallSite(call_site_context)
-                                self.update_object_cache('CallSite', call_site_object, False, True)
-                            else:
-                                pass
-                                # print("Failed to locate function hash for function offset: ", function_offset)
-                        else:
-                            pass
-                            # print("Failed to locate function offset in expr hash: ", first_argument_expr_hash)
-                    else:
-                        pass
-                        # print("Failed to locate the first argument expression for expr hash: ",
-                        #      expr_entity['Attributes']['mandatory_context_dict']['SelfHASH'])
+    return dispatch_table
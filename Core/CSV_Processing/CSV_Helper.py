@@ -1,127 +1,161 @@
 import csv
+import os
 from ... import Configuration
+from ..Common import Hashing, CompressedIO
+from . import Records, BackgroundWriter, AdminImportCSV
+
+# Write buffer of every CSV file, rows are only flushed to the disk in chunks of this size
+WRITE_BUFFER_SIZE = 1 << 20
+
+# internal type -> name of its CSV file (without the extension of the compression, see Configuration.CSV_COMPRESSION)
+CSV_FILES = {
+    'BinaryView': 'BinaryView-nodes.csv', 'Function': 'Functions-nodes.csv', 'BasicBlock': 'BasicBlocks-nodes.csv',
+    'Instruction': 'Instructions-nodes.csv', 'Expression': 'Expressions-nodes.csv', 'Variable': 'Variables-nodes.csv',
+    'MemberFunc': 'MemberFunc-relationships.csv', 'MemberBB': 'MemberBB-relationships.csv',
+    'Branch': 'Branch-relationships.csv', 'InstructionChain': 'InstructionChain-relationships.csv',
+    'NextInstruction': 'NextInstruction-relationships.csv', 'Operand': 'Operand-relationships.csv',
+    'VarOperand': 'VarOperand-relationships.csv', 'MemberBV': 'MemberBV-relationships.csv',
+    'ConstantOperand': 'ConstantOperand-relationships.csv', 'Constant': 'Constant-nodes.csv',
+    'String': 'String-nodes.csv', 'Symbol': 'Symbol-nodes.csv', 'StringRef': 'StringRef-relationships.csv',
+    'SymbolRef': 'SymbolRef-relationships.csv', 'FunctionCall': 'FunctionCall-relationships.csv',
+    'DefinedAt': 'DefinedAt-relationships.csv', 'UsedAt': 'UsedAt-relationships.csv',
+    # Functions of a previous export to detach from the graph and the calls to their previous hashes, see
+    # IncrementalExport
+    'DeleteFunction': 'Delete-functions.csv', 'DeleteCall': 'Delete-calls.csv',
+}
 
 
 class CSV_Serialize:
 
-    def __init__(self):
-
-        self.BinaryView = open(Configuration.analysis_database_path + 'BinaryView-nodes.csv', 'w+', buffering=1,
-                               encoding='utf-8',
-                               newline='')
-        self.Function = open(Configuration.analysis_database_path + 'Functions-nodes.csv', 'w+', buffering=1,
-                             encoding='utf-8',
-                             newline='')
-        self.BasicBlock = open(Configuration.analysis_database_path + 'BasicBlocks-nodes.csv', 'w+', buffering=1,
-                               encoding='utf-8',
-                               newline='')
-        self.Instruction = open(Configuration.analysis_database_path + 'Instructions-nodes.csv', 'w+', buffering=1,
-                                encoding='utf-8',
-                                newline='')
-        self.Expression = open(Configuration.analysis_database_path + 'Expressions-nodes.csv', 'w+', buffering=1,
-                               encoding='utf-8',
-                               newline='')
-        self.Variable = open(Configuration.analysis_database_path + 'Variables-nodes.csv', 'w+', buffering=1,
-                             encoding='utf-8', newline='')
-        self.MemberFunc = open(Configuration.analysis_database_path + 'MemberFunc-relationships.csv', 'w+', buffering=1,
-                               encoding='utf-8',
-                               newline='')
-        self.MemberBB = open(Configuration.analysis_database_path + 'MemberBB-relationships.csv', 'w+', buffering=1,
-                             encoding='utf-8',
-                             newline='')
-        self.Branch = open(Configuration.analysis_database_path + 'Branch-relationships.csv', 'w+', buffering=1,
-                           encoding='utf-8',
-                           newline='')
-        self.InstructionChain = open(Configuration.analysis_database_path + 'InstructionChain-relationships.csv', 'w+',
-                                     buffering=1,
-                                     encoding='utf-8', newline='')
-        self.NextInstruction = open(Configuration.analysis_database_path + 'NextInstruction-relationships.csv', 'w+',
-                                    buffering=1,
-                                    encoding='utf-8', newline='')
-        self.Operand = open(Configuration.analysis_database_path + 'Operand-relationships.csv', 'w+', buffering=1,
-                            encoding='utf-8',
-                            newline='')
-        self.VarOperand = open(Configuration.analysis_database_path + 'VarOperand-relationships.csv', 'w+', buffering=1,
-                               encoding='utf-8',
-                               newline='')
-        self.MemberBV = open(Configuration.analysis_database_path + 'MemberBV-relationships.csv', 'w+', buffering=1,
-                             encoding='utf-8',
-                             newline='')
-        self.ConstantOperand = open(Configuration.analysis_database_path + 'ConstantOperand-relationships.csv', 'w+',
-                                    buffering=1,
-                                    encoding='utf-8', newline='')
-        self.Constant = open(Configuration.analysis_database_path + 'Constant-nodes.csv', 'w+', buffering=1,
-                             encoding='utf-8', newline='')
-
-        self.String = open(Configuration.analysis_database_path + 'String-nodes.csv', 'w+', buffering=1,
-                           encoding='utf-8', newline='')
-
-        self.Symbol = open(Configuration.analysis_database_path + 'Symbol-nodes.csv', 'w+', buffering=1,
-                           encoding='utf-8', newline='')
-
-        self.StringRef = open(Configuration.analysis_database_path + 'StringRef-relationships.csv', 'w+', buffering=1,
-                              encoding='utf-8', newline='')
-
-        self.SymbolRef = open(Configuration.analysis_database_path + 'SymbolRef-relationships.csv', 'w+', buffering=1,
-                              encoding='utf-8', newline='')
-
-        self.FunctionCall = open(Configuration.analysis_database_path + 'FunctionCall-relationships.csv', 'w+',
-                                 buffering=1, encoding='utf-8', newline='')
-
-        self.DefinedAt = open(Configuration.analysis_database_path + 'DefinedAt-relationships.csv', 'w+', buffering=1,
-                              encoding='utf-8', newline='')
-
-        self.UsedAt = open(Configuration.analysis_database_path + 'UsedAt-relationships.csv', 'w+', buffering=1,
-                           encoding='utf-8', newline='')
-
-        self.types = {
-            'BinaryView': self.BinaryView, 'Function': self.Function, 'BasicBlock': self.BasicBlock,
-            'Instruction': self.Instruction, 'Expression': self.Expression, 'Variable': self.Variable,
-            'MemberFunc': self.MemberFunc, 'MemberBB': self.MemberBB, 'MemberBV': self.MemberBV,
-            'VarOperand': self.VarOperand, 'Constant': self.Constant, 'ConstantOperand': self.ConstantOperand,
-            'Operand': self.Operand, 'NextInstruction': self.NextInstruction,
-            'InstructionChain': self.InstructionChain, 'Branch': self.Branch, 'String': self.String,
-            'Symbol': self.Symbol, 'StringRef': self.StringRef, 'SymbolRef': self.SymbolRef,
-            'FunctionCall': self.FunctionCall, 'DefinedAt': self.DefinedAt, 'UsedAt': self.UsedAt,
-        }
+    def __init__(self, output_path=None):
+        """
+        :param output_path: (STR) directory to write the CSV files into, Configuration.analysis_database_path if None
+        """
+        self.output_path = output_path or Configuration.analysis_database_path
+
+        # zstd falls back to gzip without the zstandard package
+        self.compression = CompressedIO.available(Configuration.CSV_COMPRESSION)
+        extension = CompressedIO.EXTENSIONS.get(self.compression, '')
+
+        # internal type -> path of its CSV file
+        self.paths = {internal_type: os.path.join(self.output_path, filename) + extension
+                      for internal_type, filename in CSV_FILES.items()}
+
+        # internal type -> the RecordWriter of its CSV file, see record_writer
+        self.writers = dict()
+
+        # Writes the rows into the files on a separate thread, see BackgroundWriter
+        self.background_writer = BackgroundWriter.BackgroundWriter(Configuration.CSV_WRITER_QUEUE_SIZE) \
+            if Configuration.ASYNC_CSV_WRITER else None
+        # internal type -> the QueuedFile its RecordWriter writes into, when the background_writer is used
+        self.queued_files = dict()
+
+        # internal type -> its open CSV file, every file is also an attribute of this object (e.g self.Function)
+        self.types = dict()
+        for internal_type in CSV_FILES:
+            self.set_file(internal_type, self.open_csv(internal_type))
+
+        # Compressed files that were closed to be read back (see csv_dict_row_iterator) and the files reading them.
+        # A closed file is re-opened for appending once it is written to again.
+        self.closed_types = set()
+        self.read_files = list()
+
+    def open_csv(self, internal_type: str, mode='w'):
+        """
+        :param mode: (STR) 'w' to create the file, 'a' to append to it
+        """
+        path = self.paths[internal_type]
+        if mode == 'w':
+            # Files of a previous export in a different compression would be loaded into the graph as well
+            CompressedIO.remove_variants(path)
+
+        if self.compression is None:
+            # Plain files are read back by seeking (see csv_dict_row_iterator)
+            return open(path, mode + '+', buffering=WRITE_BUFFER_SIZE, encoding='utf-8', newline='')
+
+        return CompressedIO.open_text(path, mode, Configuration.CSV_COMPRESSION_LEVEL)
+
+    def set_file(self, internal_type: str, csv_file):
+        self.types.update({internal_type: csv_file})
+        setattr(self, internal_type, csv_file)
+
+        # A re-opened file replaces the closed one as the target of its writer
+        if internal_type in self.queued_files:
+            self.queued_files[internal_type].target_file = csv_file
+        elif internal_type in self.writers:
+            self.writers[internal_type].set_file(csv_file)
+
+    def record_writer(self, internal_type: str):
+        """
+        :return: the RecordWriter of the CSV file of the internal type, created on first use
+        """
+        if internal_type in self.closed_types:
+            self.closed_types.discard(internal_type)
+            self.set_file(internal_type, self.open_csv(internal_type, 'a'))
+
+        writer = self.writers.get(internal_type)
+        if writer is None:
+            csv_file = self.types[internal_type]
+            if self.background_writer is not None:
+                csv_file = BackgroundWriter.QueuedFile(self.background_writer, csv_file)
+                self.queued_files.update({internal_type: csv_file})
+            writer = Records.RecordWriter(csv_file)
+            self.writers.update({internal_type: writer})
+
+        return writer
 
     def serialize_object(self, csv_template: dict, write_node, write_relationship):
+        return self.serialize_record(Records.EntityRecord.from_template(csv_template, write_node, write_relationship),
+                                     write_node, write_relationship)
+
+    def serialize_record(self, record: Records.EntityRecord, write_node, write_relationship):
+        """
+        Write the node row and the relationship row (as requested) of an object_cache entity into their CSV files.
+        """
         try:
+            schema = record.schema
             if write_node:
-                node_fieldnames = list(csv_template['mandatory_node_dict'])
-                node_fieldnames.extend(list(csv_template['node_attributes']))
-                node_writer = csv.DictWriter(self.types[csv_template['mandatory_node_dict']['LABEL']],
-                                             fieldnames=node_fieldnames)
-                if not self.types[csv_template['mandatory_node_dict']['LABEL']].tell():
-                    node_writer.writeheader()
-                node_row = csv_template['mandatory_node_dict']
-                if csv_template['node_attributes']:
-                    node_row.update(csv_template['node_attributes'])
-                node_writer.writerow(node_row)
+                self.record_writer(record.get('LABEL')).write(schema, schema.node_fields, record.node_values)
 
             if write_relationship:
-                relationship_fieldnames = list(csv_template['mandatory_relationship_dict'])
-                relationship_fieldnames.extend(list(csv_template['relationship_attributes']))
-                relationship_fieldnames.extend(list(csv_template['mandatory_context_dict']))
+                self.record_writer(record.get('TYPE')).write(schema, schema.relationship_fields,
+                                                             record.relationship_values)
 
-                relationship_writer = csv.DictWriter(self.types[csv_template['mandatory_relationship_dict']['TYPE']],
-                                                     fieldnames=relationship_fieldnames)
+        except csv.Error:
+            print("ERROR! writing to CSV failed on object: ", record.to_template())
+            return False
+        return True
 
-                if not self.types[csv_template['mandatory_relationship_dict']['TYPE']].tell():
-                    relationship_writer.writeheader()
+    @staticmethod
+    def format_hash_fields(row: dict):
+        # Hash identities are integers during the extraction, the CSV files (and the graph) hold their hex form
+        for field in Hashing.HASH_FIELDS:
+            if field in row:
+                row[field] = Hashing.format_hash(row[field])
 
-                relationship_row = csv_template['mandatory_relationship_dict']
-                if csv_template['relationship_attributes']:
-                    relationship_row.update(csv_template['relationship_attributes'])
-                if csv_template['mandatory_context_dict']:
-                    relationship_row.update(csv_template['mandatory_context_dict'])
+        return row
 
-                relationship_writer.writerow(relationship_row)
+    def serialize_deleted_functions(self, deleted_function_rows: list):
+        """
+        :param deleted_function_rows: (LIST) dicts with the RootBinaryView, HASH, Offset, Name and DeleteSubtree of
+                                      every function to detach from the graph
+        """
+        delete_writer = csv.DictWriter(self.DeleteFunction,
+                                       fieldnames=['RootBinaryView', 'HASH', 'Offset', 'Name', 'DeleteSubtree'])
+        delete_writer.writeheader()
+        for row in deleted_function_rows:
+            delete_writer.writerow(self.format_hash_fields(row))
 
-        except csv.Error:
-            print("ERROR! writing to CSV failed on object: ", csv_template)
-            return False
-        return True
+    def serialize_deleted_calls(self, deleted_call_rows: list):
+        """
+        :param deleted_call_rows: (LIST) dicts with the RootBinaryView, the RootFunction (the caller, empty for all the
+                                  callers) and the HASH (the previous hash of the callee) of every FunctionCall
+                                  relationship to delete from the graph
+        """
+        delete_writer = csv.DictWriter(self.DeleteCall, fieldnames=['RootBinaryView', 'RootFunction', 'HASH'])
+        delete_writer.writeheader()
+        for row in deleted_call_rows:
+            delete_writer.writerow(self.format_hash_fields(row))
 
     def csv_dict_row_iterator(self, internal_type: str):
         """
@@ -129,9 +163,19 @@ class CSV_Serialize:
         :return: return an iterator object that iterates on the rows of the CSV according to the field names
         """
         if internal_type in self.types:
+            self.drain()
             csvfile = self.types[internal_type]
-            csvfile.seek(0)
-            return csv.DictReader(csvfile)
+            if self.compression is None:
+                csvfile.seek(0)
+                return csv.DictReader(csvfile)
+
+            # A compressed stream can not be read back while it is written, finish it and read it from the disk
+            if internal_type not in self.closed_types:
+                csvfile.close()
+                self.closed_types.add(internal_type)
+            read_file = CompressedIO.open_text(self.paths[internal_type], 'r')
+            self.read_files.append(read_file)
+            return csv.DictReader(read_file)
         else:
             print("Wrong type argument given, no such internal type: ", type)
 
@@ -151,6 +195,34 @@ class CSV_Serialize:
                     context.update({'ExistingUUID': existing_uuid})
                     csv_writer.writerow(context)
 
+    def drain(self):
+        """
+        Wait until all the rows serialized so far are written into the files (only needed with the background_writer)
+        """
+        if self.background_writer is not None:
+            for queued_file in self.queued_files.values():
+                queued_file.flush()
+            self.background_writer.drain()
+
+    def write_admin_import_files(self):
+        """
+        Convert the CSV files into the input files of neo4j-admin import (see AdminImportCSV), once they are closed.
+        The data files are gzip compressed when the CSV files are compressed, neo4j-admin does not read zstd.
+        :return: (DICT) amount of nodes and relationships written, and of the duplicate and dangling rows skipped
+        """
+        import_path = os.path.join(self.output_path, AdminImportCSV.IMPORT_DIRECTORY)
+        if self.compression is None:
+            return AdminImportCSV.convert([self.output_path], import_path)
+
+        # The compression level of zstd may be beyond the levels of gzip
+        level = Configuration.CSV_COMPRESSION_LEVEL if self.compression == 'gzip' else None
+        return AdminImportCSV.convert([self.output_path], import_path, 'gzip', level)
+
     def close_file_handles(self):
-        for file in self.types.values():
-            file.close()
+        try:
+            if self.background_writer is not None:
+                self.drain()
+                self.background_writer.close()
+        finally:
+            for file in list(self.types.values()) + self.read_files:
+                file.close()
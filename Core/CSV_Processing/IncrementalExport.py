@@ -0,0 +1,145 @@
+"""
+Support for incremental re-exports of a BinaryView.
+
+Every export persists a manifest of the functions it exported (offset -> function hash and name) and of the addresses
+they call. The next export of the same BinaryView compares the current functions against that manifest, re-extracts
+only the new and changed ones and lists the changed and removed ones in Delete-functions.csv, so ExportNeo4j can
+detach them from the graph before loading the delta CSV files.
+The FunctionCall relationships of the unchanged callers of these functions point at their previous hash (or at
+nothing, for a new function). The callers are extracted again, and their calls to the previous hashes are listed in
+Delete-calls.csv.
+
+An export writes its manifest next to its CSV files (PENDING_MANIFEST_FILE). The manifest is only committed into the
+manifest directory once the export was loaded into the graph (see commit_pending_manifest), so the next export never
+diffs against an export that did not reach the graph.
+"""
+
+import json
+import os
+
+from ..Common import Hashing
+
+# File name of the manifest of an export in its output directory, until the export is loaded
+PENDING_MANIFEST_FILE = 'Function-manifest.json'
+
+
+class FunctionManifest:
+
+    def __init__(self, filename: str, bv_hash: int, functions=None, calls=None):
+        """
+        :param filename: the FILENAME of the exported BinaryView
+        :param bv_hash: (INT) the hash identity of the BinaryView node in the graph
+        :param functions: (DICT) function offset -> (function hash, function name)
+        :param calls: (DICT) function hash -> the addresses its call expressions call, None if unknown (a manifest
+                      written before the calls were recorded)
+        """
+        self.filename = filename
+        self.bv_hash = bv_hash
+        self.functions = functions or dict()
+        self.calls = calls
+
+    @staticmethod
+    def manifest_file(manifest_path: str, bv_hash: int):
+        return os.path.join(manifest_path, Hashing.format_hash(bv_hash) + '.json')
+
+    @classmethod
+    def load(cls, manifest_path: str, filename: str, bv_hash: int):
+        """
+        Locate the manifest of the previous export of a BinaryView.
+        Patching the binary changes the BinaryView hash, so if there is no manifest for this exact hash fall back
+        to the latest manifest exported from the same file.
+        :return: the FunctionManifest of the previous export, None if this BinaryView was never exported
+        """
+        manifest_file = cls.manifest_file(manifest_path, bv_hash)
+        if not os.path.isfile(manifest_file):
+            manifest_file = None
+            if os.path.isdir(manifest_path):
+                candidates = list()
+                for candidate in os.listdir(manifest_path):
+                    candidate = os.path.join(manifest_path, candidate)
+                    if candidate.endswith('.json') and cls.read(candidate)['FILENAME'] == filename:
+                        candidates.append(candidate)
+                if candidates:
+                    manifest_file = max(candidates, key=os.path.getmtime)
+
+        if not manifest_file:
+            return None
+
+        manifest = cls.read(manifest_file)
+        calls = None
+        if 'Calls' in manifest:
+            calls = {Hashing.parse_hash(func_hash): set(destinations)
+                     for func_hash, destinations in manifest['Calls'].items()}
+        return cls(manifest['FILENAME'], Hashing.parse_hash(manifest['BinaryView']),
+                   {int(offset): (Hashing.parse_hash(func_hash), name)
+                    for offset, (func_hash, name) in manifest['Functions'].items()},
+                   calls)
+
+    @staticmethod
+    def read(manifest_file: str):
+        with open(manifest_file, 'r', encoding='utf-8') as manifest:
+            return json.load(manifest)
+
+    def save(self, manifest_path: str):
+        os.makedirs(manifest_path, exist_ok=True)
+        self.write(self.manifest_file(manifest_path, self.bv_hash))
+
+    def save_pending(self, export_path: str):
+        """
+        Write the manifest next to the CSV files of its export, see commit_pending_manifest.
+        """
+        self.write(os.path.join(export_path, PENDING_MANIFEST_FILE))
+
+    def write(self, manifest_file: str):
+        with open(manifest_file, 'w', encoding='utf-8') as manifest:
+            json.dump({
+                'FILENAME': self.filename,
+                'BinaryView': Hashing.format_hash(self.bv_hash),
+                'Functions': {str(offset): [Hashing.format_hash(func_hash), name]
+                              for offset, (func_hash, name) in sorted(self.functions.items())},
+                'Calls': {Hashing.format_hash(func_hash): sorted(destinations)
+                          for func_hash, destinations in sorted((self.calls or dict()).items())},
+            }, manifest, indent=1)
+
+    def diff(self, current_functions: dict):
+        """
+        :param current_functions: (DICT) function offset -> (function hash, function name) of the current BinaryView
+        :return: (changed_offsets, stale_functions)
+                 changed_offsets: offsets of the functions that are new or changed since the previous export
+                 stale_functions: offset -> (function hash, function name) of the previously exported functions
+                                  that changed or were removed
+        """
+        changed_offsets = [offset for offset, function_entry in current_functions.items()
+                           if self.functions.get(offset) != function_entry]
+        stale_functions = {offset: function_entry for offset, function_entry in self.functions.items()
+                           if current_functions.get(offset) != function_entry}
+
+        return changed_offsets, stale_functions
+
+    def callers(self, current_functions: dict, retargeted_offsets: set):
+        """
+        :param current_functions: (DICT) function offset -> (function hash, function name) of the current BinaryView
+        :param retargeted_offsets: (SET) offsets of the functions that are new, changed or removed
+        :return: (DICT) offset of every current function that did not change and calls one of the retargeted
+                 functions -> the offsets of the retargeted functions it calls
+        """
+        return {offset: self.calls[func_hash].intersection(retargeted_offsets)
+                for offset, (func_hash, name) in current_functions.items()
+                if self.functions.get(offset) == (func_hash, name) and
+                not self.calls.get(func_hash, set()).isdisjoint(retargeted_offsets)}
+
+
+def commit_pending_manifest(export_path: str, manifest_path: str):
+    """
+    Move the manifest of an export that was loaded into the graph into the manifest directory, where the next export
+    of the same BinaryView finds it.
+    :return: (BOOL) whether the export had a pending manifest
+    """
+    pending_file = os.path.join(export_path, PENDING_MANIFEST_FILE)
+    if not os.path.isfile(pending_file):
+        return False
+
+    os.makedirs(manifest_path, exist_ok=True)
+    # The manifest file is named after the hex BinaryView hash, as written by FunctionManifest.save
+    os.replace(pending_file, os.path.join(manifest_path, FunctionManifest.read(pending_file)['BinaryView'] + '.json'))
+    return True
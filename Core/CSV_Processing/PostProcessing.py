@@ -1,4 +1,4 @@
-from ..Common import ContextManagement
+from ..Common import ContextManagement, Hashing
 from ..extraction_helpers import ProgramSymbol, String, CallSite, UseDef
 from binaryninja import *
 
@@ -47,10 +47,13 @@ class CSVPostProcessor:
 
         # Iterate all variables and find the mlil_instruction index of their def\use
         for row in var_operand_relationship_iterator:
-            usedef_context = ContextManagement.Context(row['RootBinaryView'], row['RootFunction'], row['RootBasicBlock'],
-                                                row['RootInstruction'], row['RootExpression'])
+            usedef_context = ContextManagement.Context(Hashing.parse_hash(row['RootBinaryView']),
+                                                       Hashing.parse_hash(row['RootFunction']),
+                                                       Hashing.parse_hash(row['RootBasicBlock']),
+                                                       Hashing.parse_hash(row['RootInstruction']),
+                                                       Hashing.parse_hash(row['RootExpression']))
 
-            usedef_context.set_parent_hash(row['END_ID'])
+            usedef_context.set_parent_hash(Hashing.parse_hash(row['END_ID']))
 
             variable_definition_instruction_index_list = row['VariableDefinedAtIndex'].split(',')
             variable_use_instruction_index_list = row['VariableUsedAtIndex'].split(',')
@@ -60,7 +63,7 @@ class CSVPostProcessor:
                     row['RootFunction'] + row['RootBasicBlock'] + instruction_index.strip())
 
                 if instruction_hash:
-                    usedef_context.set_hash(instruction_hash)
+                    usedef_context.set_hash(Hashing.parse_hash(instruction_hash))
 
                     if context_hash_cache.get(usedef_context.context_hash()):
                         # Already defined this relationship in another code path, just skip it
@@ -83,7 +86,7 @@ class CSVPostProcessor:
                     row['RootFunction'] + row['RootBasicBlock'] + instruction_index.strip())
 
                 if instruction_hash:
-                    usedef_context.set_hash(instruction_hash)
+                    usedef_context.set_hash(Hashing.parse_hash(instruction_hash))
 
                     if context_hash_cache.get(usedef_context.context_hash()):
                         # Already defined this relationship in another code path, just skip it
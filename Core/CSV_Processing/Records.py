@@ -0,0 +1,193 @@
+"""
+Compact in-memory representation of the entities held in BinjaGraph.object_cache.
+
+Every extraction helper serializes itself into a csv_template of five nested dicts (see any serialize() function in
+/extraction_helpers). Keeping those dicts alive for the whole export costs several hundred bytes of dict overhead per
+entity, on top of the values themselves. An EntityRecord keeps only two flat tuples of values, already ordered like
+the node row and the relationship row of the CSV files, while the field names are kept once in a shared RecordSchema.
+
+RecordWriter writes the rows of the records straight from these tuples into a CSV file.
+
+This module has no dependencies on binaryninja, so it can be imported by the benchmarks as well.
+"""
+
+import csv
+
+from ..Common import Hashing
+
+# Interned schemas, keyed by their field names. All the records of a label share very few schemas.
+_schema_cache = dict()
+
+
+def intern_schema(mandatory_node_fields: tuple, node_attribute_fields: tuple, mandatory_relationship_fields: tuple,
+                  relationship_attribute_fields: tuple, context_fields: tuple):
+    schema_key = (mandatory_node_fields, node_attribute_fields, mandatory_relationship_fields,
+                  relationship_attribute_fields, context_fields)
+    schema = _schema_cache.get(schema_key)
+    if schema is None:
+        schema = RecordSchema(*schema_key)
+        _schema_cache.update({schema_key: schema})
+
+    return schema
+
+
+class RecordSchema:
+    # The field names of a csv_template, split the same way the csv_template is.
+    # node_fields is the order of the node CSV row, relationship_fields is the order of the relationship CSV row.
+
+    __slots__ = ('mandatory_node_fields', 'node_attribute_fields', 'mandatory_relationship_fields',
+                 'relationship_attribute_fields', 'context_fields', 'node_fields', 'relationship_fields',
+                 'field_index')
+
+    def __init__(self, mandatory_node_fields: tuple, node_attribute_fields: tuple,
+                 mandatory_relationship_fields: tuple, relationship_attribute_fields: tuple, context_fields: tuple):
+        self.mandatory_node_fields = mandatory_node_fields
+        self.node_attribute_fields = node_attribute_fields
+        self.mandatory_relationship_fields = mandatory_relationship_fields
+        self.relationship_attribute_fields = relationship_attribute_fields
+        self.context_fields = context_fields
+
+        self.node_fields = mandatory_node_fields + node_attribute_fields
+        self.relationship_fields = mandatory_relationship_fields + relationship_attribute_fields + context_fields
+
+        # field name -> (is_node_field, index within the value tuple)
+        # relationship fields are inserted last, so a field present in both rows resolves to its relationship value,
+        # same as the dict.update() order used when the rows are built.
+        self.field_index = dict()
+        for index, field in enumerate(self.node_fields):
+            self.field_index.update({field: (True, index)})
+        for index, field in enumerate(self.relationship_fields):
+            self.field_index.update({field: (False, index)})
+
+    def __reduce__(self):
+        # Records travel between the extraction processes, re-intern the schema on arrival
+        return intern_schema, (self.mandatory_node_fields, self.node_attribute_fields,
+                               self.mandatory_relationship_fields, self.relationship_attribute_fields,
+                               self.context_fields)
+
+
+class EntityRecord:
+    # A single entry of the object_cache: the serialized object and whether its node and\or relationship should be
+    # written into the CSV files.
+
+    __slots__ = ('schema', 'node_values', 'relationship_values', 'write_node', 'write_relationship')
+
+    def __init__(self, schema: RecordSchema, node_values: tuple, relationship_values: tuple, write_node,
+                 write_relationship):
+        self.schema = schema
+        self.node_values = node_values
+        self.relationship_values = relationship_values
+        self.write_node = write_node
+        self.write_relationship = write_relationship
+
+    @classmethod
+    def from_template(cls, csv_template: dict, write_node, write_relationship):
+        """
+        :param csv_template: the dictionary returned by the serialize() function of any extraction helper
+        """
+        schema = intern_schema(tuple(csv_template['mandatory_node_dict']),
+                               tuple(csv_template['node_attributes']),
+                               tuple(csv_template['mandatory_relationship_dict']),
+                               tuple(csv_template['relationship_attributes']),
+                               tuple(csv_template['mandatory_context_dict']))
+
+        node_values = tuple(csv_template['mandatory_node_dict'].values()) + \
+            tuple(csv_template['node_attributes'].values())
+        relationship_values = tuple(csv_template['mandatory_relationship_dict'].values()) + \
+            tuple(csv_template['relationship_attributes'].values()) + \
+            tuple(csv_template['mandatory_context_dict'].values())
+
+        return cls(schema, node_values, relationship_values, write_node, write_relationship)
+
+    def get(self, field: str, default=None):
+        location = self.schema.field_index.get(field)
+        if location is None:
+            return default
+        is_node_field, index = location
+
+        return self.node_values[index] if is_node_field else self.relationship_values[index]
+
+    def to_template(self):
+        """
+        :return: the csv_template this record was built from (see CSV_Helper.CSV_Serialize.serialize_object)
+        """
+        schema = self.schema
+        mandatory_node_count = len(schema.mandatory_node_fields)
+        mandatory_relationship_count = len(schema.mandatory_relationship_fields)
+        relationship_attribute_end = mandatory_relationship_count + len(schema.relationship_attribute_fields)
+
+        return {
+            'mandatory_node_dict': dict(zip(schema.mandatory_node_fields,
+                                            self.node_values[:mandatory_node_count])),
+            'mandatory_relationship_dict': dict(zip(schema.mandatory_relationship_fields,
+                                                    self.relationship_values[:mandatory_relationship_count])),
+            'mandatory_context_dict': dict(zip(schema.context_fields,
+                                               self.relationship_values[relationship_attribute_end:])),
+            'node_attributes': dict(zip(schema.node_attribute_fields,
+                                        self.node_values[mandatory_node_count:])),
+            'relationship_attributes': dict(zip(schema.relationship_attribute_fields,
+                                                self.relationship_values[mandatory_relationship_count:
+                                                                         relationship_attribute_end])),
+        }
+
+
+class RecordWriter:
+    # A csv.writer of a single CSV file (a single node label or relationship type).
+    # The fields of the first row written become the header of the file. For every RecordSchema a column plan - where
+    # each header column is taken from in the value tuple, and which columns hold hash identities - is computed once,
+    # so a row is written straight from the value tuple of its record.
+
+    __slots__ = ('writer', 'fieldnames', 'plans')
+
+    def __init__(self, csv_file):
+        self.writer = csv.writer(csv_file)
+        self.fieldnames = None
+        # RecordSchema -> (column indexes into the value tuple, None if the tuple is already in header order,
+        #                  header positions of the hash identities)
+        self.plans = dict()
+
+    def set_file(self, csv_file):
+        # The file was re-opened (see CSV_Serialize.record_writer), the header was already written
+        self.writer = csv.writer(csv_file)
+
+    def column_plan(self, fields: tuple):
+        if self.fieldnames is None:
+            self.fieldnames = fields
+            self.writer.writerow(fields)
+
+        unknown_fields = set(fields).difference(self.fieldnames)
+        if unknown_fields:
+            raise ValueError("dict contains fields not in fieldnames: " + ', '.join(map(repr, unknown_fields)))
+
+        # A field that appears twice in a row (e.g both a relationship attribute and a context field) holds the last
+        # value given to it, the same way the dict rows were built
+        last_index = {field: index for index, field in enumerate(fields)}
+        columns = tuple(last_index.get(field) for field in self.fieldnames)
+        if columns == tuple(range(len(fields))):
+            columns = None
+
+        hash_positions = tuple(position for position, field in enumerate(self.fieldnames)
+                               if field in Hashing.HASH_FIELDS)
+
+        return columns, hash_positions
+
+    def write(self, schema: RecordSchema, fields: tuple, values: tuple):
+        """
+        :param schema: the RecordSchema of the row, column plans are cached per schema
+        :param fields: the field names of the values (schema.node_fields or schema.relationship_fields)
+        :param values: the values of the row, in the order of fields
+        """
+        plan = self.plans.get(schema)
+        if plan is None:
+            plan = self.column_plan(fields)
+            self.plans.update({schema: plan})
+        columns, hash_positions = plan
+
+        if columns is None:
+            row = list(values)
+        else:
+            row = ['' if index is None else values[index] for index in columns]
+        # Hash identities are integers during the extraction, the CSV files (and the graph) hold their hex form
+        Hashing.format_hash_columns(row, hash_positions)
+
+        self.writer.writerow(row)
@@ -0,0 +1,57 @@
+"""
+Attribute profiles decide which of the optional node\relationship attributes are computed during an export.
+
+The mandatory fields of every csv_template (hashes, labels, relationship types, context) are always exported, the
+optional attributes are passed to select() as zero-argument callables and are only evaluated if the configured
+profile includes them. Some of them (e.g PossibleValues, ClobberedRegisters) run dataflow analysis inside Binary
+Ninja for every object, so skipping them makes structure only exports of large binaries much cheaper.
+"""
+
+# label -> optional attributes that are computed for that label, per profile
+PROFILES = {
+    # Only the graph structure
+    'minimal': {
+        'Function': frozenset(),
+        'Instruction': frozenset(),
+    },
+    # The graph structure and the attributes that are read straight off the MLIL, without dataflow analysis
+    'structure': {
+        'Function': frozenset(('CallingConvention',)),
+        'Instruction': frozenset(('VarsRead', 'VarsWritten')),
+    },
+    # Every attribute
+    'full': {
+        'Function': frozenset(('ClobberedRegisters', 'CallingConvention')),
+        'Instruction': frozenset(('PossibleValues', 'VarsRead', 'VarsWritten')),
+    },
+}
+
+_profile = PROFILES['full']
+
+
+def configure(profile_name: str):
+    """
+    Select the attribute profile of the export (see Configuration.ATTRIBUTE_PROFILE).
+    All the rows of a label share the same columns, so the profile must not change in the middle of an export.
+    """
+    global _profile
+
+    if profile_name not in PROFILES:
+        raise ValueError("Unknown attribute profile: " + str(profile_name))
+
+    _profile = PROFILES[profile_name]
+
+
+def select(label: str, optional_attributes: dict):
+    """
+    :param label: the label of the node (or of the end node of the relationship) the attributes belong to
+    :param optional_attributes: (DICT) attribute name -> callable computing the attribute value
+    :return: (DICT) attribute name -> value, of the attributes included in the configured profile only
+    """
+    enabled_attributes = _profile.get(label)
+    if enabled_attributes is None:
+        # Labels without a profile entry have no optional attributes to skip
+        return {attribute: compute() for attribute, compute in optional_attributes.items()}
+
+    return {attribute: compute() for attribute, compute in optional_attributes.items()
+            if attribute in enabled_attributes}
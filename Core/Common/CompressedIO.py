@@ -0,0 +1,137 @@
+"""
+Reading and writing of compressed CSV files (see Configuration.CSV_COMPRESSION).
+
+The compression of a file is given by its extension: '.gz' (gzip) or '.zst' (zstd), anything else is plain text.
+Every relationship row repeats the full context columns, so the CSV files compress several-fold.
+
+gzip is always available. zstd (faster, and smaller files) needs the optional zstandard package ("pip install
+zstandard") and can not be read by Neo4j LOAD CSV itself, see server_readable.
+Appending to a compressed file adds a new gzip member (or zstd frame), the readers of this module read all of them.
+
+This module has no dependencies on binaryninja or on the Configuration, so the Neo4j loader can use it as well.
+"""
+
+import contextlib
+import gzip
+import io
+import os
+import shutil
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# compression -> file extension
+EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def available(compression):
+    """
+    :param compression: None, 'gzip' or 'zstd'
+    :return: the compression to use: zstd falls back to gzip when the zstandard package is not installed
+    """
+    if compression is not None and compression not in EXTENSIONS:
+        raise ValueError("Unknown CSV compression: " + str(compression))
+
+    if compression == 'zstd' and zstandard is None:
+        print("The zstandard package is not installed, writing gzip compressed CSV files instead")
+        return 'gzip'
+
+    return compression
+
+
+def compression_of(path: str):
+    """
+    :return: the compression of a file according to its extension, None for plain text
+    """
+    for compression, extension in EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+def base_name(path: str):
+    """
+    :return: the path without its compression extension, e.g 'Functions-nodes.csv' for 'Functions-nodes.csv.gz'
+    """
+    compression = compression_of(path)
+    return path[:-len(EXTENSIONS[compression])] if compression else path
+
+
+def variants(path: str):
+    """
+    :return: (LIST) the plain path followed by all its compressed variants
+    """
+    path = base_name(path)
+    return [path] + [path + extension for extension in EXTENSIONS.values()]
+
+
+def find(path: str):
+    """
+    :return: the existing variant (plain or compressed) of a file, None if there is none
+    """
+    for variant in variants(path):
+        if os.path.isfile(variant):
+            return variant
+    return None
+
+
+def remove_variants(path: str):
+    """
+    Delete all the variants of a file other than the given one, e.g the plain CSV file left behind by a previous
+    export when the files are now written compressed (otherwise both would be loaded into the graph).
+    """
+    for variant in variants(path):
+        if variant != path and os.path.isfile(variant):
+            os.remove(variant)
+
+
+def open_text(path: str, mode='r', level=None, buffering=-1):
+    """
+    Open a text file (utf-8, no newline translation, like all the CSV files), compressed according to its extension.
+    :param mode: (STR) 'r', 'w' or 'a', plain text files may also be opened 'w+'
+    :param level: (INT) compression level, the default of the compression if None
+    :param buffering: (INT) buffer size of plain text files
+    """
+    compression = compression_of(path)
+
+    if compression is None:
+        return open(path, mode, buffering=buffering, encoding='utf-8', newline='')
+
+    if compression == 'gzip':
+        return gzip.open(path, mode + 't', compresslevel=6 if level is None else level, encoding='utf-8',
+                         newline='')
+
+    if zstandard is None:
+        raise ImportError("Reading or writing " + path + " requires the zstandard package")
+
+    raw_file = open(path, mode + 'b')
+    if mode == 'r':
+        # A file that was appended to holds several frames
+        stream = zstandard.ZstdDecompressor().stream_reader(raw_file, read_across_frames=True)
+    else:
+        stream = zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(raw_file)
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+
+@contextlib.contextmanager
+def server_readable(path: str, readable_compressions=('gzip',)):
+    """
+    Neo4j reads the CSV files itself (LOAD CSV). It reads plain and gzip files, any other compressed file is
+    decompressed into a plain copy next to it for as long as the context is open.
+    :param readable_compressions: the compressions the reading Cypher procedure supports
+    :return: (STR) the path of a file Neo4j can read
+    """
+    compression = compression_of(path)
+    if compression is None or compression in readable_compressions:
+        yield path
+        return
+
+    plain_path = base_name(path)
+    with open_text(path, 'r') as compressed_file, open(plain_path, 'w', encoding='utf-8', newline='') as plain_file:
+        shutil.copyfileobj(compressed_file, plain_file)
+    try:
+        yield plain_path
+    finally:
+        os.remove(plain_path)
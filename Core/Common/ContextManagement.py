@@ -1,10 +1,11 @@
-import xxhash
+from . import Hashing
 
 
 class Context:
     # This class holds the context (i.e the current bv, RootFunction, bb etc) that we are working
     # under.
     # All values are specified as the corresponding UUID to the key.
+    # All hashes are integer identities (see Hashing), 0 stands for an empty value.
     # This is added to each relationship in the graph so that traversal of the correct paths is easier and clearer.
     # During the export process to the Neo4j DB, all values are erased except for the RootBinaryView - This is
     # because if exactly the same object (function, instruction,basic block etc) exists in a different binary view
@@ -12,26 +13,31 @@ class Context:
     # the same node object is used to represent the object.
     # TODO: expand this class to add more context related information, such as memory version etc
 
+    # A context is created for every single object in the BinaryView, so avoid a per-instance __dict__.
+    # The order of the slots is the order of the context columns in the relationship CSV files.
+    __slots__ = ('RootBinaryView', 'RootFunction', 'RootBasicBlock', 'RootInstruction', 'RootExpression',
+                 'OperandIndex', 'SelfHASH', 'ParentHASH', 'ContextHash')
+
     def __init__(self, binaryview_hash=None, function_hash=None, basicblock_hash=None, instruction_hash=None,
                  expression_hash=None, operand_index=None):
-        self.RootBinaryView = binaryview_hash or str()
-        self.RootFunction = function_hash or str()
-        self.RootBasicBlock = basicblock_hash or str()
-        self.RootInstruction = instruction_hash or str()
-        self.RootExpression = expression_hash or str()
+        self.RootBinaryView = binaryview_hash or 0
+        self.RootFunction = function_hash or 0
+        self.RootBasicBlock = basicblock_hash or 0
+        self.RootInstruction = instruction_hash or 0
+        self.RootExpression = expression_hash or 0
         self.OperandIndex = str(operand_index) or str()
-        self.SelfHASH = str()
-        self.ParentHASH = str()
-        self.ContextHash = str()
+        self.SelfHASH = 0
+        self.ParentHASH = 0
+        self.ContextHash = 0
 
     def __repr__(self):
-        return ("RootBinaryView: " + str(self.RootBinaryView) + "\n" +
-                "RootFunction: " + str(self.RootFunction) + "\n" +
-                "RootBasicBlock: " + str(self.RootBasicBlock) + "\n" +
-                "RootInstruction: " + str(self.RootInstruction) + "\n" +
-                "RootExpression: " + str(self.RootExpression) + "\n" +
-                "SelfHASH: " + str(self.SelfHASH) + "\n" +
-                "ParentHASH: " + str(self.ParentHASH) + "\n" +
+        return ("RootBinaryView: " + Hashing.format_hash(self.RootBinaryView) + "\n" +
+                "RootFunction: " + Hashing.format_hash(self.RootFunction) + "\n" +
+                "RootBasicBlock: " + Hashing.format_hash(self.RootBasicBlock) + "\n" +
+                "RootInstruction: " + Hashing.format_hash(self.RootInstruction) + "\n" +
+                "RootExpression: " + Hashing.format_hash(self.RootExpression) + "\n" +
+                "SelfHASH: " + Hashing.format_hash(self.SelfHASH) + "\n" +
+                "ParentHASH: " + Hashing.format_hash(self.ParentHASH) + "\n" +
                 "OperandIndex" + str(self.OperandIndex) + "\n" +
                 "*" * 30
                 )
@@ -43,20 +49,11 @@ class Context:
         self.ParentHASH = p_hash
 
     def context_hash(self):
-        hash = xxhash.xxh64()
-
-        hash.update(self.RootBinaryView)
-        hash.update(self.RootFunction)
-        hash.update(self.RootBasicBlock)
-        hash.update(self.RootInstruction)
-        hash.update(self.RootExpression)
-        hash.update(self.ParentHASH)
-        hash.update(self.SelfHASH)
-
-        self.ContextHash = hash.hexdigest()
+        self.ContextHash = Hashing.combine(self.RootBinaryView, self.RootFunction, self.RootBasicBlock,
+                                           self.RootInstruction, self.RootExpression, self.ParentHASH, self.SelfHASH)
 
         return self.ContextHash
 
     def get_context(self):
         self.context_hash()
-        return vars(self)
+        return {field: getattr(self, field) for field in self.__slots__}
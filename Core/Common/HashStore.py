@@ -0,0 +1,193 @@
+"""
+Persistent store of the node hashes that are already loaded into the graph.
+
+Node identities are content hashes, so system libraries and statically linked code produce the very same nodes in
+every exported binary. ExportNeo4j records the hashes of all the nodes it loaded into the HashStore, and an extraction
+(with Configuration.NODE_HASH_STORE) then treats these nodes like nodes it already extracted itself: only the
+relationships to them are written into the CSV files, the nodes are neither serialized nor merged into the graph again.
+
+The hashes are kept in a sqlite DB, fronted by a bloom filter (persisted in the same DB) so that the common lookup -
+a node the graph does not know yet - is answered without a DB query.
+The store describes the content of a specific graph DB. The graph DB holds a random identity (see graph_identity),
+which the store remembers: a store opened for a graph DB with a different identity (another DB, or the same DB once
+it was cleared) is emptied first.
+
+This module has no dependencies on binaryninja or on the Configuration, so the Neo4j loader can use it as well.
+"""
+
+import math
+import os
+import sqlite3
+import uuid
+import zlib
+
+# Minimal amount of hashes the bloom filter is sized for, it is rebuilt twice as large whenever it fills up
+BLOOM_MIN_CAPACITY = 1 << 20
+
+# False positive rate of the bloom filter at full capacity (a false positive only costs a DB query)
+BLOOM_ERROR_RATE = 0.01
+
+# Label of the single node that holds the identity of a graph DB, see graph_identity
+GRAPH_IDENTITY_LABEL = 'GraphIdentity'
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN_RATIO_64 = 0x9E3779B97F4A7C15
+
+
+def graph_identity(driver):
+    """
+    :param driver: a neo4j driver of the graph DB
+    :return: (STR) the identity of the graph DB, created on first use
+    """
+    with driver.session() as session:
+        return session.run("MERGE (graph:" + GRAPH_IDENTITY_LABEL + ") ON CREATE SET graph.Id = $id "
+                           "RETURN graph.Id AS id", id=uuid.uuid4().hex).single()['id']
+
+
+def bloom_key(label: str, node_hash: int):
+    # Nodes of different labels may share a hash (e.g a function made of a single basic block)
+    return node_hash ^ zlib.crc32(label.encode('utf-8'))
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int, error_rate=BLOOM_ERROR_RATE):
+        """
+        :param capacity: (INT) amount of keys the filter is sized for
+        :param error_rate: (FLOAT) false positive rate once the filter holds capacity keys
+        """
+        self.capacity = capacity
+        self.bit_count = max(64, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.bit_count / capacity * math.log(2))))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+
+    @classmethod
+    def from_state(cls, capacity: int, bit_count: int, hash_count: int, bits: bytes):
+        bloom_filter = cls.__new__(cls)
+        bloom_filter.capacity = capacity
+        bloom_filter.bit_count = bit_count
+        bloom_filter.hash_count = hash_count
+        bloom_filter.bits = bytearray(bits)
+        return bloom_filter
+
+    def positions(self, key: int):
+        # Double hashing, the keys are already uniformly distributed hashes
+        first_hash = key & _MASK64
+        second_hash = ((key >> 64) ^ ((first_hash * _GOLDEN_RATIO_64) >> 64)) | 1
+        return [(first_hash + index * second_hash) % self.bit_count for index in range(self.hash_count)]
+
+    def add(self, key: int):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: int):
+        bits = self.bits
+        for position in self.positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class HashStore:
+
+    def __init__(self, path: str, graph_id=None):
+        """
+        :param path: (STR) path of the sqlite DB file, created on first use
+        :param graph_id: (STR) the identity of the graph DB the store describes (see graph_identity), the store is
+                         emptied if it described a different one. None trusts the store as it is.
+        """
+        self.path = path
+        self.graph_id = graph_id
+        self.connection = None
+        self.bloom_filter = None
+        # Amount of hashes in the store
+        self.count = 0
+        # Whether the store was emptied on open, because it described a different graph DB
+        self.cleared = False
+
+    def open(self):
+        if self.connection is not None:
+            return self
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS nodes (label TEXT NOT NULL, hash TEXT NOT NULL, "
+                                "PRIMARY KEY (label, hash)) WITHOUT ROWID")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS bloom (id INTEGER PRIMARY KEY, entries INTEGER, "
+                                "capacity INTEGER, bit_count INTEGER, hash_count INTEGER, bits BLOB)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if self.graph_id is not None:
+            self.check_graph_id()
+        self.count = self.connection.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+        bloom_state = self.connection.execute("SELECT entries, capacity, bit_count, hash_count, bits FROM bloom "
+                                              "WHERE id = 0").fetchone()
+        if bloom_state and bloom_state[0] == self.count:
+            self.bloom_filter = BloomFilter.from_state(*bloom_state[1:])
+        else:
+            # No filter yet, or the nodes table was changed behind its back
+            self.rebuild_bloom_filter()
+
+        return self
+
+    def check_graph_id(self):
+        stored_graph_id = self.connection.execute("SELECT value FROM meta WHERE key = 'graph_id'").fetchone()
+        # A store written before the identity was recorded is assumed to describe this graph DB
+        if stored_graph_id is not None and stored_graph_id[0] != self.graph_id:
+            self.connection.execute("DELETE FROM nodes")
+            self.connection.execute("DELETE FROM bloom")
+            self.cleared = True
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('graph_id', ?)", (self.graph_id,))
+        self.connection.commit()
+
+    def rebuild_bloom_filter(self):
+        self.bloom_filter = BloomFilter(max(BLOOM_MIN_CAPACITY, 2 * self.count))
+        for label, node_hash in self.connection.execute("SELECT label, hash FROM nodes"):
+            self.bloom_filter.add(bloom_key(label, int(node_hash, 16)))
+        self.save_bloom_filter()
+
+    def save_bloom_filter(self):
+        self.connection.execute("INSERT OR REPLACE INTO bloom VALUES (0, ?, ?, ?, ?, ?)",
+                                (self.count, self.bloom_filter.capacity, self.bloom_filter.bit_count,
+                                 self.bloom_filter.hash_count, bytes(self.bloom_filter.bits)))
+        self.connection.commit()
+
+    def contains(self, label: str, node_hash: int):
+        """
+        :param label: (STR) the label of the node in the graph
+        :param node_hash: (INT) the node identity
+        :return: (BOOL) whether the node is already in the graph
+        """
+        self.open()
+        if bloom_key(label, node_hash) not in self.bloom_filter:
+            return False
+        return self.connection.execute("SELECT 1 FROM nodes WHERE label = ? AND hash = ?",
+                                       (label, format(node_hash, 'x'))).fetchone() is not None
+
+    def add(self, label: str, node_hashes):
+        """
+        Record nodes that were loaded into the graph.
+        :param label: (STR) the label of the nodes in the graph
+        :param node_hashes: (ITERABLE) the INT identities of the nodes
+        :return: (INT) amount of hashes that were not in the store yet
+        """
+        self.open()
+        node_hashes = list(node_hashes)
+        added = self.connection.executemany("INSERT OR IGNORE INTO nodes VALUES (?, ?)",
+                                            [(label, format(node_hash, 'x')) for node_hash in node_hashes]).rowcount
+        self.count += added
+
+        if self.count > self.bloom_filter.capacity:
+            self.rebuild_bloom_filter()
+        else:
+            for node_hash in node_hashes:
+                self.bloom_filter.add(bloom_key(label, node_hash))
+            self.save_bloom_filter()
+
+        return added
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
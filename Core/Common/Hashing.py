@@ -0,0 +1,120 @@
+"""
+Hash identities of all the objects extracted from a BinaryView.
+
+Inside the extraction pipeline every identity (SelfHASH, ParentHASH, ContextHash, Root* etc) is an integer digest,
+which is cheaper to compute, combine, store and look up than a hex string. The hex representation is only produced
+at the CSV\\graph boundary, using format_hash().
+"""
+
+import mmap
+import os
+import struct
+
+import xxhash
+
+
+# name: (streaming hasher class, one-shot integer digest function, digest size in bits)
+ALGORITHMS = {
+    'xxh64': (xxhash.xxh64, xxhash.xxh64_intdigest, 64),
+    'xxh3_64': (xxhash.xxh3_64, xxhash.xxh3_64_intdigest, 64),
+    'xxh128': (xxhash.xxh3_128, xxhash.xxh3_128_intdigest, 128),
+}
+
+# Every CSV column that holds a hash identity, these are converted to hex strings when the rows are written
+HASH_FIELDS = ('HASH', 'START_ID', 'END_ID', 'RootBinaryView', 'RootFunction', 'RootBasicBlock', 'RootInstruction',
+               'RootExpression', 'SelfHASH', 'ParentHASH', 'ContextHash')
+
+# Structs packing a given amount of 64 bit identities, see combine()
+_packers = dict()
+
+_hasher, _intdigest, _digest_bits = ALGORITHMS['xxh64']
+_hex_format = '016x'
+_printf_format = '%016x'
+
+# hash_bytes(data) -> int, bound straight to the digest function of the configured algorithm to avoid a python call
+hash_bytes = _intdigest
+
+
+def configure(algorithm: str):
+    """
+    Select the hash algorithm used for all identities (see Configuration.HASH_ALGORITHM).
+    Must be called before any object is hashed, identities of different algorithms never match.
+    """
+    global _hasher, _intdigest, _digest_bits, _hex_format, _printf_format, hash_bytes
+
+    if algorithm not in ALGORITHMS:
+        raise ValueError("Unknown hash algorithm: " + str(algorithm))
+
+    _hasher, _intdigest, _digest_bits = ALGORITHMS[algorithm]
+    _hex_format = '0' + str(_digest_bits // 4) + 'x'
+    _printf_format = '%' + _hex_format
+    hash_bytes = _intdigest
+
+
+def new_hasher():
+    """
+    :return: a streaming hasher object (update(bytes), intdigest()) of the configured algorithm
+    """
+    return _hasher()
+
+
+def hash_text(text: str) -> int:
+    return _intdigest(text.encode('utf-8', 'surrogatepass'))
+
+
+def combine(*hashes) -> int:
+    """
+    Hash a sequence of integer identities (0 stands for an empty identity) into a single identity.
+    """
+    if _digest_bits == 64:
+        packer = _packers.get(len(hashes))
+        if packer is None:
+            packer = struct.Struct('<' + str(len(hashes)) + 'Q')
+            _packers.update({len(hashes): packer})
+        return _intdigest(packer.pack(*hashes))
+
+    return _intdigest(b''.join(value.to_bytes(16, 'little') for value in hashes))
+
+
+def hash_file(path: str) -> int:
+    """
+    :return: the integer digest of the whole content of a file, hashed straight from a read-only memory map
+    """
+    file_hash = _hasher()
+    with open(path, 'rb') as hashed_file:
+        # An empty file can not be mapped
+        if os.fstat(hashed_file.fileno()).st_size:
+            with mmap.mmap(hashed_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                file_hash.update(mapped_file)
+
+    return file_hash.intdigest()
+
+
+def format_hash(value) -> str:
+    """
+    :return: the hex representation of an integer identity, identical to the hexdigest() of the same digest.
+             An empty identity (0) is formatted as an empty string, strings are returned as they are.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return format(value, _hex_format) if value else ''
+
+    return value
+
+
+def format_hash_columns(row: list, positions: tuple):
+    """
+    format_hash the values at the given positions of a CSV row, in place. Called for every row written, so it avoids
+    a function call per value.
+    """
+    for position in positions:
+        value = row[position]
+        # type() rather than isinstance(), booleans are not identities
+        if type(value) is int:
+            row[position] = _printf_format % value if value else ''
+
+
+def parse_hash(text: str) -> int:
+    """
+    :return: the integer identity of a hex string read back from a CSV file (the inverse of format_hash)
+    """
+    return int(text, 16) if text else 0
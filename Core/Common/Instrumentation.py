@@ -0,0 +1,151 @@
+"""
+Structured telemetry of export runs.
+
+A RunReport collects the wall and CPU time of every stage of a run, counters (entities per label etc) and the hit
+rates of the caches, and optionally a cProfile and\or tracemalloc capture of the whole run. The report is written as
+JSON next to the CSV files, so runs over big binaries can be compared to find where the time goes and to catch
+regressions.
+
+This module has no dependencies on binaryninja or on the Configuration, so both the extraction and the Neo4j loader
+(which runs as a standalone script) can use it.
+"""
+
+import collections
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+# Amount of entries kept in the report from the cProfile and tracemalloc captures
+PROFILE_TOP_ENTRIES = 30
+
+
+class RunReport:
+
+    def __init__(self, run_name: str, profile_cpu=False, profile_memory=False):
+        """
+        :param run_name: (STR) name of the run, e.g 'extraction' or 'load', the report is written as
+                         RunReport-<run_name>.json
+        :param profile_cpu: (BOOL) capture a cProfile of the run
+        :param profile_memory: (BOOL) capture the peak memory and the top allocations of the run with tracemalloc
+        """
+        self.run_name = run_name
+        self.started = time.time()
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+
+        # stage name -> {'wall': seconds, 'cpu': seconds, 'calls': amount of times the stage ran}
+        self.stages = collections.OrderedDict()
+        self.counters = collections.Counter()
+        # cache name -> Counter({'hits': amount, 'misses': amount})
+        self.caches = collections.defaultdict(collections.Counter)
+
+        self.profiler = None
+        if profile_cpu:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+        self.profile_memory = profile_memory and not tracemalloc.is_tracing()
+        if self.profile_memory:
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, stage_name: str):
+        """
+        Time a stage of the run: with run_report.stage('function_walk'): ...
+        A stage that runs several times accumulates its times, stages may be nested (the outer stage includes the
+        time of the inner one).
+        """
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            stage_times = self.stages.setdefault(stage_name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            stage_times['wall'] += time.perf_counter() - start_wall_time
+            stage_times['cpu'] += time.process_time() - start_cpu_time
+            stage_times['calls'] += 1
+
+    def count(self, counter_name: str, amount=1):
+        self.counters[counter_name] += amount
+
+    def cache_lookup(self, cache_name: str, hit):
+        self.caches[cache_name]['hits' if hit else 'misses'] += 1
+
+    def merge(self, other_report, stage_prefix=''):
+        """
+        Add the stages, counters and cache lookups of another report (e.g of an extraction worker process).
+        :param stage_prefix: (STR) prefix of the merged stage names, keeps the stages of the workers (which ran in
+                             parallel) apart from the stages of this run
+        """
+        for stage_name, other_times in other_report.stages.items():
+            stage_times = self.stages.setdefault(stage_prefix + stage_name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            for key in stage_times:
+                stage_times[key] += other_times[key]
+
+        self.counters.update(other_report.counters)
+        for cache_name, lookups in other_report.caches.items():
+            self.caches[cache_name].update(lookups)
+
+    def __getstate__(self):
+        # Reports of worker processes travel back to the parent, the profilers stay behind
+        state = self.__dict__.copy()
+        state.update({'profiler': None, 'profile_memory': False})
+        return state
+
+    def summary(self):
+        """
+        :return: (DICT) the JSON serializable content of the report
+        """
+        report = {
+            'run': self.run_name,
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'wall_time': time.perf_counter() - self.start_wall_time,
+            'cpu_time': time.process_time() - self.start_cpu_time,
+            'stages': self.stages,
+            'counters': dict(sorted(self.counters.items())),
+            'caches': {cache_name: {'hits': lookups['hits'], 'misses': lookups['misses'],
+                                    'hit_rate': lookups['hits'] / ((lookups['hits'] + lookups['misses']) or 1)}
+                       for cache_name, lookups in sorted(self.caches.items())},
+        }
+
+        if self.profiler:
+            self.profiler.disable()
+            profile_text = io.StringIO()
+            pstats.Stats(self.profiler, stream=profile_text).sort_stats('cumulative').print_stats(
+                PROFILE_TOP_ENTRIES)
+            report.update({'cpu_profile': profile_text.getvalue().splitlines()})
+            self.profiler.enable()
+
+        if self.profile_memory:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            top_allocations = tracemalloc.take_snapshot().statistics('lineno')[:PROFILE_TOP_ENTRIES]
+            report.update({'memory': {'current': current_memory, 'peak': peak_memory,
+                                      'top_allocations': [str(allocation) for allocation in top_allocations]}})
+
+        return report
+
+    def write(self, directory: str):
+        """
+        Write the report (and the full cProfile capture, if any) into the directory and stop the profilers.
+        :return: (STR) path of the JSON report
+        """
+        report_file = os.path.join(directory, 'RunReport-' + self.run_name + '.json')
+        with open(report_file, 'w', encoding='utf-8') as report:
+            json.dump(self.summary(), report, indent=1)
+
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(os.path.join(directory, 'RunReport-' + self.run_name + '.prof'))
+            self.profiler = None
+
+        if self.profile_memory:
+            tracemalloc.stop()
+            self.profile_memory = False
+
+        print("Run report written to: ", report_file)
+        return report_file
@@ -0,0 +1,108 @@
+"""
+Build a fresh Neo4j DB out of the CSV files of one or more exports with the offline neo4j-admin import, instead of
+loading them into a running DB with ExportNeo4j.py.
+
+The CSV files are converted into the input files of neo4j-admin (see Core/CSV_Processing/AdminImportCSV.py), the nodes
+and relationships shared between the exports are imported once. The neo4j-admin command line is printed, or run with
+--run. neo4j-admin only imports into a DB that does not exist yet, and while the Neo4j server is stopped.
+Run ExportNeo4j.create_constraints (or any later ExportNeo4j load) once the server is started again.
+
+Usage, from the repository root:
+    python -m Core.Neo4j_Processing.BulkImport [-o IMPORT_DIR] [-d DATABASE] [--no-convert] [--run] [EXPORT_DIR ...]
+
+EXPORT_DIR is the output directory of an export (Configuration.analysis_database_path by default), or the output root
+of a BatchExport, whose sub-directories are all imported.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+import Configuration
+from Core.Common import Instrumentation
+from Core.CSV_Processing import AdminImportCSV, IncrementalExport
+
+
+def export_directories(paths: list):
+    """
+    :param paths: (LIST) output directories of exports, and output roots of batch exports
+    :return: (LIST) the output directories of all the exports
+    """
+    directories = list()
+    for path in paths:
+        if AdminImportCSV.export_files(path, '-nodes.csv'):
+            directories.append(path)
+            continue
+
+        batch_directories = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                   if os.path.isdir(os.path.join(path, name)) and
+                                   AdminImportCSV.export_files(os.path.join(path, name), '-nodes.csv'))
+        if not batch_directories:
+            print("No exported CSV files found in: ", path)
+        directories.extend(batch_directories)
+
+    return directories
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the CSV files of exports into a fresh Neo4j DB with "
+                                                 "neo4j-admin")
+    parser.add_argument('paths', nargs='*', default=[Configuration.analysis_database_path],
+                        help="export output directories and batch export output roots")
+    parser.add_argument('-o', '--output', default=os.path.join(Configuration.analysis_database_path,
+                                                               AdminImportCSV.IMPORT_DIRECTORY),
+                        help="directory of the neo4j-admin input files")
+    parser.add_argument('-d', '--database', default=Configuration.admin_import_database,
+                        help="name of the DB to create")
+    parser.add_argument('--no-convert', action='store_true',
+                        help="import the files already in the output directory (e.g written with "
+                             "Configuration.ADMIN_IMPORT_CSV)")
+    parser.add_argument('--run', action='store_true', help="run neo4j-admin instead of printing its command line")
+    args = parser.parse_args(argv)
+
+    run_report = Instrumentation.RunReport('bulk_import', Configuration.PROFILE_CPU, Configuration.PROFILE_MEMORY)
+
+    # The exports converted by this run, the files of --no-convert may come from any earlier export
+    directories = list()
+    if not args.no_convert:
+        directories = export_directories(args.paths)
+        if not directories:
+            return 1
+
+        # neo4j-admin reads gzip, but not zstd (whose compression levels may be beyond the levels of gzip)
+        compression = 'gzip' if Configuration.CSV_COMPRESSION else None
+        level = Configuration.CSV_COMPRESSION_LEVEL if Configuration.CSV_COMPRESSION == 'gzip' else None
+
+        print("Converting the CSV files of ", len(directories), " exports into ", args.output)
+        with run_report.stage('convert'):
+            for name, count in AdminImportCSV.convert(directories, args.output, compression, level).items():
+                run_report.count(name, count)
+        print("Converted: ", dict(run_report.counters))
+
+    if not os.path.isdir(args.output) or not AdminImportCSV.import_files(args.output)[0]:
+        print("No neo4j-admin input files found in: ", args.output)
+        return 1
+
+    command = AdminImportCSV.import_command(args.output, args.database, Configuration.neo4j_admin_path,
+                                            Configuration.NEO4J_ADMIN_VERSION)
+    return_code = 0
+    if args.run:
+        with run_report.stage('import'):
+            return_code = subprocess.call(command)
+        print("neo4j-admin finished with exit code ", return_code, " in ", run_report.stages['import']['wall'],
+              " seconds")
+        if return_code == 0:
+            # The imported exports are in the graph, later incremental exports diff against them
+            for directory in directories:
+                IncrementalExport.commit_pending_manifest(directory, Configuration.manifest_path)
+    else:
+        print(subprocess.list2cmdline(command))
+
+    if Configuration.RUN_REPORT:
+        run_report.write(args.output)
+    return return_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,16 @@
 from neo4j import GraphDatabase, exceptions
 import os
-import threading
 import csv
 import time
 import Configuration
 import xxhash
+import collections
+import contextlib
+import functools
+import operator
+from Core.Common import Instrumentation, HashStore, CompressedIO
+from Core.Neo4j_Processing import WorkerPool, WriteControl
+from Core.CSV_Processing import IncrementalExport
 
 driver = GraphDatabase.driver(Configuration.analysis_database_uri,
                               auth=(Configuration.analysis_database_user, Configuration.analysis_database_password),
@@ -12,67 +18,234 @@ driver = GraphDatabase.driver(Configuration.analysis_database_uri,
                               connection_acquisition_timeout=30)
 
 
+# Labels of all the nodes in the graph, every label has a uniqueness constraint (and so an index) on the HASH
+NODE_LABELS = ('BinaryView', 'Function', 'BasicBlock', 'Instruction', 'Expression', 'Variable', 'Constant', 'String',
+               'Symbol')
+
+# Seconds to wait for the indexes of the constraints to come online before loading the nodes
+INDEX_WAIT_SECONDS = 300
+
+
 def create_constraints():
     with driver.session() as session:
-        session.run("CREATE CONSTRAINT ON (bv:BinaryView) ASSERT bv.HASH IS UNIQUE;")
-        session.run("CREATE CONSTRAINT ON (func:Function) ASSERT func.HASH IS UNIQUE;")
-        session.run("CREATE CONSTRAINT ON (bb:BasicBlock) ASSERT bb.HASH IS UNIQUE;")
-        session.run("CREATE CONSTRAINT ON (instr:Instruction) ASSERT instr.HASH IS UNIQUE;")
-        session.run("CREATE CONSTRAINT ON (ex:Expression) ASSERT ex.HASH IS UNIQUE;")
-        session.run("CREATE CONSTRAINT ON (var:Variable) ASSERT var.HASH IS UNIQUE;")
-        session.run("CREATE CONSTRAINT ON (const:Constant) ASSERT const.HASH IS UNIQUE;")
-        session.run("CREATE CONSTRAINT ON (string:String) ASSERT string.HASH IS UNIQUE;")
-        session.run("CREATE CONSTRAINT ON (progsym:Symbol) ASSERT progsym.HASH IS UNIQUE;")
-
-
-def create_nodes(filename):
+        for label in NODE_LABELS:
+            session.run("CREATE CONSTRAINT ON (n:" + label + ") ASSERT n.HASH IS UNIQUE;")
+
+
+def missing_constraints(session):
+    """
+    :return: (LIST) the NODE_LABELS without a uniqueness constraint on their HASH
+    """
+    # e.g "CONSTRAINT ON ( n:Function ) ASSERT n.HASH IS UNIQUE" (Neo4j 3.5), "... ASSERT (n.HASH) IS UNIQUE" (4.x)
+    descriptions = [record['description'] for record in session.run("CALL db.constraints()")]
+    return [label for label in NODE_LABELS
+            if not any(':' + label + ' ' in description and '.HASH' in description and 'UNIQUE' in description
+                       for description in descriptions)]
+
+
+def check_constraints():
+    """
+    Make sure the constraints of create_constraints exist and their indexes are online before any node is loaded:
+    without them every MERGE (and every MATCH of a relationship node) scans all the nodes of the label.
+    """
     with driver.session() as session:
-        filename = '\'file:/' + filename + '\' '
-        print('Now Processing: ', filename)
-        session.run("USING PERIODIC COMMIT 1000 "
-                    "LOAD CSV WITH HEADERS FROM " + filename + "AS row "
-                                                               "CALL apoc.merge.node([row['LABEL']], {HASH: row['HASH']}, row) yield node "
-                                                               "RETURN true "
-                    )
-        session.close()
-
-def create_relationships(filename):
-    print('Now Processing: ', filename)
-    batch_rows = [list() for _ in range(Configuration.THREAD_COUNT)]
+        missing_labels = missing_constraints(session)
+        if missing_labels:
+            print("Creating the missing uniqueness constraints of: ", missing_labels)
+            create_constraints()
+            missing_labels = missing_constraints(session)
+            if missing_labels:
+                raise RuntimeError("No uniqueness constraint on the HASH of: " + ', '.join(missing_labels))
+
+        session.run("CALL db.awaitIndexes(" + str(INDEX_WAIT_SECONDS) + ")").consume()
+
+
+def export_files(suffix: str):
+    """
+    :param suffix: (STR) '-nodes.csv' or '-relationships.csv'
+    :return: (LIST) the names of the CSV files of the export with the suffix, without their compression extension.
+             Only the top level of the import directory is the export: its sub-directories (batch exports,
+             neo4j-admin import files, manifests) are not loaded.
+    """
+    filenames = list()
+    for filename in sorted(os.listdir(Configuration.analysis_database_path)):
+        if not os.path.isfile(os.path.join(Configuration.analysis_database_path, filename)):
+            continue
+        filename = CompressedIO.base_name(filename)
+        # A compressed file may have a decompressed copy next to it, see server_readable_file
+        if filename.endswith(suffix) and filename not in filenames:
+            filenames.append(filename)
+
+    return filenames
+
+
+def database_is_empty():
+    with driver.session() as session:
+        # The node of the graph identity (see HashStore.graph_identity) is not part of any export
+        return session.run("MATCH (n) WHERE NOT n:" + HashStore.GRAPH_IDENTITY_LABEL + " "
+                           "RETURN n LIMIT 1").peek() is None
+
+
+@contextlib.contextmanager
+def server_readable_file(filename, readable_compressions=('gzip',)):
+    """
+    :param filename: name of a CSV file in the import directory, without the extension of its compression (the
+                     existing variant is used, see Configuration.CSV_COMPRESSION)
+    :param readable_compressions: the compressions the Cypher procedure reading the file supports
+    :return: (STR) the name of the file for the Neo4j server to read, decompressed if needed
+    """
+    path = CompressedIO.find(Configuration.analysis_database_path + filename) or \
+        Configuration.analysis_database_path + filename
+    with CompressedIO.server_readable(path, readable_compressions) as readable_path:
+        yield os.path.basename(readable_path)
+
+
+def cypher_name(name: str):
+    # Labels and relationship types can not be query parameters, they are quoted into the query text
+    return '`' + name.replace('`', '``') + '`'
+
+
+def node_merge_query(label: str, create=False):
+    """
+    :param create: (BOOL) CREATE the nodes instead of merging them, only correct while the DB has none of them
+    :return: (STR) the query loading a batch of node rows ($rows) of a single label. The text of the query only depends
+             on the label, so the server caches its plan.
+    """
+    if create:
+        return "UNWIND $rows AS row CREATE (n:" + cypher_name(label) + ") SET n = row"
+
+    return "UNWIND $rows AS row MERGE (n:" + cypher_name(label) + " {HASH: row.HASH}) SET n += row"
+
+
+def create_node_batch(session, write_controller, label, create, batch_rows, committed_nodes):
+    """
+    Load a batch of node rows of a single label in a single transaction, see node_merge_query.
+    :param session: the session of the worker thread running the batch
+    :param committed_nodes: see create_nodes
+    """
+    on_commit = None
+    if committed_nodes is not None:
+        def on_commit(committed_rows):
+            committed_nodes.append((label, [int(row['HASH'], 16) for row in committed_rows]))
+
+    run_batch(session, write_controller, node_merge_query(label, create), batch_rows, on_commit)
+
+
+def create_nodes(filenames, write_controller, create=False, committed_nodes=None):
+    """
+    Load the node files in batches of rows of a single label, the batches are loaded in parallel by THREAD_COUNT
+    sessions. The nodes of different batches never conflict: the files hold different labels, and a file holds every
+    node once.
+    :param filenames: (LIST) names of the node files in the import directory
+    :param write_controller: the WriteControl.WriteController of the node batches, sets their size
+    :param create: (BOOL) see node_merge_query
+    :param committed_nodes: (collections.deque) if given, the label and the INT hashes of the rows of every committed
+                            batch are appended to it
+    :return: (INT) amount of batches that failed
+    """
+    check_constraints()
+
+    worker_pool = WorkerPool.WorkerPool(Configuration.THREAD_COUNT, driver.session, create_node_batch,
+                                        Configuration.DB_WRITER_QUEUE_SIZE)
     batch_index = 0
-    thread_list = list()
-    with open(Configuration.analysis_database_path + filename, 'r') as fn:
+    try:
+        for filename in filenames:
+            print('Now Processing: ', filename)
+            # LABEL -> the rows of its next batch
+            batch_rows = collections.defaultdict(list)
+            with CompressedIO.open_text(CompressedIO.find(Configuration.analysis_database_path + filename)) as fn:
+                for row in csv.DictReader(fn):
+                    # LOAD CSV reads empty fields as null, which sets no property
+                    row = {field: value for field, value in row.items() if value}
+                    rows = batch_rows[row['LABEL']]
+                    rows.append(row)
+
+                    if len(rows) >= write_controller.batch_size:
+                        worker_pool.submit(batch_index % Configuration.THREAD_COUNT, write_controller, row['LABEL'],
+                                           create, rows, committed_nodes)
+                        batch_index += 1
+                        batch_rows[row['LABEL']] = list()
+
+            for label, rows in batch_rows.items():
+                if len(rows) > 0:
+                    worker_pool.submit(batch_index % Configuration.THREAD_COUNT, write_controller, label, create,
+                                       rows, committed_nodes)
+                    batch_index += 1
+    finally:
+        worker_pool.close()
+
+    return worker_pool.failed_items
+
+
+def record_node_hashes(hash_store, committed_nodes):
+    # Remember the nodes that were just committed (see create_nodes), later extractions only write the relationships
+    # to them
+    label_hashes = collections.defaultdict(list)
+    for label, node_hashes in committed_nodes:
+        label_hashes[label].extend(node_hashes)
+
+    return sum(hash_store.add(label, node_hashes) for label, node_hashes in label_hashes.items())
+
+
+def relationship_worker_pool():
+    """
+    :return: a WorkerPool of THREAD_COUNT workers merging relationship batches (see create_batch_relationships)
+    """
+    return WorkerPool.WorkerPool(Configuration.THREAD_COUNT, driver.session, create_batch_relationships,
+                                 Configuration.DB_WRITER_QUEUE_SIZE)
+
+
+@functools.lru_cache(maxsize=None)
+def partition_column(start_label: str, end_label: str):
+    """
+    :return: (STR) the column of the endpoint ('START_ID' or 'END_ID') whose label is ranked first in
+             Configuration.HOT_NODE_LABELS, the start node on a tie
+    """
+    def rank(label):
+        if label in Configuration.HOT_NODE_LABELS:
+            return Configuration.HOT_NODE_LABELS.index(label)
+        return len(Configuration.HOT_NODE_LABELS)
+
+    return 'END_ID' if rank(end_label) < rank(start_label) else 'START_ID'
+
+
+def create_relationships(filename, worker_pool, write_controller):
+    """
+    Queue the rows of a relationship file to the workers of the pool, in batches. The rows are partitioned between the
+    workers by Configuration.RELATIONSHIP_PARTITION_FIELD: the batches of different workers never share the node of
+    the partition column, but may share the other endpoint. The conflicts on those nodes are retried by run_batch.
+    The batches may still be in progress on return, see WorkerPool.join
+    :param write_controller: the WriteControl.WriteController of the relationship batches, sets their size
+    """
+    print('Now Processing: ', filename)
+    # (worker index, StartNodeLabel, EndNodeLabel, TYPE) -> the rows of the next batch of the worker and group
+    batch_rows = collections.defaultdict(list)
+    with CompressedIO.open_text(CompressedIO.find(Configuration.analysis_database_path + filename)) as fn:
         for row in csv.DictReader(fn):
-            batch_rows[batch_index].append(row)
-
-            if len(batch_rows[batch_index]) == Configuration.BATCH_SIZE:
-                thread_list.append(
-                    threading.Thread(target=create_batch_relationships, args=[batch_rows[batch_index]]))
-                thread_list[-1].start()
-                batch_rows[batch_index] = list()
-
-            batch_index = (batch_index + 1) % Configuration.THREAD_COUNT
+            partition_field = Configuration.RELATIONSHIP_PARTITION_FIELD
+            if partition_field == 'auto':
+                partition_field = partition_column(row['StartNodeLabel'], row['EndNodeLabel'])
+            batch_key = (worker_pool.partition(row[partition_field]),
+                         row['StartNodeLabel'], row['EndNodeLabel'], row['TYPE'])
+            rows = batch_rows[batch_key]
+            rows.append(row)
 
-            if len(thread_list) > Configuration.THREAD_COUNT:
-                for thread in thread_list:
-                    thread.join()
-                thread_list = []
+            if len(rows) >= write_controller.batch_size:
+                worker_pool.submit(batch_key[0], write_controller, batch_key[1:], rows)
+                batch_rows[batch_key] = list()
 
-        for batch in batch_rows:
-            if len(batch) > 0:
-                thread_list.append(threading.Thread(target=create_batch_relationships, args=[batch]))
-                thread_list[-1].start()
-
-        for thread in thread_list:
-            thread.join()
+    for batch_key, rows in batch_rows.items():
+        if len(rows) > 0:
+            worker_pool.submit(batch_key[0], write_controller, batch_key[1:], rows)
 
 
 def test_create_relationships(filename):
-    with driver.session() as session:
-        with open(Configuration.analysis_database_path + filename, 'r') as fn:
+    # apoc.load.csv does not read compressed files, they are loaded from a decompressed copy
+    with server_readable_file(filename, ()) as readable_filename, driver.session() as session:
+        with open(Configuration.analysis_database_path + readable_filename, 'r', encoding='utf-8') as fn:
             sample_row = next(csv.DictReader(fn))
 
-        filename = '\"file:/' + filename + '\" '
+        filename = '\"file:/' + readable_filename + '\" '
         print('Now Processing: ', filename)
 
         if sample_row:
@@ -95,53 +268,163 @@ def test_create_relationships(filename):
             print("Failed to load csv file: ", filename)
 
 
-def create_batch_relationships(batch_rows):
-    with driver.session() as session:
-        retry = 0
-        while retry < Configuration.RETRIES:
-            try:
-                # Because of the use of dynamic labels on the start\end nodes during the MATCH, and the possibility
-                # of different labels between different rows within a batch - it is necessary to inefficiently go
-                # through each row and commit it as a single transaction
-                # TODO: figure out how to do this more efficiently
-                for row in batch_rows:
-                    session.run("MATCH (start:" + row['StartNodeLabel'] + " {HASH: $start_id}) "
-                                                                          "MATCH (end:" + row[
-                                    'EndNodeLabel'] + " {HASH: $end_id}) "
-                                                      "CALL apoc.merge.relationship(start, $row_type,"
-                                                      " {ContextHash: $context_hash}, $row, end) yield rel "
-                                                      "RETURN true ", start_id=row['START_ID'], end_id=row['END_ID'],
-                                row_type=row['TYPE'], context_hash=row['ContextHash'], row=row)
-
-                return
-            except exceptions.TransientError:
-                retry += 1
-                time.sleep(2)
-                continue
-            except exceptions.ServiceUnavailable:
-                time.sleep(2)
-                continue
-            except TypeError as e:
-                print("TypeError: ", e)
-        print("Exceeded retry count for committing relationships")
-        session.sync()
+def relationship_merge_query(start_label: str, end_label: str, relationship_type: str):
+    """
+    :return: (STR) the query merging a batch of relationship rows ($rows) of a single (StartNodeLabel, EndNodeLabel,
+             TYPE) group, the same way apoc.merge.relationship(start, TYPE, {ContextHash}, row, end) merges a row.
+             The text of the query only depends on the group, so the server caches its plan.
+    """
+    return ("UNWIND $rows AS row "
+            "MATCH (start:" + cypher_name(start_label) + " {HASH: row.START_ID}) "
+            "MATCH (end:" + cypher_name(end_label) + " {HASH: row.END_ID}) "
+            "MERGE (start)-[rel:" + cypher_name(relationship_type) + " {ContextHash: row.ContextHash}]->(end) "
+            "ON CREATE SET rel += row")
+
+
+def write_controller(batch_size, dead_letter_file):
+    """
+    :param batch_size: (INT) initial amount of rows per batch
+    :return: a WriteControl.WriteController configured by the Configuration
+    """
+    return WriteControl.WriteController(batch_size, Configuration.MAX_BATCH_SIZE, Configuration.THREAD_COUNT,
+                                        Configuration.TARGET_COMMIT_SECONDS, Configuration.RETRIES, dead_letter_file,
+                                        Configuration.ADAPTIVE_WRITES)
+
+
+def run_batch(session, write_controller, cypher_query, batch_rows, on_commit=None):
+    """
+    Run a query on a batch of rows ($rows) in a single transaction, once the write controller permits it.
+    Transient errors (e.g deadlocks) and an unavailable server are retried a bounded amount of times, after a jittered
+    exponential backoff. A batch that fails on any other error is split in halves that are run on their own, down to
+    the single rows that fail. The rows that can not be written are added to the dead letter file of the controller.
+    :param on_commit: called with the rows of the batch (or of a part of it) once they are committed
+    :return: (BOOL) whether all the rows of the batch were committed
+    """
+    attempt = 0
+    while True:
+        try:
+            with write_controller.permit():
+                start_time = time.perf_counter()
+                session.run(cypher_query, rows=batch_rows).consume()
+                write_controller.committed(len(batch_rows), time.perf_counter() - start_time)
+            if on_commit is not None:
+                on_commit(batch_rows)
+            return True
+        except (exceptions.TransientError, exceptions.ServiceUnavailable) as e:
+            write_controller.transient_error()
+            attempt += 1
+            if attempt > write_controller.retries:
+                print("Exceeded retry count for committing a batch of: ", cypher_query)
+                write_controller.dead_letter_file.write(cypher_query, e, batch_rows)
+                return False
+            time.sleep(WriteControl.backoff_seconds(attempt))
+        except Exception as e:
+            write_controller.error()
+            if len(batch_rows) == 1:
+                print("ERROR! Failed to commit a row: ", repr(e))
+                write_controller.dead_letter_file.write(cypher_query, e, batch_rows)
+                return False
+            # Isolate the failing rows, the other rows of the batch are still committed
+            middle = len(batch_rows) // 2
+            first_committed = run_batch(session, write_controller, cypher_query, batch_rows[:middle], on_commit)
+            return run_batch(session, write_controller, cypher_query, batch_rows[middle:], on_commit) and \
+                first_committed
+
+
+def create_batch_relationships(session, write_controller, group, batch_rows):
+    """
+    Merge a batch of relationship rows in a single transaction. The rows are merged in the order of their nodes, so
+    concurrent batches that share nodes lock them in the same order, which makes deadlocks between them less likely.
+    :param session: the session of the worker thread running the batch
+    :param group: (TUPLE) the StartNodeLabel, EndNodeLabel and TYPE shared by all the rows of the batch
+    """
+    batch_rows.sort(key=operator.itemgetter('START_ID', 'END_ID'))
+    run_batch(session, write_controller, relationship_merge_query(*group), batch_rows)
 
 
 def BinaryViewExists():
-    with driver.session() as session:
-        fname = '\'file:/BinaryView-nodes.csv\''
+    with server_readable_file('BinaryView-nodes.csv') as readable_filename, driver.session() as session:
+        fname = '\'file:/' + readable_filename + '\''
         return session.run("LOAD CSV WITH HEADERS FROM " + fname + "AS row "
                                                                    "MATCH (bv:BinaryView {HASH: row.HASH}) "
                                                                    "RETURN exists(bv.HASH) "
                            ).peek()
 
 
+def IncrementalExportExists():
+    # An incremental export writes the header of Delete-functions.csv even when it has no function to detach, the file
+    # of a full export is empty
+    delete_file = CompressedIO.find(Configuration.analysis_database_path + 'Delete-functions.csv')
+    if delete_file is None:
+        return False
+    with CompressedIO.open_text(delete_file) as fn:
+        return csv.DictReader(fn).fieldnames is not None
+
+
+def delete_stale_functions():
+    """
+    Detach the changed and removed functions of an incremental export from their BinaryView, delete the calls to
+    them listed in Delete-calls.csv, and delete the relationships of their sub-tree unless an identical function still
+    uses it.
+    Every relationship of a function holds the function as its RootFunction, the sub-tree is walked from the Function
+    nodes a level at a time (for all the functions at once), so only the relationships of the nodes of the sub-trees
+    are looked at.
+    :return: (INT) amount of relationships deleted
+    """
+    print('Now Processing: Delete-functions.csv')
+    with CompressedIO.open_text(CompressedIO.find(Configuration.analysis_database_path + 'Delete-functions.csv')) as fn:
+        rows = list(csv.DictReader(fn))
+
+    deleted_relationships = 0
+    with driver.session() as session:
+        session.run("UNWIND $rows AS row "
+                    "MATCH (:BinaryView {HASH: row.RootBinaryView})-[member:MemberFunc {Offset: row.Offset}]->"
+                    "(:Function {HASH: row.HASH}) "
+                    "DELETE member", rows=rows).consume()
+
+        # The callers of the functions are extracted again, and their calls point at the current hashes
+        delete_calls_file = CompressedIO.find(Configuration.analysis_database_path + 'Delete-calls.csv')
+        if delete_calls_file is not None:
+            with CompressedIO.open_text(delete_calls_file) as fn:
+                call_rows = list(csv.DictReader(fn))
+            session.run("UNWIND $rows AS row "
+                        "MATCH (:Function {HASH: row.HASH})<-[call:FunctionCall]-() "
+                        "WHERE call.RootBinaryView = row.RootBinaryView "
+                        "AND (row.RootFunction = '' OR call.RootFunction = row.RootFunction) "
+                        "DELETE call", rows=call_rows).consume()
+
+        # [node id, RootBinaryView, RootFunction] of the reached nodes whose relationships are not deleted yet
+        frontier = [record['node'] for record in session.run(
+            "UNWIND $rows AS row "
+            "WITH row WHERE row.DeleteSubtree = 'True' "
+            "MATCH (function:Function {HASH: row.HASH}) "
+            "RETURN DISTINCT [id(function), row.RootBinaryView, row.HASH] AS node", rows=rows)]
+        reached_nodes = set(map(tuple, frontier))
+
+        while frontier:
+            next_frontier = list()
+            for index in range(0, len(frontier), Configuration.NODE_BATCH_SIZE):
+                for record in session.run("UNWIND $nodes AS node "
+                                          "MATCH (start) WHERE id(start) = node[0] "
+                                          "MATCH (start)-[rel]->(end) "
+                                          "WHERE rel.RootBinaryView = node[1] AND rel.RootFunction = node[2] "
+                                          "DELETE rel "
+                                          "RETURN [id(end), node[1], node[2]] AS node",
+                                          nodes=frontier[index:index + Configuration.NODE_BATCH_SIZE]):
+                    deleted_relationships += 1
+                    if tuple(record['node']) not in reached_nodes:
+                        reached_nodes.add(tuple(record['node']))
+                        next_frontier.append(record['node'])
+            frontier = next_frontier
+
+    return deleted_relationships
+
+
 def GraphCleanup():
     # Clean up all the helper attributes from the graph
     node_attributes_to_clean = ['LABEL', 'RootFunction', 'RootBasicBlock', 'RootInstruction', 'RootExpression']
     relationship_attributes_to_clean = ['START_ID', 'END_ID', 'TYPE', 'StartNodeLabel', 'EndNodeLabel']
 
-    fname = '\'file:/BinaryView-nodes.csv\''
     node_cypher_expression = ''
     relationship_cypher_expression = ''
 
@@ -152,7 +435,8 @@ def GraphCleanup():
 
     cypher_expression = node_cypher_expression + relationship_cypher_expression
 
-    with driver.session() as session:
+    with server_readable_file('BinaryView-nodes.csv') as readable_filename, driver.session() as session:
+        fname = '\'file:/' + readable_filename + '\''
         session.run("LOAD CSV WITH HEADERS FROM " + fname + "AS row "
                                                             "MATCH (n)-[rel {RootBinaryView: row.HASH}]->() "
                     + cypher_expression)
@@ -160,28 +444,79 @@ def GraphCleanup():
 
 
 if __name__ == "__main__":
-    start_time = time.time()
+    run_report = Instrumentation.RunReport('load', Configuration.PROFILE_CPU, Configuration.PROFILE_MEMORY)
 
-    create_constraints()
+    with run_report.stage('constraints'):
+        create_constraints()
     # handling of node and relationship DB insertions are different because nodes are independent from each other
     # so it is safe to insert them in a fast efficient manner (using indexes).
     # Relationships are dependant on the nodes they are connected to, and their creation is subject to deadlocks
     # and other multi-threading plagues.
 
-    if not BinaryViewExists():
-        for root, dirs, files in os.walk(Configuration.analysis_database_path):
-            for filename in files:
-                if filename.endswith('-nodes.csv'):
-                    create_nodes(filename)
-        for root, dirs, files in os.walk(Configuration.analysis_database_path):
-            for filename in files:
-                if filename.endswith('-relationships.csv'):
-                    test_create_relationships(filename)
+    hash_store = None
+    if Configuration.NODE_HASH_STORE:
+        hash_store = HashStore.HashStore(Configuration.node_hash_store_path, HashStore.graph_identity(driver)).open()
+        if hash_store.cleared:
+            print("WARNING! The node hash store described a different graph DB and was emptied. Exports extracted "
+                  "with it miss the nodes it held, extract them again.")
+
+    dead_letter_file = WriteControl.DeadLetterFile(Configuration.dead_letter_path)
+
+    incremental_export = IncrementalExportExists()
+    if incremental_export:
+        with run_report.stage('delete_stale_functions'):
+            run_report.count('deleted_relationships', delete_stale_functions())
+
+    if incremental_export or not BinaryViewExists():
+        with run_report.stage('nodes'):
+            node_files = export_files('-nodes.csv')
+
+            # An incremental export always loads into a DB that already has nodes
+            create = Configuration.CREATE_NODES_IN_EMPTY_DB and not incremental_export and database_is_empty()
+            node_writes = write_controller(Configuration.NODE_BATCH_SIZE, dead_letter_file)
+            committed_nodes = collections.deque() if hash_store is not None else None
+            run_report.count('failed_node_batches', create_nodes(node_files, node_writes, create, committed_nodes))
+            for name, value in node_writes.summary().items():
+                run_report.count('node_writes.' + name, value)
+            run_report.count('node_files', len(node_files))
+            if hash_store is not None:
+                run_report.count('recorded_node_hashes', record_node_hashes(hash_store, committed_nodes))
+        with run_report.stage('relationships'):
+            relationship_writes = write_controller(Configuration.BATCH_SIZE, dead_letter_file)
+            worker_pool = relationship_worker_pool()
+            try:
+                for filename in export_files('-relationships.csv'):
+                    create_relationships(filename, worker_pool, relationship_writes)
+                    run_report.count('relationship_files')
+            finally:
+                worker_pool.close()
+            run_report.count('failed_relationship_batches', worker_pool.failed_items)
+            for name, value in relationship_writes.summary().items():
+                run_report.count('relationship_writes.' + name, value)
     else:
         print("BinaryView already exists in DB, skipping export.")
 
-    print("Starting graph node attribute cleanup...")
-    GraphCleanup()
+    if hash_store is not None:
+        hash_store.close()
 
-    end_time = time.time()
-    print("Operation done in ", end_time - start_time, " seconds")
+    dead_letter_file.close()
+    if dead_letter_file.row_count:
+        print("ERROR! ", dead_letter_file.row_count, " rows could not be written into the DB, see ",
+              dead_letter_file.path)
+    run_report.count('dead_letter_rows', dead_letter_file.row_count)
+
+    print("Starting graph node attribute cleanup...")
+    with run_report.stage('cleanup'):
+        GraphCleanup()
+
+    # The next incremental export may only diff against this export once all of it is in the graph
+    if dead_letter_file.row_count or run_report.counters['failed_node_batches'] or \
+            run_report.counters['failed_relationship_batches']:
+        print("The export was not fully loaded, its function manifest is not committed (the next incremental export "
+              "diffs against the last export that was loaded)")
+    elif IncrementalExport.commit_pending_manifest(Configuration.analysis_database_path, Configuration.manifest_path):
+        print("Committed the function manifest of the export")
+
+    print("Operation done in ", run_report.summary()['wall_time'], " seconds")
+    if Configuration.RUN_REPORT:
+        run_report.write(Configuration.analysis_database_path)
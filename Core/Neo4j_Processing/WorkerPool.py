@@ -0,0 +1,78 @@
+"""
+Bounded pool of DB writer threads (see ExportNeo4j.create_relationships).
+
+Every worker owns a queue and a session of the shared driver, kept open for the lifetime of the worker. Work items are
+partitioned between the workers by a key (e.g the node a relationship starts at): items with the same key are always
+handled by the same worker, one after the other, so concurrent transactions do not compete for the lock of the node of
+the key. The queues are bounded, the producer blocks once a worker falls behind.
+"""
+
+import queue
+import threading
+
+
+class WorkerPool:
+
+    def __init__(self, worker_count: int, session_factory, work, queue_size: int):
+        """
+        :param worker_count: (INT) amount of worker threads
+        :param session_factory: creates the session of a worker, e.g driver.session
+        :param work: called by a worker with its session followed by the arguments of every submitted work item
+        :param queue_size: (INT) amount of work items that may wait for a worker before the producer blocks
+        """
+        self.session_factory = session_factory
+        self.work = work
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(worker_count)]
+        # Amount of work items that raised an error, their error is printed by the worker
+        self.failed_items = 0
+        self.failed_items_lock = threading.Lock()
+
+        self.threads = [threading.Thread(target=self.run_worker, args=[work_queue], name='DBWriter-' + str(index),
+                                         daemon=True)
+                        for index, work_queue in enumerate(self.queues)]
+        for thread in self.threads:
+            thread.start()
+
+    def run_worker(self, work_queue: queue.Queue):
+        with self.session_factory() as session:
+            while True:
+                item = work_queue.get()
+                try:
+                    if item is None:
+                        return
+                    self.work(session, *item)
+                except Exception as e:
+                    print("ERROR! DB writer failed: ", repr(e))
+                    with self.failed_items_lock:
+                        self.failed_items += 1
+                finally:
+                    work_queue.task_done()
+
+    def partition(self, key: str):
+        """
+        :return: (INT) index of the worker that handles the work items of the key
+        """
+        return hash(key) % len(self.queues)
+
+    def submit(self, worker_index: int, *args):
+        """
+        Queue a work item to a worker, blocks while the queue of the worker is full.
+        """
+        self.queues[worker_index].put(args)
+
+    def join(self):
+        """
+        Wait until every submitted work item was handled.
+        """
+        for work_queue in self.queues:
+            work_queue.join()
+
+    def close(self):
+        """
+        Handle the remaining work items and stop the workers.
+        """
+        for work_queue, thread in zip(self.queues, self.threads):
+            if thread.is_alive():
+                work_queue.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,164 @@
+"""
+Adaptive control of the batched writes into the Neo4j DB (see ExportNeo4j.run_batch).
+
+A WriteController measures the commit latency and the transient errors (deadlocks, lock timeouts, an unavailable
+server) of every batch and adapts the write load, AIMD style:
+    - additive increase: every batch committed within the target latency grows the batch size by a step, and every
+      full round of such commits (as many commits as the current concurrency) adds a concurrent writer.
+    - multiplicative decrease: a transient error, or a commit slower than the target latency, halves both. The burst
+      of errors hitting several writers at once is a single congestion event, so the load is decreased at most once
+      per target latency.
+The load so settles around the largest batches and the most writers that the server commits within the target
+latency, whatever the server.
+
+Failed batches are retried after a jittered exponential backoff, a bounded amount of times. Rows that still fail are
+written into a DeadLetterFile (with the error and the query) instead of being dropped.
+"""
+
+import contextlib
+import csv
+import json
+import os
+import random
+import threading
+import time
+
+# Backoff before the first retry of a failed batch, doubled on every further retry up to BACKOFF_MAX_SECONDS
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+
+def backoff_seconds(attempt: int):
+    """
+    :param attempt: (INT) amount of failed attempts so far (1 for the first retry)
+    :return: (FLOAT) seconds to wait before the next attempt: exponential, with full jitter so that the writers that
+             failed together do not retry together
+    """
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** (attempt - 1))))
+
+
+class DeadLetterFile:
+    # CSV file of the rows that could not be written into the DB: the query, the error and the row (as JSON), so the
+    # rows can be inspected and loaded again. Shared by all the writer threads, created on the first failed row.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.csv_file = None
+        self.writer = None
+        self.lock = threading.Lock()
+        self.row_count = 0
+        # The rows of a previous run were either loaded again since, or are loaded again by this run
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def write(self, cypher_query: str, error: Exception, rows: list):
+        with self.lock:
+            if self.writer is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self.csv_file = open(self.path, 'w', encoding='utf-8', newline='')
+                self.writer = csv.writer(self.csv_file)
+                self.writer.writerow(('Query', 'Error', 'Row'))
+            for row in rows:
+                self.writer.writerow((cypher_query, repr(error), json.dumps(row)))
+            self.csv_file.flush()
+            self.row_count += len(rows)
+
+    def close(self):
+        with self.lock:
+            if self.csv_file is not None:
+                self.csv_file.close()
+                self.csv_file = None
+                self.writer = None
+
+
+class WriteController:
+
+    def __init__(self, batch_size: int, max_batch_size: int, max_concurrency: int, target_latency: float,
+                 retries: int, dead_letter_file: DeadLetterFile, adaptive=True):
+        """
+        :param batch_size: (INT) initial amount of rows per batch
+        :param max_batch_size: (INT) the batch size never grows beyond this
+        :param max_concurrency: (INT) the initial and maximal amount of batches written at the same time (the amount
+                                of writer threads)
+        :param target_latency: (FLOAT) seconds a commit may take before the load is decreased
+        :param retries: (INT) amount of retries of a batch that failed on a transient error
+        :param dead_letter_file: the DeadLetterFile of the rows that could not be written
+        :param adaptive: (BOOL) adapt the batch size and the concurrency, otherwise both stay fixed
+        """
+        self.batch_size = batch_size
+        self.batch_size_step = max(1, batch_size // 10)
+        self.max_batch_size = max(batch_size, max_batch_size)
+        self.concurrency = max_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.retries = retries
+        self.dead_letter_file = dead_letter_file
+        self.adaptive = adaptive
+
+        # Guards all the state below, and wakes up the writers waiting for a permit
+        self.condition = threading.Condition()
+        self.active_writers = 0
+        # Commits within the target latency since the concurrency last changed
+        self.fast_commits = 0
+        self.last_decrease = 0.0
+
+        self.statistics = {'batches': 0, 'rows': 0, 'commit_seconds': 0.0, 'transient_errors': 0, 'errors': 0,
+                           'load_decreases': 0}
+
+    @contextlib.contextmanager
+    def permit(self):
+        # Blocks while the current concurrency of writers is already writing
+        with self.condition:
+            while self.active_writers >= self.concurrency:
+                self.condition.wait()
+            self.active_writers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active_writers -= 1
+                self.condition.notify()
+
+    def committed(self, row_count: int, latency: float):
+        with self.condition:
+            self.statistics['batches'] += 1
+            self.statistics['rows'] += row_count
+            self.statistics['commit_seconds'] += latency
+            if latency > self.target_latency:
+                self.decrease_load()
+            elif self.adaptive:
+                self.batch_size = min(self.max_batch_size, self.batch_size + self.batch_size_step)
+                self.fast_commits += 1
+                if self.fast_commits >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self.fast_commits = 0
+                    self.condition.notify()
+
+    def transient_error(self):
+        with self.condition:
+            self.statistics['transient_errors'] += 1
+            self.decrease_load()
+
+    def error(self):
+        with self.condition:
+            self.statistics['errors'] += 1
+
+    def decrease_load(self):
+        # Called with the condition held
+        now = time.perf_counter()
+        if not self.adaptive or now - self.last_decrease < self.target_latency:
+            return
+        self.last_decrease = now
+        self.batch_size = max(1, self.batch_size // 2)
+        self.concurrency = max(1, self.concurrency // 2)
+        self.fast_commits = 0
+        self.statistics['load_decreases'] += 1
+
+    def summary(self):
+        """
+        :return: (DICT) the statistics of the writes and the batch size and concurrency the controller settled on
+        """
+        with self.condition:
+            summary = dict(self.statistics)
+            summary.update({'batch_size': self.batch_size, 'concurrency': self.concurrency})
+            return summary
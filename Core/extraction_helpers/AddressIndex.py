@@ -0,0 +1,81 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+
+################################################################################################################
+#                                       Address Index                                                          #
+################################################################################################################
+
+class StringIndex:
+    """
+    Sorted interval index over bv.strings, resolves any address inside a string (not only its start) to the string.
+    The index is built on the first lookup, so exports that never meet a pointer do not enumerate the strings.
+    """
+
+    def __init__(self, bv):
+        self.bv = bv
+        self.starts = None
+        self.ends = None
+        # The largest end of all the strings up to every index, strings may overlap or contain each other
+        self.max_ends = None
+        self.strings = None
+
+    def load(self):
+        strings = sorted(self.bv.strings, key=lambda string: string.start)
+        self.starts = array('Q', (string.start for string in strings))
+        self.ends = array('Q', (string.start + string.length for string in strings))
+        self.max_ends = array('Q', accumulate(self.ends, max))
+        # The string values are only read for the strings that are actually referenced
+        self.strings = strings
+
+    def lookup(self, address: int):
+        """
+        :return: (STR) the value of the string containing the address, None if there is none
+        """
+        if self.starts is None:
+            self.load()
+
+        # The string starting last at or before the address, that still contains it
+        string_index = bisect_right(self.starts, address) - 1
+        while string_index >= 0 and address < self.max_ends[string_index]:
+            if address < self.ends[string_index]:
+                return str(self.strings[string_index].value)
+            string_index -= 1
+
+        return None
+
+
+class SymbolIndex:
+    """
+    Sorted index over bv.symbols, resolves the exact address of a symbol to the symbol. Built on the first lookup.
+    """
+
+    def __init__(self, bv):
+        self.bv = bv
+        self.addresses = None
+        self.symbols = None
+
+    def load(self):
+        # address -> symbol, the last symbol defined at an address wins
+        symbol_mapping = dict()
+        for program_symbols in self.bv.symbols.values():
+            # Newer Binary Ninja versions map every name to a list of symbols
+            for program_symbol in (program_symbols if isinstance(program_symbols, list) else (program_symbols,)):
+                symbol_mapping.update({program_symbol.address: program_symbol})
+
+        self.addresses = array('Q', sorted(symbol_mapping))
+        self.symbols = [symbol_mapping[address] for address in self.addresses]
+
+    def lookup(self, address: int):
+        """
+        :return: the Symbol defined at the address, None if there is none
+        """
+        if self.addresses is None:
+            self.load()
+
+        symbol_index = bisect_left(self.addresses, address)
+        if symbol_index < len(self.addresses) and self.addresses[symbol_index] == address:
+            return self.symbols[symbol_index]
+
+        return None
@@ -1,5 +1,5 @@
 from binaryninja import *
-import xxhash
+from ..Common import Hashing
 
 
 ################################################################################################################
@@ -8,11 +8,14 @@ import xxhash
 
 class Neo4jBasicBlock:
 
-    def __init__(self, bb, branch_condition_enum: int, context, back_edge=False):
+    def __init__(self, bb, branch_condition_enum: int, context, back_edge=False, segment_buffer=None):
         """
         Init the BasicBlock node
+        :param segment_buffer: (SegmentBuffer) hash the block from the bytes of its native instructions, instead of
+                               from its rendered disassembly text
         """
         self.bb = bb
+        self.segment_buffer = segment_buffer
         self.context = context
         if bb.index == 0:
             # The basic block is the first block in the function, so its parent is a function
@@ -24,13 +27,28 @@ class Neo4jBasicBlock:
         self.context.set_hash(self.bb_hash())
 
     def bb_hash(self):
-        node_hash = xxhash.xxh64()
+        node_hash = Hashing.new_hasher()
+
+        if self.segment_buffer:
+            bv = self.bb.view
+            previous_address = None
+            for instruction in self.bb:
+                # Consecutive MLIL instructions are often lifted from the same native instruction
+                if instruction.address != previous_address:
+                    previous_address = instruction.address
+                    node_hash.update(self.segment_buffer.read(instruction.address,
+                                                              bv.get_instruction_length(instruction.address)))
+                # A single native instruction (e.g a rep prefix or a cmov) may be lifted into several MLIL blocks,
+                # their MLIL operations tell them apart
+                node_hash.update(instruction.operation.value.to_bytes(2, 'little'))
+
+            return node_hash.intdigest()
 
         for disasm_text in self.bb.disassembly_text:
             if not str(disasm_text).startswith('sub_'):
-                node_hash.update(str(disasm_text))
+                node_hash.update(str(disasm_text).encode('utf-8'))
 
-        return node_hash.hexdigest()
+        return node_hash.intdigest()
 
     def serialize(self):
         """
@@ -1,45 +1,98 @@
 from binaryninja import *
 from ..Common import ContextManagement
-import xxhash
+from ..Common import Hashing
+from ... import Configuration
+
+import json
+import os
 
 ################################################################################################################
 #                                       BINARY VIEW                                                            #
 ################################################################################################################
 
+# The BinaryView used to be hashed with BinaryReader.read(1000) calls, which stop at the first read that can not
+# return a full 1000 bytes. The chunked reads keep that granularity so the BinaryView identities stay the same.
+LEGACY_READ_SIZE = 1000
+
+# Size of a single BinaryView.read() call, a multiple of LEGACY_READ_SIZE
+VIEW_CHUNK_SIZE = LEGACY_READ_SIZE * 16384
+
+# START_ID and ParentHASH of the MemberBV relationship of the BinaryView, which has no parent node
+ROOT_PARENT_HASH = '0'
+
 
 class Neo4jBinaryView:
     """
     Extract all relevant info from a Binary View itself
     """
 
-    def __init__(self, bv):
+    def __init__(self, bv, bv_hash=None):
+        """
+        :param bv: BinaryNinja BinaryView object
+        :param bv_hash: (INT) an already calculated hash of the BinaryView, used by extraction worker processes to
+                        avoid re-hashing the whole file
+        """
 
         self.FILENAME = bv.file.filename
         self.bv = bv
         self.context = ContextManagement.Context()
-        self.context.set_hash(self.bv_hash())
-        self.context.set_parent_hash('0')
+        self.context.set_hash(bv_hash or self.bv_hash())
+        self.context.set_parent_hash(0)
 
     def bv_hash(self):
         """
-        Iterate over all the BinaryView (flat iteration over the hex values themselves)
+        Hash the BinaryView (or its backing file, see Configuration.BV_HASH_SOURCE).
+        Digests are cached by the path, size and modification time of the backing file, so re-exports of an
+        unchanged file do not hash it again. A view with unsaved changes differs from its backing file, it is always
+        hashed (and not cached) when the view is the hash source.
         :return:(INT) Hash  of the whole file
         """
+        backing_file = self.FILENAME if os.path.isfile(self.FILENAME) else None
+        if backing_file is None or (Configuration.BV_HASH_SOURCE == 'view' and self.bv.file.modified):
+            return self.view_hash()
+
+        cache_key = file_cache_key(backing_file)
+        hash_cache = load_hash_cache()
+        cached_hash = hash_cache.get(cache_key)
+        if cached_hash:
+            return Hashing.parse_hash(cached_hash)
+
+        if Configuration.BV_HASH_SOURCE == 'file':
+            file_hash = Hashing.hash_file(backing_file)
+        else:
+            file_hash = self.view_hash()
+
+        # Re-read the cache, other exports may have added to it while this one was hashing
+        hash_cache = load_hash_cache()
+        hash_cache.update({cache_key: Hashing.format_hash(file_hash)})
+        save_hash_cache(hash_cache)
+
+        return file_hash
 
-        # create file object
-        br = BinaryReader(self.bv)
+    def view_hash(self):
+        """
+        Iterate over all the BinaryView (flat iteration over the hex values themselves), in large chunks
+        :return:(INT) Hash  of the whole view, from its start up to the first unreadable address
+        """
+        file_hash = Hashing.new_hasher()
+        address = self.bv.start
 
-        # calculate file hash
-        file_hash = xxhash.xxh64()
-        # for some reason a BinaryReader won't read more then 1000 or so bytes
-        temp_hash = br.read(1000)
-        while temp_hash:
-            file_hash.update(temp_hash)
-            temp_hash = br.read(1000)
+        while True:
+            data = self.bv.read(address, VIEW_CHUNK_SIZE)
+            # Same as the BinaryReader loop, a trailing read of less than LEGACY_READ_SIZE bytes is not hashed
+            hashed_length = len(data) - len(data) % LEGACY_READ_SIZE
+            file_hash.update(memoryview(data)[:hashed_length])
+            if len(data) < VIEW_CHUNK_SIZE:
+                break
+            address += hashed_length
 
-        return file_hash.hexdigest()
+        return file_hash.intdigest()
 
     def serialize(self):
+        # The BinaryView is the root of the graph, its parent stays the literal '0' that graph queries match on
+        # (an empty identity would be written as an empty field, which is loaded as a missing property)
+        context = self.context.get_context()
+        context.update({'ParentHASH': ROOT_PARENT_HASH})
 
         csv_template = {
             'mandatory_node_dict': {
@@ -47,14 +100,14 @@ class Neo4jBinaryView:
                 'LABEL': 'BinaryView',
                 },
             'mandatory_relationship_dict': {
-                'START_ID': 0,
+                'START_ID': ROOT_PARENT_HASH,
                 'END_ID': self.context.SelfHASH,
                 'TYPE': 'MemberBV',
                 'NodeLabel': 'BinaryView',
                 'StartNodeLabel': 'MemberBV',
                 'EndNodeLabel': 'MemberBV',
             },
-            'mandatory_context_dict': self.context.get_context(),
+            'mandatory_context_dict': context,
 
             'node_attributes': {
                 'FILENAME': self.FILENAME,
@@ -66,3 +119,35 @@ class Neo4jBinaryView:
         }
 
         return csv_template
+
+
+def file_cache_key(path: str):
+    """
+    :return: (STR) the key of a file in the BinaryView hash cache, it changes whenever the file is modified or the
+             hash settings change
+    """
+    file_stat = os.stat(path)
+    return '|'.join((os.path.abspath(path), str(file_stat.st_size), str(file_stat.st_mtime_ns),
+                     Configuration.BV_HASH_SOURCE, Configuration.HASH_ALGORITHM))
+
+
+def load_hash_cache():
+    try:
+        with open(Configuration.bv_hash_cache_path, 'r', encoding='utf-8') as hash_cache:
+            return json.load(hash_cache)
+    except (OSError, ValueError):
+        # No cache yet (or a corrupted one), it is re-created on the next save
+        return dict()
+
+
+def save_hash_cache(hash_cache: dict):
+    try:
+        os.makedirs(os.path.dirname(Configuration.bv_hash_cache_path) or '.', exist_ok=True)
+        # Several exports (e.g BatchExport workers) may save the cache at once, replace it atomically so a reader
+        # never sees a half written file
+        temp_path = Configuration.bv_hash_cache_path + '.' + str(os.getpid())
+        with open(temp_path, 'w', encoding='utf-8') as hash_cache_file:
+            json.dump(hash_cache, hash_cache_file, indent=1)
+        os.replace(temp_path, Configuration.bv_hash_cache_path)
+    except OSError:
+        print("Failed to save the BinaryView hash cache: ", Configuration.bv_hash_cache_path)
@@ -1,5 +1,4 @@
 from binaryninja import *
-import xxhash
 
 
 ################################################################################################################
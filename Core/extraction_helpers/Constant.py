@@ -1,5 +1,5 @@
 from binaryninja import *
-import xxhash
+from ..Common import Hashing
 
 
 ################################################################################################################
@@ -15,10 +15,7 @@ class Neo4jConstant:
         self.context.set_hash(self.constant_hash())
 
     def constant_hash(self):
-        constant_hash = xxhash.xxh64()
-        constant_hash.update(str(self.constant))
-
-        return constant_hash.hexdigest()
+        return Hashing.hash_text(str(self.constant))
 
     def serialize(self):
 
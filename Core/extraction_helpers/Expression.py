@@ -1,40 +1,136 @@
 from binaryninja import *
-import xxhash
+from ..Common import Hashing
+from . import OperandLayout
 
 
 ################################################################################################################
 #                                       MLIL Expression                                                        #
 ################################################################################################################
 
-class Neo4jExpression:
+# MLIL operations that call a function, the typed, untyped and SSA forms of both calls and tail calls
+CALL_OPERATIONS = frozenset(('MLIL_CALL', 'MLIL_TAILCALL', 'MLIL_CALL_UNTYPED', 'MLIL_TAILCALL_UNTYPED',
+                             'MLIL_CALL_SSA', 'MLIL_TAILCALL_SSA', 'MLIL_CALL_UNTYPED_SSA',
+                             'MLIL_TAILCALL_UNTYPED_SSA'))
+
+# Call destination operations whose constant operand is the address of the called function
+CONSTANT_DESTINATION_OPERATIONS = frozenset(('MLIL_CONST_PTR', 'MLIL_CONST', 'MLIL_IMPORT'))
+
+
+def call_destination(expression):
+    """
+    :param expression: BinaryNinja MLIL expression
+    :return: (INT) the address called by the expression, None if it is not a call to a constant address
+    """
+    if expression.operation.name not in CALL_OPERATIONS:
+        return None
+
+    destination = expression.dest
+    if destination.operation.name not in CONSTANT_DESTINATION_OPERATIONS:
+        # Indirect call
+        return None
+
+    return destination.constant
+
+
+class StructuralHasher:
+    """
+    Merkle style hashes of the MLIL expression trees of a single function: the hash of an expression is computed from
+    its operation and the already computed hashes of its operands, bottom-up. Every sub-expression is hashed once, so
+    hashing is linear in the size of the expression, and identical sub-trees get identical hashes.
+    """
+
+    def __init__(self):
+        # expr_index -> structural hash, expression indexes are unique within the MLIL of a function
+        self.expression_hashes = dict()
+        self.operation_hashes = dict()
+
+    def expression_hash(self, expression):
+        expression_hashes = self.expression_hashes
+        if expression.expr_index in expression_hashes:
+            return expression_hashes[expression.expr_index]
+
+        # Iterative post-order walk, an expression is hashed once all its operand expressions are
+        pending_expressions = [(expression, False)]
+        while pending_expressions:
+            current_expression, operands_hashed = pending_expressions.pop()
+            if current_expression.expr_index in expression_hashes:
+                continue
 
-    def __init__(self, expression, context, parent_node_type: str):
+            operands = current_expression.operands
+            layout = OperandLayout.operand_layout(current_expression)
+            if not operands_hashed:
+                pending_expressions.append((current_expression, True))
+                for operand_index, operand_kind in layout:
+                    operand = operands[operand_index]
+                    if operand_kind == 'expr':
+                        pending_expressions.append((operand, False))
+                    elif operand_kind == 'expr_list':
+                        pending_expressions.extend((expr, False) for expr in operand)
+                continue
 
-        self.operands = str(expression.operands)
+            operation_hash = self.operation_hashes.get(current_expression.operation)
+            if operation_hash is None:
+                operation_hash = Hashing.hash_text(current_expression.operation.name)
+                self.operation_hashes.update({current_expression.operation: operation_hash})
+
+            operand_hashes = [operation_hash]
+            for operand_index, operand_kind in layout:
+                operand = operands[operand_index]
+                if operand_kind == 'expr':
+                    operand_hashes.append(expression_hashes[operand.expr_index])
+                elif operand_kind == 'expr_list':
+                    operand_hashes.append(Hashing.combine(*[expression_hashes[expr.expr_index] for expr in operand]))
+                elif operand_kind == 'var_ssa_dest_and_src':
+                    # The defined version of the variable and the version it modifies
+                    operand_hashes.append(Hashing.hash_text(str(operand) + ' ' + str(operands[operand_index + 1])))
+                else:
+                    # Leaf operands (variables, constants, intrinsics etc) are hashed by their text
+                    operand_hashes.append(Hashing.hash_text(str(operand)))
+
+            expression_hashes[current_expression.expr_index] = Hashing.combine(*operand_hashes)
+
+        return expression_hashes[expression.expr_index]
+
+
+class Neo4jExpression:
+
+    def __init__(self, expression, context, parent_node_type: str, structural_hasher=None, operands_property=True):
+        """
+        :param structural_hasher: (StructuralHasher) hash the expression by its structure instead of by the text of
+                                  its operands
+        :param operands_property: (BOOL) add the text of the operands as the 'Operands' property of the node
+        """
+        self.expression = expression
+        self.operands = str(expression.operands) if operands_property or not structural_hasher else None
         self.op_name = expression.operation.name
         self.op_type = str(expression.ILOperations[expression.operation])
         self.parent_node_type = parent_node_type
         self.operation_enum = expression.operation.value
+        self.structural_hasher = structural_hasher
+        self.operands_property = operands_property
         self.context = context
         self.context.set_hash(self.expression_hash())
 
-
     def expression_hash(self):
-        expr_hash = xxhash.xxh64()
-        expr_hash.update(self.operands + self.op_name)
+        if self.structural_hasher:
+            return self.structural_hasher.expression_hash(self.expression)
 
-        return expr_hash.hexdigest()
+        return Hashing.hash_text(self.operands + self.op_name)
 
     def serialize(self):
+        mandatory_node_dict = {
+            'HASH': self.context.SelfHASH,
+            'LABEL': 'Expression',
+            'Operands': self.operands,
+            'OperationName': self.op_name,
+            'OperationEnum': self.operation_enum,
+            'OperationType': self.op_type,
+        }
+        if not self.operands_property:
+            del mandatory_node_dict['Operands']
+
         csv_template = {
-            'mandatory_node_dict': {
-                'HASH': self.context.SelfHASH,
-                'LABEL': 'Expression',
-                'Operands': self.operands,
-                'OperationName': self.op_name,
-                'OperationEnum': self.operation_enum,
-                'OperationType': self.op_type,
-            },
+            'mandatory_node_dict': mandatory_node_dict,
             'mandatory_relationship_dict': {
                 'START_ID': self.context.ParentHASH,
                 'END_ID': self.context.SelfHASH,
@@ -1,5 +1,5 @@
 from binaryninja import *
-import xxhash
+from ..Common import Hashing, AttributeProfiles
 
 ################################################################################################################
 #                                       MLIL FUNCTION                                                          #
@@ -8,15 +8,27 @@ import xxhash
 
 class Neo4jFunction:
 
-    def __init__(self, mlil_func, context):
+    def __init__(self, mlil_func, context, func_hash=None, segment_buffer=None):
+        """
+        :param func_hash: (INT) an already calculated hash of this function (see func_hash)
+        :param segment_buffer: (SegmentBuffer) the buffered segments of the BinaryView to hash the function from
+        """
         self.func = mlil_func
+        self.segment_buffer = segment_buffer
         self.source_function = self.func.source_function
         self.bv = self.source_function.view
         self.context = context
-        self.context.set_hash(self.func_hash())
+        self.context.set_hash(func_hash or self.func_hash())
 
     def func_hash(self):
-        function_hash = xxhash.xxh64()
+        function_hash = Hashing.new_hasher()
+
+        if self.segment_buffer:
+            for basic_block in self.source_function:
+                function_hash.update(self.segment_buffer.read(basic_block.start, basic_block.length))
+
+            return function_hash.intdigest()
+
         br = BinaryReader(self.bv)
 
         for basic_block in self.source_function:
@@ -24,7 +36,7 @@ class Neo4jFunction:
             bb_txt = br.read(basic_block.length)
             function_hash.update(bb_txt)
 
-        return function_hash.hexdigest()
+        return function_hash.intdigest()
 
     def serialize(self):
 
@@ -45,10 +57,10 @@ class Neo4jFunction:
 
             'mandatory_context_dict': self.context.get_context(),
 
-            'node_attributes': {
-                'ClobberedRegisters': self.func.source_function.clobbered_regs,
-                'CallingConvention': self.func.source_function.calling_convention.name,
-            },
+            'node_attributes': AttributeProfiles.select('Function', {
+                'ClobberedRegisters': lambda: self.func.source_function.clobbered_regs,
+                'CallingConvention': lambda: self.func.source_function.calling_convention.name,
+            }),
             'relationship_attributes': {
 
             },
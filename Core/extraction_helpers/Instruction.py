@@ -1,5 +1,5 @@
 from binaryninja import *
-import xxhash
+from ..Common import Hashing, AttributeProfiles
 
 
 ################################################################################################################
@@ -8,10 +8,16 @@ import xxhash
 
 class Neo4jInstruction:
 
-    def __init__(self, instr: mediumlevelil.MediumLevelILInstruction, context, parent_type: str):
+    def __init__(self, instr: mediumlevelil.MediumLevelILInstruction, context, parent_type: str,
+                 structural_hasher=None):
+        """
+        :param structural_hasher: (Expression.StructuralHasher) hash the instruction by the structure of its
+                                  expression tree instead of by the text of its operands
+        """
         self.instr = instr
         self.parent_type = parent_type
-        self.operands = str(instr.operands)
+        self.structural_hasher = structural_hasher
+        self.operands = str(instr.operands) if not structural_hasher else None
         self.context = context
 
         if self.parent_type == 'BasicBlock':
@@ -22,10 +28,11 @@ class Neo4jInstruction:
         self.context.set_hash(self.instr_hash())
 
     def instr_hash(self):
-        instruction_hash = xxhash.xxh64()
-        instruction_hash.update(str(self.instr.operands) + str(self.instr.operation))
+        if self.structural_hasher:
+            # Salted, so an instruction and its root expression get different hashes
+            return Hashing.combine(Hashing.hash_text('Instruction'), self.structural_hasher.expression_hash(self.instr))
 
-        return instruction_hash.hexdigest()
+        return Hashing.hash_text(self.operands + str(self.instr.operation))
 
     def serialize(self):
         csv_template = {
@@ -47,10 +54,15 @@ class Neo4jInstruction:
             'node_attributes': {
             },
             'relationship_attributes': {
+                # Always exported, the post processing chains the instructions by their index
                 'InstructionIndex': self.instr.instr_index,
-                'PossibleValues': self.instr.possible_values.type.value,
-                'VarsRead': [var.name for var in self.instr.vars_read],
-                'VarsWritten': [var.name for var in self.instr.vars_written],
             },
         }
+
+        csv_template['relationship_attributes'].update(AttributeProfiles.select('Instruction', {
+            'PossibleValues': lambda: self.instr.possible_values.type.value,
+            'VarsRead': lambda: [var.name for var in self.instr.vars_read],
+            'VarsWritten': lambda: [var.name for var in self.instr.vars_written],
+        }))
+
         return csv_template
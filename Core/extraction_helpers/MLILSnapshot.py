@@ -0,0 +1,233 @@
+"""
+Memoizing facade over the Binary Ninja MLIL objects of a single function.
+
+Every property of a Binary Ninja IL object (operation, operands, expr_index etc) is computed through the core API on
+each access, and the extraction reads most of them several times per expression: the hash, the operand dispatch,
+the serialization and str(operands) in both the instruction and its root expression. A snapshot reads each property
+once and hands the cached value to all the extraction helpers, which use it exactly like the original object.
+
+An operation whose operands are not all of a kind known to OperandLayout is not snapshot: the original expression is
+used in its place, so the extraction still sees everything Binary Ninja describes.
+
+This module has no dependencies on binaryninja, so it can be profiled by the benchmarks as well.
+"""
+
+from . import OperandLayout
+
+
+class OperandList(list):
+    # The operands of an expression snapshot. Operand expressions are snapshots themselves, so str() is the text of
+    # the original operands (the hashes of the text based mode depend on it), computed once on first use.
+
+    __slots__ = ('source_operands', 'text')
+
+    def __init__(self, operands, source_operands):
+        super().__init__(operands)
+        self.source_operands = source_operands
+        self.text = None
+
+    def __repr__(self):
+        if self.text is None:
+            self.text = str(self.source_operands)
+        return self.text
+
+    __str__ = __repr__
+
+
+# MLIL operation -> (operand name -> position in expression.operands, operand layout, amount of values in
+# expression.operands, whether every operand kind is known), see OperandLayout
+_operation_tables = dict()
+
+# Marks a cached property that was not read yet (None is a valid value of some properties)
+_UNREAD = object()
+
+
+class SourceProperty:
+    # A property of the original object, read on first access and cached in the slot of the same name prefixed by
+    # an underscore.
+
+    def __init__(self, name: str):
+        self.name = name
+        self.slot = '_' + name
+
+    def __get__(self, snapshot, owner):
+        if snapshot is None:
+            return self
+
+        value = getattr(snapshot, self.slot)
+        if value is _UNREAD:
+            value = getattr(snapshot.source, self.name)
+            setattr(snapshot, self.slot, value)
+
+        return value
+
+
+class ExpressionSnapshot:
+    # A single MLIL expression (or instruction, which is the root expression of itself).
+    # The operation and the operands are read when the snapshot is created, the rest of the properties are only
+    # read on first access: most of them are only used for instructions, some (vars_read, possible_values etc)
+    # need an analysis of their own.
+
+    __slots__ = ('source', 'operation', 'operands', 'ILOperations', 'operand_positions', '_expr_index', '_address',
+                 '_instr_index', '_vars_read', '_vars_written', '_possible_values')
+
+    expr_index = SourceProperty('expr_index')
+    address = SourceProperty('address')
+    instr_index = SourceProperty('instr_index')
+    vars_read = SourceProperty('vars_read')
+    vars_written = SourceProperty('vars_written')
+    possible_values = SourceProperty('possible_values')
+
+    def __init__(self, source, operation, operand_positions, operands):
+        self.source = source
+        self.operation = operation
+        self.ILOperations = source.ILOperations
+        self.operand_positions = operand_positions
+        self.operands = operands
+        self._expr_index = _UNREAD
+        self._address = _UNREAD
+        self._instr_index = _UNREAD
+        self._vars_read = _UNREAD
+        self._vars_written = _UNREAD
+        self._possible_values = _UNREAD
+
+    def __getattr__(self, name):
+        # Named operands (dest, src, constant etc) resolve to the cached operands, anything else to the original
+        if name in ExpressionSnapshot.__slots__:
+            # A slot that was not set yet
+            raise AttributeError(name)
+
+        operand_index = self.operand_positions.get(name)
+        if operand_index is not None:
+            return self.operands[operand_index]
+
+        return getattr(self.source, name)
+
+    def __repr__(self):
+        return repr(self.source)
+
+
+def snapshot_expression(expression):
+    """
+    :param expression: BinaryNinja MLIL expression (or instruction)
+    :return: the ExpressionSnapshot of the expression and of all its operand expressions
+    """
+    # Iterative post-order walk. The operand expressions are pushed in reverse, so they are completed in their
+    # original order and their snapshots are the last entries of completed_snapshots once their expression is
+    # completed.
+    completed_snapshots = list()
+    pending_expressions = [(expression, None)]
+
+    while pending_expressions:
+        current_expression, source_properties = pending_expressions.pop()
+
+        if source_properties is None:
+            # Every property is read from Binary Ninja once, a second read would create new operand objects
+            operation = current_expression.operation
+            operation_table = _operation_tables.get(operation)
+            if operation_table is None:
+                layout = OperandLayout.operand_layout(current_expression)
+                operand_positions = {operand_name: operand_index for (operand_name, operand_kind), (operand_index, _)
+                                     in zip(current_expression.ILOperations[operation], layout)}
+                operand_count = sum(OperandLayout.OPERAND_WIDTHS.get(operand_kind, 1) for _, operand_kind in layout)
+                known_kinds = all(operand_kind in OperandLayout.OPERAND_WIDTHS for _, operand_kind in layout)
+                operation_table = (operand_positions, layout, operand_count, known_kinds)
+                _operation_tables.update({operation: operation_table})
+            operand_positions, layout, operand_count, known_kinds = operation_table
+            source_operands = current_expression.operands
+            if not known_kinds or len(source_operands) != operand_count:
+                # The operands can not be located, the original expression (and its operand expressions) is used
+                completed_snapshots.append(current_expression)
+                continue
+
+            operand_expressions = list()
+            for operand_index, operand_kind in layout:
+                if operand_kind == 'expr':
+                    operand_expressions.append(source_operands[operand_index])
+                elif operand_kind == 'expr_list':
+                    operand_expressions.extend(source_operands[operand_index])
+
+            pending_expressions.append((current_expression, (operation, operation_table, source_operands,
+                                                             len(operand_expressions))))
+            for operand_expression in reversed(operand_expressions):
+                pending_expressions.append((operand_expression, None))
+            continue
+
+        operation, (operand_positions, layout, _, _), source_operands, operand_expression_count = source_properties
+        if operand_expression_count:
+            operand_snapshots = iter(completed_snapshots[-operand_expression_count:])
+            del completed_snapshots[-operand_expression_count:]
+
+        operands = list(source_operands)
+        for operand_index, operand_kind in layout:
+            if operand_kind == 'expr':
+                operands[operand_index] = next(operand_snapshots)
+            elif operand_kind == 'expr_list':
+                operands[operand_index] = [next(operand_snapshots) for _ in source_operands[operand_index]]
+
+        completed_snapshots.append(ExpressionSnapshot(current_expression, operation, operand_positions,
+                                                      OperandList(operands, source_operands)))
+
+    return completed_snapshots[0]
+
+
+class EdgeSnapshot:
+
+    __slots__ = ('target', 'back_edge', 'type')
+
+    def __init__(self, target, back_edge, edge_type):
+        self.target = target
+        self.back_edge = back_edge
+        self.type = edge_type
+
+
+class BasicBlockSnapshot:
+    # An MLIL basic block: its instruction snapshots and its outgoing edges, whose targets are the snapshots of the
+    # target blocks.
+
+    __slots__ = ('source', 'index', 'instructions', 'outgoing_edges', 'view', '_disassembly_text')
+
+    def __init__(self, source):
+        self.source = source
+        self.index = source.index
+        self.instructions = [snapshot_expression(instruction) for instruction in source]
+        self.outgoing_edges = list()
+        self.view = source.view
+        self._disassembly_text = None
+
+    @property
+    def disassembly_text(self):
+        if self._disassembly_text is None:
+            self._disassembly_text = self.source.disassembly_text
+        return self._disassembly_text
+
+    def __iter__(self):
+        return iter(self.instructions)
+
+
+class FunctionSnapshot:
+    # The MLIL of a single function, read once.
+
+    __slots__ = ('source', 'mlil', 'start', 'basic_blocks')
+
+    def __init__(self, func):
+        self.source = func
+        self.mlil = func.mlil
+        self.start = func.start
+
+        block_snapshots = dict()
+        self.basic_blocks = list()
+        for basic_block in self.mlil.basic_blocks:
+            block_snapshot = BasicBlockSnapshot(basic_block)
+            block_snapshots.update({basic_block.index: block_snapshot})
+            self.basic_blocks.append(block_snapshot)
+
+        for basic_block, block_snapshot in zip(self.mlil.basic_blocks, self.basic_blocks):
+            for edge in basic_block.outgoing_edges:
+                block_snapshot.outgoing_edges.append(EdgeSnapshot(block_snapshots[edge.target.index],
+                                                                  edge.back_edge, edge.type))
+
+    @property
+    def instructions(self):
+        for basic_block in self.basic_blocks:
+            yield from basic_block.instructions
@@ -0,0 +1,48 @@
+"""
+Positions of the operands of MLIL expressions.
+
+ILOperations describes the operands of every MLIL operation as (name, kind) pairs, but expression.operands does not
+hold a single value per pair: a 'var_ssa_dest_and_src' operand (the SSA variable a partial assignment defines) is
+followed by the version of the variable it modifies. The operand dispatch of the extraction, the structural hashes
+and the MLIL snapshots all read the operands through the layout computed here, so they agree on where every operand is.
+
+This module has no dependencies on binaryninja, so the MLIL snapshots (and their benchmark) can use it as well.
+"""
+
+# Operand kind -> amount of values of an operand of that kind in expression.operands
+OPERAND_WIDTHS = {
+    'expr': 1,
+    'expr_list': 1,
+    'var': 1,
+    'var_list': 1,
+    'var_ssa': 1,
+    'var_ssa_dest_and_src': 2,
+    'var_ssa_list': 1,
+    'int': 1,
+    'float': 1,
+    'int_list': 1,
+    'intrinsic': 1,
+}
+
+# MLIL operation -> the operand layout of the operation
+_operand_layouts = dict()
+
+
+def operand_layout(expression):
+    """
+    :param expression: BinaryNinja MLIL expression
+    :return: a tuple of (operand_index, operand_kind) of the operands described by ILOperations, where operand_index
+             is the position of the (first) value of the operand in expression.operands. Operand kinds missing from
+             OPERAND_WIDTHS are assumed to hold a single value.
+    """
+    layout = _operand_layouts.get(expression.operation)
+    if layout is None:
+        layout = list()
+        operand_index = 0
+        for operand_name, operand_kind in expression.ILOperations[expression.operation]:
+            layout.append((operand_index, operand_kind))
+            operand_index += OPERAND_WIDTHS.get(operand_kind, 1)
+        layout = tuple(layout)
+        _operand_layouts.update({expression.operation: layout})
+
+    return layout
@@ -1,5 +1,5 @@
 from binaryninja import *
-import xxhash
+from ..Common import Hashing
 
 
 ################################################################################################################
@@ -16,10 +16,7 @@ class Neo4jSymbol:
         self.parent_node_type = parent_node_type
 
     def symbol_hash(self):
-        symbol_hash = xxhash.xxh64()
-        symbol_hash.update(self.symbol.raw_name + str(self.symbol.type.value) + str(self.symbol.namespace))
-
-        return symbol_hash.hexdigest()
+        return Hashing.hash_text(self.symbol.raw_name + str(self.symbol.type.value) + str(self.symbol.namespace))
 
     def serialize(self):
         csv_template = {
@@ -0,0 +1,47 @@
+from bisect import bisect_right
+
+
+################################################################################################################
+#                                       Segment Buffer                                                         #
+################################################################################################################
+
+class SegmentBuffer:
+    """
+    The content of the executable segments of a BinaryView, each segment read once.
+    Function and basic block hashes are computed from zero-copy memoryview slices of these buffers instead of a
+    BinaryView read per block.
+    """
+
+    def __init__(self, bv):
+        self.bv = bv
+        # Sorted start addresses of the buffered segments, and the matching (start address, memoryview) entries
+        self.segment_starts = None
+        self.segments = None
+
+    def load(self):
+        self.segment_starts = list()
+        self.segments = list()
+
+        for segment in sorted(self.bv.segments, key=lambda bv_segment: bv_segment.start):
+            if segment.executable:
+                # Only the bytes backed by data are returned, the rest of the segment falls back to bv.read()
+                data = self.bv.read(segment.start, segment.end - segment.start)
+                self.segment_starts.append(segment.start)
+                self.segments.append((segment.start, memoryview(data)))
+
+    def read(self, address: int, length: int):
+        """
+        :return: a memoryview of (up to) length bytes at the address, like BinaryView.read()
+        """
+        if self.segments is None:
+            self.load()
+
+        segment_index = bisect_right(self.segment_starts, address) - 1
+        if segment_index >= 0:
+            segment_start, segment_data = self.segments[segment_index]
+            offset = address - segment_start
+            if offset + length <= len(segment_data):
+                return segment_data[offset:offset + length]
+
+        # Not in an executable segment (or crossing its end), read it from the BinaryView itself
+        return memoryview(self.bv.read(address, length))
@@ -1,5 +1,5 @@
 from binaryninja import *
-import xxhash
+from ..Common import Hashing
 
 
 ################################################################################################################
@@ -16,10 +16,7 @@ class Neo4jString:
         self.parent_node_type = parent_node_type
 
     def string_hash(self):
-        string_hash = xxhash.xxh64()
-        string_hash.update(str(self.raw_string).strip())
-
-        return string_hash.hexdigest()
+        return Hashing.hash_text(str(self.raw_string).strip())
 
     def sanitize_string(self, raw_string):
         # Switch all quotation marks (' and ") with their ascii equivalent (%#%).
@@ -1,15 +1,60 @@
 from binaryninja import *
-import xxhash
+from ..Common import Hashing
 
 
 ################################################################################################################
 #                                       MLIL Variable                                                          #
 ################################################################################################################
 
+class VarDefUseIndex:
+    # The definitions and uses of all the variables of a single MLIL function, collected in one pass over its
+    # instructions instead of a get_var_definitions\get_var_uses round trip for every variable operand.
+
+    def __init__(self, mlil_function):
+        """
+        :param mlil_function: MLIL function (or MLILSnapshot.FunctionSnapshot) to index
+        """
+        # var.identifier -> instruction indexes, in instruction order
+        self.definitions = dict()
+        self.uses = dict()
+        # var.identifier -> (definitions text, uses text), as written into the VarOperand relationship
+        self.serialized = dict()
+
+        for instruction in mlil_function.instructions:
+            for var in instruction.vars_written:
+                self.add_index(self.definitions, var, instruction.instr_index)
+            for var in instruction.vars_read:
+                self.add_index(self.uses, var, instruction.instr_index)
+
+    @staticmethod
+    def add_index(index: dict, var, instr_index: int):
+        instruction_indexes = index.setdefault(var.identifier, list())
+        # An instruction may read the same variable more than once
+        if not instruction_indexes or instruction_indexes[-1] != instr_index:
+            instruction_indexes.append(instr_index)
+
+    def def_use_text(self, var):
+        """
+        :return: (definitions, uses) of the variable, as comma separated instruction indexes
+        """
+        def_use = self.serialized.get(var.identifier)
+        if def_use is None:
+            def_use = (', '.join(map(str, self.definitions.get(var.identifier, ()))),
+                       ', '.join(map(str, self.uses.get(var.identifier, ()))))
+            self.serialized.update({var.identifier: def_use})
+
+        return def_use
+
+
 class Neo4jVar:
 
-    def __init__(self, var, operand_index: int, context):
+    def __init__(self, var, operand_index: int, context, def_use_index: VarDefUseIndex = None):
+        """
+        :param def_use_index: the VarDefUseIndex of the function of the variable, the definitions and uses are
+                              queried from the function itself if not given
+        """
         self.var = var
+        self.def_use_index = def_use_index
         self.source_variable_type = var.source_type
         self.type = str(var.type.tokens).strip('[').strip(']').replace(',', '').replace("'", '') if var.type else None
         self.operand_index = operand_index
@@ -17,12 +62,17 @@ class Neo4jVar:
         self.context.set_hash(self.var_hash())
 
     def var_hash(self):
-        var_hash = xxhash.xxh64()
-        var_hash.update(self.var.name + str(self.source_variable_type))
+        return Hashing.hash_text(self.var.name + str(self.source_variable_type))
+
+    def def_use_text(self):
+        if self.def_use_index:
+            return self.def_use_index.def_use_text(self.var)
 
-        return var_hash.hexdigest()
+        return (', '.join(map(str, self.var.function.mlil.get_var_definitions(self.var))),
+                ', '.join(map(str, self.var.function.mlil.get_var_uses(self.var))))
 
     def serialize(self):
+        definitions, uses = self.def_use_text()
         csv_template = {
             'mandatory_node_dict': {
                 'HASH': self.context.SelfHASH,
@@ -34,8 +84,8 @@ class Neo4jVar:
                 'TYPE': 'VarOperand',
                 'StartNodeLabel': 'Expression',
                 'EndNodeLabel': 'Variable',
-                'VariableDefinedAtIndex': ', '.join(map(str, self.var.function.mlil.get_var_definitions(self.var))),
-                'VariableUsedAtIndex': ', '.join(map(str, self.var.function.mlil.get_var_uses(self.var))),
+                'VariableDefinedAtIndex': definitions,
+                'VariableUsedAtIndex': uses,
             },
 
             'mandatory_context_dict': self.context.get_context(),